@@ -0,0 +1,344 @@
+"""
+Concurrent-session load generator: simulates sales reps of every branch using the
+application at the same time, against the local OpenAI stand-in.
+
+Each simulated session runs in its own thread, like a Streamlit session, and goes
+through the same steps as the application: login with a user of login.csv, chat
+turns (Chat.processUserInput + Chat.processQueue with the real tool handlers),
+periodic stock refreshes in a subprocess and a logout that exports the conversation.
+
+Sessions are closed-loop: a rep asks, waits for the answer and thinks before asking
+again. The queueing delay of a turn is the time between the moment the rep asks and
+the moment the turn starts running, besides the stock refresh it may trigger: waiting
+for a free slot when `max_active` is set, plus the scheduling lag of a busy process.
+
+Key Components:
+- LoadProfile: Number of sessions, turns, think time, ramp-up and stock refreshes.
+- SessionStats: Latencies, queueing delays and CPU time of one session.
+- ResourceSampler: Samples the resident memory (RSS) of the process in the background.
+- LoadGenerator: Runs the sessions and collects their stats.
+- loadUsers: Users of login.csv with their store.
+
+Typical Usage:
+    >>> generator = LoadGenerator(LoadProfile(sessions=36), fc.handlers, assistant_id="asst_bench")
+    >>> stats = generator.run()
+    >>> sum(len(s.turns) for s in stats) / generator.wall   # turns per second
+"""
+
+import os
+import sys
+import time
+import random
+import resource
+import tempfile
+import threading
+import subprocess
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from openfarma.bench.offline import QUERIES, NullTracker
+from openfarma.bench.server import PROJECT_ROOT
+
+# Offline version of pull-stock.py: same imports and processing, with the Google Sheets
+# download replaced by a delay. Writes to a temporary directory, not the repository.
+REFRESH_SCRIPT = """
+import sys, os, time
+import gspread
+import pandas as pd
+import streamlit as st
+from openfarma.src.params import STOCK_PATH
+from openfarma.src.snapshot import writeSnapshotFromCsv
+
+directory, download_ms = sys.argv[1], float(sys.argv[2])
+time.sleep(download_ms / 1000)
+df = pd.read_csv(STOCK_PATH, dtype=str)
+df = df[df.notna().all(axis=1)]
+df.iloc[:, 2] = df.iloc[:, 2].astype(float).astype(int)
+df.iloc[:, 3] = df.iloc[:, 3].astype('float')
+df = df[df.iloc[:, 2] > 0].reset_index(drop=True)
+path = os.path.join(directory, f"stock-{os.getpid()}.csv")
+df.to_csv(path, index=False)
+writeSnapshotFromCsv(path, index_columns=["ean"], snapshot_path=path + ".snap")
+"""
+
+@dataclass
+class LoadProfile:
+    """
+    Simulated usage.
+
+    Attributes:
+        sessions (int): Concurrent sessions (assigned round-robin to the users of login.csv).
+        turns (int): Questions asked by each session before logging out.
+        think_s (float): Mean seconds a rep takes to ask again after an answer
+            (exponentially distributed).
+        ramp_s (float): Seconds over which the logins are spread.
+        stock_refresh_turns (int): A stock refresh every this many turns, as the
+            STOCK_UPDATE_INTERVAL check would do on a compressed timescale. 0 disables them.
+        stock_download_ms (float): Simulated Google Sheets download of a refresh.
+        max_active (int, optional): Turns allowed to run at the same time; the rest wait
+            (queue). None lets every session run its turns concurrently, like Streamlit.
+        seed (int): Seed of the questions and think times.
+        engine (str): Conversation engine of the sessions ("assistants" or "completions").
+        answer_cache (bool): Answer repeated questions of a store from the answer cache.
+    """
+    sessions: int = 18
+    turns: int = 6
+    think_s: float = 4.0
+    ramp_s: float = 10.0
+    stock_refresh_turns: int = 3
+    stock_download_ms: float = 800
+    max_active: Optional[int] = None
+    seed: int = 7
+    engine: str = "assistants"
+    answer_cache: bool = False
+
+@dataclass
+class SessionStats:
+    """
+    Measurements of one simulated session (seconds).
+
+    Attributes:
+        store_id (str): Store of the session user.
+        username (str): User of login.csv.
+        login (float): Login and chat creation (thread from the pool or created).
+        turns (List[float]): Latency seen by the rep, from asking to the full answer.
+        queue_delays (List[float]): Part of each turn latency spent waiting to start
+            (stock refreshes excluded).
+        refreshes (List[float]): Wall time of each stock refresh.
+        logout (float): Conversation export and chat reset.
+        cpu (float): CPU time of the session thread.
+        errors (List[str]): Errors raised by the session steps.
+    """
+    store_id: str
+    username: str
+    login: float = 0.0
+    turns: List[float] = field(default_factory=list)
+    queue_delays: List[float] = field(default_factory=list)
+    refreshes: List[float] = field(default_factory=list)
+    logout: float = 0.0
+    cpu: float = 0.0
+    errors: List[str] = field(default_factory=list)
+
+class ResourceSampler:
+    """
+    Background sampler of the resident memory of the process.
+
+    Attributes:
+        peak (int): Highest RSS seen, in bytes.
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+
+    @staticmethod
+    def rss() -> int:
+        """Current RSS in bytes (peak RSS where /proc is not available)."""
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError):
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak if sys.platform == "darwin" else peak * 1024
+
+    def start(self) -> None:
+        self.peak = self.rss()
+        self._stop.clear()
+        self._worker = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+        self._worker.start()
+
+    def stop(self) -> int:
+        """Stop sampling and return the peak RSS."""
+        self._stop.set()
+        self._worker.join()
+        return self.peak
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.rss())
+
+def loadUsers() -> List[Tuple[str, str]]:
+    """(store_id, username) of every user of login.csv, one per branch."""
+    from openfarma.src.login import LoginNoPassword
+
+    LoginNoPassword._loadStaticData()
+    users = LoginNoPassword.USERS_DF
+    return [(str(int(float(row.iloc[0]))), str(row.iloc[1])) for _, row in users.iterrows()]
+
+class LoadGenerator:
+    """
+    Runs simulated sessions concurrently.
+
+    Attributes:
+        profile (LoadProfile): Simulated usage.
+        users (List[Tuple[str, str]]): (store_id, username) the sessions log in with.
+        wall (float): Seconds of the last run, from the first login to the last logout.
+        cpu (float): Process CPU seconds of the last run (every thread).
+        children_cpu (float): CPU seconds of the stock refresh subprocesses.
+        rss_baseline (int): RSS before the sessions started, in bytes.
+        rss_peak (int): Peak RSS during the run, in bytes.
+    """
+
+    def __init__(self, profile: LoadProfile, handlers: Dict, api_key: str = "sk-bench",
+                 assistant_id: str = "asst_bench", users: Optional[List[Tuple[str, str]]] = None):
+        """
+        Args:
+            profile (LoadProfile): Simulated usage.
+            handlers (Dict): Tool handlers passed to Chat.processQueue (fc.handlers).
+            api_key (str): Key of the chats.
+            assistant_id (str): Assistant of the chats.
+            users (List[Tuple[str, str]], optional): Defaults to the users of login.csv.
+        """
+        self.profile = profile
+        self.handlers = handlers
+        self.api_key = api_key
+        self.assistant_id = assistant_id
+        self.users = users or loadUsers()
+        self.wall = self.cpu = self.children_cpu = 0.0
+        self.rss_baseline = self.rss_peak = 0
+        self._slots = threading.Semaphore(profile.max_active) if profile.max_active else None
+        self._directory = tempfile.TemporaryDirectory(prefix="openfarma-load-")
+
+    def run(self) -> List[SessionStats]:
+        """Run every session and wait for them to log out."""
+        sampler = ResourceSampler()
+        self.rss_baseline = sampler.rss()
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu = time.process_time()
+        sampler.start()
+
+        stats = [SessionStats(*self.users[i % len(self.users)]) for i in range(self.profile.sessions)]
+        start = time.perf_counter()
+        step = self.profile.ramp_s / max(self.profile.sessions - 1, 1)
+        threads = [
+            threading.Thread(target=self._session, args=(i, stats[i], start + i * step),
+                             name=f"session-{i}", daemon=True)
+            for i in range(self.profile.sessions)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.wall = time.perf_counter() - start
+        self.cpu = time.process_time() - cpu
+        after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        self.children_cpu = (after.ru_utime + after.ru_stime) - (children.ru_utime + children.ru_stime)
+        self.rss_peak = sampler.stop()
+        return stats
+
+    def _session(self, index: int, stats: SessionStats, start_at: float) -> None:
+        """Login, turns with think time and stock refreshes, logout."""
+        from openfarma.src.chat import Chat, ChatConfig
+        from openfarma.src.params import HEADER_LOGO_PATH, AVATAR_USER_PATH, AVATAR_BOT_PATH
+
+        rng = random.Random(self.profile.seed + index)
+        time.sleep(max(start_at - time.perf_counter(), 0))
+        cpu = time.thread_time()
+
+        begin = time.perf_counter()
+        try:
+            store = self._login(stats.username)
+            chat = Chat(self.api_key, self.assistant_id, ChatConfig(
+                header_logo_path=HEADER_LOGO_PATH,
+                user_avatar_path=AVATAR_USER_PATH,
+                bot_avatar_path=AVATAR_BOT_PATH,
+                store_id=stats.store_id,
+                engine=self.profile.engine,
+                answer_cache=self.profile.answer_cache
+            ))
+            chat.prompt_tracker = NullTracker()
+        except Exception as e:
+            stats.errors.append(f"login: {str(e)}")
+            stats.cpu = time.thread_time() - cpu
+            return
+        stats.login = time.perf_counter() - begin
+
+        asked = time.perf_counter()
+        for turn in range(self.profile.turns):
+            if self.profile.think_s:
+                asked += rng.expovariate(1 / self.profile.think_s)
+                time.sleep(max(asked - time.perf_counter(), 0))
+
+            # The application checks the stock once a prompt is queued, before answering
+            refresh = 0.0
+            every = self.profile.stock_refresh_turns
+            if every and turn and turn % every == 0:
+                refresh = self._refreshStock(stats)
+                stats.refreshes.append(refresh)
+
+            if self._slots:
+                self._slots.acquire()
+            started = time.perf_counter()
+            try:
+                chat.processUserInput(rng.choice(QUERIES))
+                chat.processQueue(self.handlers)
+            except Exception as e:
+                stats.errors.append(f"turn {turn}: {str(e)}")
+            finally:
+                if self._slots:
+                    self._slots.release()
+            answered = time.perf_counter()
+            stats.queue_delays.append(max(started - asked - refresh, 0))
+            stats.turns.append(answered - asked)
+            asked = answered
+
+        begin = time.perf_counter()
+        try:
+            self._logout(index, chat, stats, store)
+        except Exception as e:
+            stats.errors.append(f"logout: {str(e)}")
+        stats.logout = time.perf_counter() - begin
+        stats.cpu = time.thread_time() - cpu
+
+    def _login(self, username: str) -> List[str]:
+        """
+        Same lookups as LoginNoPassword._verifyUser, without the Streamlit session state.
+
+        Returns:
+            List[str]: Store name, address and location.
+        """
+        from openfarma.src.login import LoginNoPassword
+
+        login = LoginNoPassword.__new__(LoginNoPassword)
+        login._loadStaticData()
+        user_data = login.USERS_DF[login.USERS_DF.iloc[:, 1] == username]
+        if user_data.empty:
+            raise Exception(f"Error logging in: unknown user {username}")
+        return login._getStoreData(str(int(float(user_data.iloc[0, 0]))))
+
+    def _refreshStock(self, stats: SessionStats) -> float:
+        """Run the offline pull-stock in a subprocess, like updateStockIfDue does."""
+        begin = time.perf_counter()
+        env = os.environ.copy()
+        env['PYTHONPATH'] = f"{PROJECT_ROOT}:{env.get('PYTHONPATH', '')}"
+        try:
+            subprocess.run(
+                [sys.executable, "-c", REFRESH_SCRIPT, self._directory.name, str(self.profile.stock_download_ms)],
+                check=True, env=env, capture_output=True
+            )
+        except subprocess.CalledProcessError as e:
+            stats.errors.append(f"stock: {e.stderr.decode(errors='replace').strip().splitlines()[-1:]}")
+        return time.perf_counter() - begin
+
+    def _logout(self, index: int, chat, stats: SessionStats, store: List[str]) -> None:
+        """
+        Export the conversation to PDF and reset the chat, as the logout button does.
+        The export runs in the session thread (the application hands it to the delivery
+        queue) so its CPU time is charged to the session.
+        """
+        from openfarma.src.export import ConversationExporter
+        from openfarma.src.params import HEADER_LOGO_PATH
+
+        metadata = {
+            'Usuario': stats.username,
+            'Sucursal': store[0],
+            'Dirección': store[1],
+            'Localidad': store[2]
+        }
+        if len(chat.messages) > 1:
+            output_path = os.path.join(self._directory.name, f"chatbot_{index}.pdf")
+            ConversationExporter(chat.messages, HEADER_LOGO_PATH).export("pdf", output_path, metadata)
+        chat.clearChat(report=False)
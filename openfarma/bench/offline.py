@@ -0,0 +1,120 @@
+"""
+Offline setup shared by the benchmark scripts: the application talks to a local OpenAI
+stand-in (see server.py) and runs on the data of the repository.
+
+Key Components:
+- QUERIES: Spanish product questions cycled through by the benchmarks, covering the
+  canned tool calls of the stand-in.
+- NullTracker: Prompt tracker that doesn't report benchmark prompts.
+- setupOffline: Points the OpenAI client and the embeddings of fc.py to the stand-in
+  and, when the Chroma data files are missing, builds temporary vector databases.
+
+Typical Usage:
+    >>> os.environ["OPENAI_BASE_URL"] = server.start()
+    >>> fixture = setupOffline(os.environ["OPENAI_BASE_URL"])
+    >>> from openfarma.src import fc   # Searches hit the stand-in embeddings
+"""
+
+import os
+import logging
+import tempfile
+from typing import Optional
+
+QUERIES = [
+    "Tengo la piel grasa con tendencia al acné",
+    "¿Qué productos hay en promoción para las manchas?",
+    "Busco algo con beneficio hidratante para piel seca",
+    "¿Para qué sirve el ácido hialurónico?",
+    "¿Cómo se usa el protector solar en niños?",
+    "Necesito un shampoo para caspa",
+    "¿Cuántas marcas tienen?",
+    "Productos de la categoría tratamiento para acné",
+]
+
+# Vector databases and the ABM column of each (besides Marca, Nombre and Presentacion)
+FIXTURE_COLUMNS = {
+    "db_all": None,
+    "db_beneficios": "Beneficios",
+    "db_categoria": "Categoria",
+    "db_general": "General",
+    "db_indicaciones": "Indicaciones",
+    "db_uso": "Modo de uso",
+    "db_propiedades": "Propiedades",
+}
+
+class NullTracker:
+    """Prompt tracker that doesn't report benchmark prompts."""
+    def incrementPromptCount(self) -> None:
+        pass
+
+    def reportPrompts(self) -> None:
+        pass
+
+def buildFixture(fc, embedding, directory: str) -> None:
+    """
+    Build the vector databases from the ABM csv with the stand-in embeddings, for
+    checkouts without the Chroma data files. Same documents as build-abm-db.py.
+    """
+    import pandas as pd
+    from langchain_community.vectorstores import Chroma
+    from langchain.docstore.document import Document
+
+    df = pd.read_csv(fc.ABM_PATH, sep=',', encoding='utf-8')
+    for name, column in FIXTURE_COLUMNS.items():
+        columns = df.columns.tolist() if column is None else ['Marca', 'Nombre', 'Presentacion', column]
+        documents = []
+        for _, row in df.iterrows():
+            parts = [f"{col}: {str(row[col]).strip()}" for col in columns
+                     if not pd.isna(row[col]) and str(row[col]).strip()]
+            if parts:
+                documents.append(Document(metadata={'EAN': str(row['EAN'])}, page_content=' '.join(parts)))
+        path = os.path.join(directory, name)
+        Chroma.from_documents(documents=documents, embedding=embedding, persist_directory=path)
+        fc.DB_PATHS[name] = path
+
+def setupOffline(base_url: str, api_key: str = "sk-bench") -> Optional[tempfile.TemporaryDirectory]:
+    """
+    Run the application against the stand-in at `base_url`.
+
+    Sets OPENAI_BASE_URL and OPENAI_API_KEY, replaces the embeddings of fc.py, silences
+    the Streamlit warnings of bare calls and builds the vector databases when the
+    repository has no Chroma data files.
+
+    Args:
+        base_url (str): Base URL of the stand-in (ending in /v1).
+        api_key (str): Key sent to the stand-in.
+
+    Returns:
+        TemporaryDirectory: Directory of the temporary databases (keep a reference while
+            they're used), or None if the repository ones are used.
+    """
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = api_key
+    os.environ["ANONYMIZED_TELEMETRY"] = "False"  # Chroma telemetry
+
+    from langchain_openai import OpenAIEmbeddings
+    from openfarma.src import fc
+
+    class OfflineEmbeddings(OpenAIEmbeddings):
+        """
+        OpenAIEmbeddings sending the texts as they are: splitting them in tokens needs the
+        tokenizer files, downloaded from the network. Tokenization time is not measured.
+        """
+        def embed_documents(self, texts, chunk_size=0):
+            response = self.client.create(input=list(texts), **self._invocation_params)
+            return [item.embedding for item in response.data]
+
+    from openfarma.src.ratelimit import getHttpClient
+    fc._embedding = OfflineEmbeddings(api_key=api_key, base_url=base_url, http_client=getHttpClient())
+
+    # Streamlit calls run without a script context: silence its warnings
+    for name in ["streamlit"] + list(logging.root.manager.loggerDict):
+        if name.startswith("streamlit"):
+            logging.getLogger(name).setLevel(logging.ERROR)
+
+    if all(os.path.exists(os.path.join(path, "chroma.sqlite3")) for path in fc.DB_PATHS.values()):
+        return None
+    fixture_dir = tempfile.TemporaryDirectory(prefix="openfarma-bench-")
+    print("Bases vectoriales no disponibles: se construyen desde abm.csv con embeddings simulados...")
+    buildFixture(fc, fc._embedding, fixture_dir.name)
+    return fixture_dir
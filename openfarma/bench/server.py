@@ -0,0 +1,447 @@
+"""
+Local stand-in for the OpenAI endpoints used by the application, for benchmarks that
+must run without network access.
+
+The server speaks enough of the Assistants (threads, messages, streamed runs and tool
+output submissions), Chat Completions (streamed, with tool calls) and Embeddings APIs
+for the official client, `Thread`, `EventHandler`, `CompletionsThread` and
+`OpenAIEmbeddings` to work unchanged against it. Every answer is
+deterministic and the model latency is simulated with configurable delays.
+
+Key Components:
+- StandInConfig: Simulated latencies and answer length.
+- CANNED_TOOL_CALLS: Tool call requested for a user message, chosen by keyword.
+- hashEmbedding: Deterministic bag-of-words embedding (similar texts get similar vectors).
+- StandInServer: Threaded HTTP server; `start()` runs it in the background and returns
+  the base URL to use as OPENAI_BASE_URL.
+- startProcess: Runs the stand-in in its own process, so its CPU and memory are not
+  charged to the process being measured. `requestCounts()` reads its counters.
+
+Typical Usage:
+    >>> server = StandInServer(StandInConfig(first_token_ms=300))
+    >>> os.environ["OPENAI_BASE_URL"] = server.start()
+    >>> thread = Thread("sk-bench")   # Talks to the stand-in
+
+    $ python -m openfarma.bench.server --port 8765   # Standalone, e.g. for the app
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import base64
+import hashlib
+import argparse
+import threading
+import subprocess
+import urllib.request
+from array import array
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Tuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+@dataclass
+class StandInConfig:
+    """
+    Simulated model behaviour.
+
+    Attributes:
+        first_token_ms (float): Delay before the first event of a run (queueing and
+            prompt processing).
+        tool_call_ms (float): Delay before a run asks for a tool call.
+        token_ms (float): Delay between streamed text deltas.
+        answer_deltas (int): Text deltas of each answer.
+        embedding_ms (float): Delay of an embeddings request.
+        request_ms (float): Delay of any other request (thread, message, run list).
+        dimensions (int): Embedding size (1536, like text-embedding-ada-002).
+    """
+    first_token_ms: float = 300
+    tool_call_ms: float = 400
+    token_ms: float = 15
+    answer_deltas: int = 40
+    embedding_ms: float = 60
+    request_ms: float = 40
+    dimensions: int = 1536
+
+# (keyword in the user message, function, arguments). The first match wins; a message
+# without a match calls buscar_productos with the message as the problem.
+CANNED_TOOL_CALLS: List[Tuple[str, str, Dict]] = [
+    ("cuántas marcas", "contar_marcas", {}),
+    ("qué marcas", "listar_marcas", {}),
+    ("promoción", "buscar_productos_por_problema_y_promocion", {"problematica": "{message}"}),
+    ("beneficio", "buscar_productos_por_beneficios", {"beneficio": "{message}"}),
+    ("cómo se usa", "buscar_productos_por_modo_uso", {"uso": "{message}"}),
+    ("categoría", "buscar_productos_por_categoria", {"categoria": "{message}"}),
+    ("para qué sirve", "buscar_productos_por_indicaciones", {"indicacion": "{message}"}),
+]
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+def cannedToolCall(message: str) -> Tuple[str, Dict]:
+    """Function and arguments the stand-in asks for when answering a user message."""
+    lowered = message.lower()
+    for keyword, name, arguments in CANNED_TOOL_CALLS:
+        if keyword in lowered:
+            return name, {key: value.format(message=message) for key, value in arguments.items()}
+    return "buscar_productos", {"problem": message}
+
+def hashEmbedding(text, dimensions: int = 1536) -> List[float]:
+    """
+    Deterministic embedding: each word adds weight to a few hashed dimensions.
+
+    Args:
+        text: Text, or a list of token ids (as sent by OpenAIEmbeddings).
+        dimensions (int): Vector size.
+
+    Returns:
+        List[float]: Unit-length vector.
+    """
+    words = [str(token) for token in text] if isinstance(text, list) else _WORD.findall(text.lower())
+    vector = [0.0] * dimensions
+    for word in words or [""]:
+        digest = hashlib.blake2b(word.encode(), digest_size=12).digest()
+        for i in range(0, 12, 3):
+            index = int.from_bytes(digest[i:i + 2], "little") % dimensions
+            vector[index] += 1.0 if digest[i + 2] & 1 else -1.0
+    norm = sum(value * value for value in vector) ** 0.5 or 1.0
+    return [value / norm for value in vector]
+
+def _id(prefix: str) -> str:
+    return f"{prefix}_{uuid.uuid4().hex[:24]}"
+
+class StandInServer:
+    """
+    Threaded HTTP stand-in for the OpenAI API.
+
+    Attributes:
+        config (StandInConfig): Simulated latencies.
+        requests (Dict[str, int]): Number of requests per endpoint, for reports.
+    """
+
+    def __init__(self, config: Optional[StandInConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or StandInConfig()
+        self.requests: Dict[str, int] = {}
+        self._threads: Dict[str, List[dict]] = {}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handlerClass())
+        self._httpd.daemon_threads = True
+        self._serving: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> str:
+        """Serve in a background thread and return the base URL."""
+        self._serving = threading.Thread(target=self._httpd.serve_forever, name="openai-stand-in", daemon=True)
+        self._serving.start()
+        return self.base_url
+
+    def stop(self) -> None:
+        """Stop serving."""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    # ------------------ Objects ------------------
+
+    def _thread(self, thread_id: str) -> dict:
+        return {"id": thread_id, "object": "thread", "created_at": int(time.time()),
+                "metadata": {}, "tool_resources": None}
+
+    def _message(self, thread_id: str, role: str, text: str, run_id: Optional[str] = None,
+                 message_id: Optional[str] = None, status: str = "completed") -> dict:
+        content = [{"type": "text", "text": {"value": text, "annotations": []}}] if text else []
+        return {"id": message_id or _id("msg"), "object": "thread.message", "created_at": int(time.time()),
+                "thread_id": thread_id, "role": role, "content": content, "run_id": run_id,
+                "assistant_id": None, "attachments": [], "metadata": {}, "status": status,
+                "completed_at": None, "incomplete_at": None, "incomplete_details": None}
+
+    def _run(self, thread_id: str, run_id: str, assistant_id: str, status: str,
+             required_action: Optional[dict] = None, usage: Optional[dict] = None) -> dict:
+        return {"id": run_id, "object": "thread.run", "created_at": int(time.time()),
+                "thread_id": thread_id, "assistant_id": assistant_id, "status": status,
+                "required_action": required_action, "last_error": None, "usage": usage,
+                "model": "stand-in", "instructions": "", "tools": [], "metadata": {},
+                "incomplete_details": None, "expires_at": None, "started_at": None,
+                "cancelled_at": None, "failed_at": None, "completed_at": None,
+                "truncation_strategy": None, "parallel_tool_calls": True,
+                "response_format": "auto", "tool_choice": "auto"}
+
+    # ------------------ Behaviour ------------------
+
+    def _lastUserMessage(self, thread_id: str) -> str:
+        with self._lock:
+            messages = self._threads.get(thread_id, [])
+            for message in reversed(messages):
+                if message["role"] == "user":
+                    return message["content"][0]["text"]["value"] if message["content"] else ""
+        return ""
+
+    def _runEvents(self, thread_id: str, assistant_id: str):
+        """Events of a new run: a canned tool call for the last user message."""
+        run_id = _id("run")
+        yield "thread.run.created", self._run(thread_id, run_id, assistant_id, "queued")
+        time.sleep(self.config.tool_call_ms / 1000)
+        name, arguments = cannedToolCall(self._lastUserMessage(thread_id))
+        required_action = {"type": "submit_tool_outputs", "submit_tool_outputs": {"tool_calls": [
+            {"id": _id("call"), "type": "function",
+             "function": {"name": name, "arguments": json.dumps(arguments, ensure_ascii=False)}}
+        ]}}
+        yield "thread.run.requires_action", self._run(thread_id, run_id, assistant_id,
+                                                      "requires_action", required_action)
+
+    def _answerChunks(self, output: str) -> List[str]:
+        """Text deltas of the answer to a tool output (up to answer_deltas)."""
+        products = re.findall(r"Nombre: (.+?) Presentacion", output)[:3]
+        answer = ("Te recomiendo: " + ", ".join(products) + ".") if products else output[:200]
+        words = answer.split() or ["Listo."]
+        size = max(1, -(-len(words) // self.config.answer_deltas))
+        return [" ".join(words[i:i + size]) + " " for i in range(0, len(words), size)]
+
+    def _answerEvents(self, thread_id: str, run_id: str, tool_outputs: List[dict]):
+        """Events of a run continued with tool outputs: a streamed text answer."""
+        time.sleep(self.config.first_token_ms / 1000)
+        output = " ".join(str(item.get("output", "")) for item in tool_outputs)
+        chunks = self._answerChunks(output)
+
+        message = self._message(thread_id, "assistant", "", run_id, status="in_progress")
+        yield "thread.message.created", message
+        for chunk in chunks:
+            time.sleep(self.config.token_ms / 1000)
+            yield "thread.message.delta", {"id": message["id"], "object": "thread.message.delta", "delta": {
+                "content": [{"index": 0, "type": "text", "text": {"value": chunk, "annotations": []}}]}}
+        text = "".join(chunks).strip()
+        completed = self._message(thread_id, "assistant", text, run_id, message_id=message["id"])
+        with self._lock:
+            self._threads.setdefault(thread_id, []).append(completed)
+        yield "thread.message.completed", completed
+        prompt_tokens = 1500 + len(output) // 4
+        completion_tokens = len(text) // 4
+        yield "thread.run.completed", self._run(thread_id, run_id, "", "completed", usage={
+            "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens})
+
+    def _completionChunks(self, body: dict):
+        """
+        Chunks of a streamed chat completion: a canned tool call when the last message
+        is the user's, a streamed answer once the tool outputs are in the messages.
+        """
+        completion_id, created = _id("chatcmpl"), int(time.time())
+        messages = body.get("messages", [])
+
+        def chunk(delta: Optional[dict] = None, finish_reason: Optional[str] = None, usage: Optional[dict] = None):
+            choices = [] if delta is None else [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            return {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                    "model": "stand-in", "choices": choices, "usage": usage}
+
+        prompt = sum(len(str(message.get("content") or "")) for message in messages)
+        last = messages[-1] if messages else {}
+        if last.get("role") == "user" and body.get("tools") and body.get("tool_choice") != "none":
+            time.sleep(self.config.tool_call_ms / 1000)
+            name, arguments = cannedToolCall(str(last.get("content") or ""))
+            yield chunk({"role": "assistant", "content": None, "tool_calls": [{
+                "index": 0, "id": _id("call"), "type": "function",
+                "function": {"name": name, "arguments": json.dumps(arguments, ensure_ascii=False)}}]})
+            yield chunk({}, "tool_calls")
+            completion = 20
+        else:
+            time.sleep(self.config.first_token_ms / 1000)
+            output = " ".join(str(message.get("content") or "") for message in messages if message.get("role") == "tool")
+            text = ""
+            for i, delta in enumerate(self._answerChunks(output)):
+                time.sleep(self.config.token_ms / 1000)
+                text += delta
+                yield chunk({"role": "assistant", "content": delta} if i == 0 else {"content": delta})
+            yield chunk({}, "stop")
+            completion = len(text) // 4
+        if (body.get("stream_options") or {}).get("include_usage"):
+            prompt_tokens = 1500 + prompt // 4
+            yield chunk(usage={"prompt_tokens": prompt_tokens, "completion_tokens": completion,
+                               "total_tokens": prompt_tokens + completion})
+
+    def _completion(self, body: dict) -> dict:
+        """Non-streamed chat completion (e.g. the context summaries): a short fixed text."""
+        time.sleep(self.config.first_token_ms / 1000)
+        prompt_tokens = sum(len(str(message.get("content") or "")) for message in body.get("messages", [])) // 4
+        return {"id": _id("chatcmpl"), "object": "chat.completion", "created": int(time.time()),
+                "model": body.get("model", "stand-in"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "Resumen de la conversación."}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 6, "total_tokens": prompt_tokens + 6}}
+
+    def _embeddings(self, body: dict) -> dict:
+        time.sleep(self.config.embedding_ms / 1000)
+        inputs = body.get("input", [])
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        data = []
+        for i, text in enumerate(inputs):
+            vector = hashEmbedding(text, self.config.dimensions)
+            if body.get("encoding_format") == "base64":
+                vector = base64.b64encode(array("f", vector).tobytes()).decode()
+            data.append({"object": "embedding", "index": i, "embedding": vector})
+        return {"object": "list", "data": data, "model": body.get("model", "stand-in"),
+                "usage": {"prompt_tokens": 0, "total_tokens": 0}}
+
+    # ------------------ HTTP ------------------
+
+    def _handlerClass(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _body(self) -> dict:
+                length = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+            def _json(self, payload: dict, status: int = 200) -> None:
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, events) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for event, data in events:
+                    self._chunk(f"event: {event}\ndata: {json.dumps(data)}\n\n")
+                self._chunk("event: done\ndata: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _streamData(self, chunks) -> None:
+                """Server-sent events without event names, as the Chat Completions API streams."""
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for data in chunks:
+                    self._chunk(f"data: {json.dumps(data)}\n\n")
+                self._chunk("data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _chunk(self, text: str) -> None:
+                data = text.encode()
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def _count(self, endpoint: str) -> None:
+                with server._lock:
+                    server.requests[endpoint] = server.requests.get(endpoint, 0) + 1
+
+            def do_GET(self):
+                if self.path == "/bench/requests":
+                    with server._lock:
+                        return self._json(dict(server.requests))
+                parts = self.path.split("?")[0].strip("/").split("/")
+                time.sleep(server.config.request_ms / 1000)
+                if parts[1:2] == ["threads"] and parts[-1] == "runs":
+                    self._count("runs.list")
+                    return self._json({"object": "list", "data": [], "first_id": None,
+                                       "last_id": None, "has_more": False})
+                if parts[1:2] == ["threads"] and parts[-1] == "messages":
+                    self._count("messages.list")
+                    with server._lock:
+                        messages = list(reversed(server._threads.get(parts[2], [])))
+                    return self._json({"object": "list", "data": messages, "first_id": None,
+                                       "last_id": None, "has_more": False})
+                self._json({"error": {"message": f"Not found: {self.path}"}}, 404)
+
+            def do_DELETE(self):
+                parts = self.path.strip("/").split("/")
+                self._count("threads.delete")
+                with server._lock:
+                    server._threads.pop(parts[-1], None)
+                self._json({"id": parts[-1], "object": "thread.deleted", "deleted": True})
+
+            def do_POST(self):
+                parts = self.path.split("?")[0].strip("/").split("/")[1:]
+                body = self._body()
+                if parts == ["embeddings"]:
+                    self._count("embeddings")
+                    return self._json(server._embeddings(body))
+                if parts == ["chat", "completions"]:
+                    self._count("chat.completions")
+                    if body.get("stream"):
+                        return self._streamData(server._completionChunks(body))
+                    return self._json(server._completion(body))
+                if parts == ["threads"]:
+                    self._count("threads.create")
+                    time.sleep(server.config.request_ms / 1000)
+                    thread_id = _id("thread")
+                    messages = [server._message(thread_id, m["role"], m["content"])
+                                for m in body.get("messages", [])]
+                    with server._lock:
+                        server._threads[thread_id] = messages
+                    return self._json(server._thread(thread_id))
+                if len(parts) == 3 and parts[0] == "threads" and parts[2] == "messages":
+                    self._count("messages.create")
+                    time.sleep(server.config.request_ms / 1000)
+                    message = server._message(parts[1], body.get("role", "user"), body.get("content", ""))
+                    with server._lock:
+                        server._threads.setdefault(parts[1], []).append(message)
+                    return self._json(message)
+                if len(parts) == 3 and parts[0] == "threads" and parts[2] == "runs":
+                    self._count("runs.stream")
+                    return self._stream(server._runEvents(parts[1], body.get("assistant_id", "")))
+                if len(parts) == 5 and parts[2] == "runs" and parts[4] == "submit_tool_outputs":
+                    self._count("runs.submit_tool_outputs")
+                    return self._stream(server._answerEvents(parts[1], parts[3], body.get("tool_outputs", [])))
+                self._json({"error": {"message": f"Not found: {self.path}"}}, 404)
+
+        return Handler
+
+def startProcess(config: Optional[StandInConfig] = None, host: str = "127.0.0.1") -> Tuple[subprocess.Popen, str]:
+    """
+    Run the stand-in in a child process.
+
+    Args:
+        config (StandInConfig, optional): Simulated latencies.
+        host (str): Address to listen on (a free port is chosen).
+
+    Returns:
+        Tuple[subprocess.Popen, str]: The process (terminate it when done) and the base URL.
+    """
+    config = config or StandInConfig()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "openfarma.bench.server", "--host", host, "--port", "0",
+         "--config", json.dumps(asdict(config))],
+        stdout=subprocess.PIPE, text=True,
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [PROJECT_ROOT, os.environ.get("PYTHONPATH")]))}
+    )
+    base_url = process.stdout.readline().strip()
+    if not base_url.startswith("http"):
+        process.kill()
+        raise Exception("Error starting the OpenAI stand-in process")
+    return process, base_url
+
+def requestCounts(base_url: str) -> Dict[str, int]:
+    """Requests per endpoint served by a stand-in, given its base URL."""
+    with urllib.request.urlopen(base_url[:-len("/v1")] + "/bench/requests") as response:
+        return json.loads(response.read())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenAI simulado para pruebas sin red.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--config", default="{}", help="StandInConfig en JSON")
+    args = parser.parse_args()
+
+    server = StandInServer(StandInConfig(**json.loads(args.config)), args.host, args.port)
+    print(server.base_url, flush=True)
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,117 @@
+"""
+Per-stage timing of benchmark turns.
+
+Functions are wrapped in place with `StageTimer.instrument`. Each stage records its
+exclusive time: when a timed function calls another timed function, the time spent in
+the inner one is charged to the inner stage only, so the stages of a turn add up to
+its total.
+
+Typical Usage:
+    >>> timer = StageTimer()
+    >>> timer.instrument(fc, "retrieveSaleData", "csv join")
+    >>> with timer.turn():
+    ...     chat.processQueue(handlers)
+    >>> timer.report(["csv join"])
+"""
+
+import math
+import time
+import threading
+import functools
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Percentile of a list of values (nearest rank)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered), max(1, math.ceil(fraction * len(ordered)))) - 1]
+
+class StageTimer:
+    """
+    Exclusive time per stage, accumulated per turn.
+
+    Attributes:
+        turns (List[Dict[str, float]]): Seconds spent in each stage, per finished turn
+            (the "turn" key holds the whole turn).
+    """
+
+    def __init__(self):
+        self.turns: List[Dict[str, float]] = []
+        self._local = threading.local()
+
+    def _state(self):
+        state = self._local
+        if not hasattr(state, "stack"):
+            state.stack, state.current = [], None
+        return state
+
+    def instrument(self, owner, name: str, stage: str) -> Callable:
+        """
+        Replace `owner.name` with a timed version of it.
+
+        Args:
+            owner: Module, class or instance holding the function.
+            name (str): Attribute name.
+            stage (str): Stage the time is charged to.
+
+        Returns:
+            Callable: The original function.
+        """
+        original = getattr(owner, name)
+        timer = self
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            with timer.stage(stage):
+                return original(*args, **kwargs)
+
+        setattr(owner, name, timed)
+        return original
+
+    @contextmanager
+    def stage(self, stage: str):
+        """Charge the time spent in the block (minus nested stages) to a stage."""
+        state = self._state()
+        frame = [stage, time.perf_counter(), 0.0]  # stage, start, nested seconds
+        state.stack.append(frame)
+        try:
+            yield
+        finally:
+            state.stack.pop()
+            elapsed = time.perf_counter() - frame[1]
+            if state.stack:
+                state.stack[-1][2] += elapsed
+            if state.current is not None:
+                state.current[stage] = state.current.get(stage, 0.0) + elapsed - frame[2]
+
+    @contextmanager
+    def turn(self):
+        """Collect the stages of one turn."""
+        state = self._state()
+        state.current = {}
+        start = time.perf_counter()
+        try:
+            yield state.current
+        finally:
+            state.current["turn"] = time.perf_counter() - start
+            self.turns.append(state.current)
+            state.current = None
+
+    def report(self, stages: Optional[List[str]] = None) -> List[str]:
+        """
+        Lines with the p50 and p95 of each stage, in milliseconds per turn.
+
+        Args:
+            stages (List[str], optional): Stages to report, in order. Defaults to every
+                stage seen, followed by the turn total.
+        """
+        if stages is None:
+            seen = {stage for turn in self.turns for stage in turn if stage != "turn"}
+            stages = sorted(seen) + ["turn"]
+        lines = [f"{'etapa':<18}{'p50 ms':>10}{'p95 ms':>10}{'turnos':>8}"]
+        for stage in stages:
+            values = [turn.get(stage, 0.0) * 1000 for turn in self.turns]
+            lines.append(f"{stage:<18}{percentile(values, 0.5):>10.1f}{percentile(values, 0.95):>10.1f}{len(values):>8}")
+        return lines
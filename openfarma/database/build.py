@@ -4,6 +4,7 @@ from langchain_community.vectorstores import Chroma
 from langchain_openai import OpenAIEmbeddings
 from langchain.docstore.document import Document
 from openfarma.src.params import PRODUCTS_PATH, CHROMA_DB_PATH
+from openfarma.src.ratelimit import getHttpClient
 
 OPENFARMA_API_KEY = st.secrets["OPENFARMA_API_KEY"]
 
@@ -28,7 +29,7 @@ except Exception as e:
     print(f"Error procesando el archivo {PRODUCTS_PATH}: {e}")
 
 # Build the vector database
-embedding = OpenAIEmbeddings(api_key=OPENFARMA_API_KEY)
+embedding = OpenAIEmbeddings(api_key=OPENFARMA_API_KEY, http_client=getHttpClient("batch"))
 smalldb = Chroma.from_documents(documents=documents, embedding=embedding, persist_directory=CHROMA_DB_PATH)
 size = len(smalldb.get()["ids"])
 print(f"Embeddings completados. Base de datos Chroma lista con {size} documentos.")
@@ -44,9 +44,11 @@ Usage:
 import os
 import sys
 import time
+import threading
 import subprocess
 import streamlit as st
 from datetime import datetime
+from streamlit.errors import StreamlitAPIException
 
 # ------------------ Environment Configuration ------------------
 
@@ -91,12 +93,13 @@ if REPO_DIR not in sys.path:
 
 # ------------------ Module Imports ------------------
 
+# Only what the login page needs is imported here. The chat (OpenAI client), the
+# function calling module (pandas, langchain, Chroma) and the delivery queue are
+# imported on first use. Run openfarma/run/profile-startup.py to measure imports.
 try:
     # Import OpenFarma application modules
     from openfarma.src.login import loginPage
     from openfarma.src.params import *
-    from openfarma.src.fc import *
-    from openfarma.src.chat import Chat, ChatConfig
 except ImportError as e:
     raise ImportError(f"Import error: {e}")
 
@@ -107,6 +110,141 @@ except ImportError as e:
 api_key = st.secrets["OPENFARMA_API_KEY"]
 assistant_id = st.secrets["OPENFARMA_ASSISTANT_ID"]
 
+# ------------------ Fragments ------------------
+
+def updateStockIfDue() -> None:
+    """
+    Update the store stock when STOCK_UPDATE_INTERVAL has passed since the last update.
+
+    Called on full reruns and by the chat fragment, since with fragments most
+    interactions no longer rerun the whole app.
+    """
+    if time.time() - st.session_state.last_stock_update >= STOCK_UPDATE_INTERVAL:
+        from openfarma.src.tracing import span
+
+        try:
+            env = os.environ.copy()
+            env['PYTHONPATH'] = f"{REPO_DIR}:{env.get('PYTHONPATH', '')}"
+            
+            # Execute stock update script (traced: it delays the answer of the pending prompt)
+            with span("stock.refresh", store_id=st.session_state.store_id):
+                subprocess.run(
+                    [sys.executable, PULL_STOCK_PATH, st.session_state.store_id],
+                    check=True,
+                    env=env
+                )
+            st.session_state.last_stock_update = time.time()
+        except Exception as e:
+            st.error(f"Error actualizando stock: {str(e)}")
+
+@st.cache_resource(show_spinner=False)
+def warmThreadPool() -> bool:
+    """
+    Start filling the thread pool in the background, once per process.
+
+    The pool module (and the OpenAI client with it) is imported in the background
+    thread, so the login page doesn't wait for it. The pool holds Assistants threads,
+    so nothing is warmed when the chat runs on the Chat Completions engine. Cached as
+    a resource: the reruns of the login page don't start it again.
+
+    Returns:
+        bool: True if the warm-up was started.
+    """
+    if CHAT_ENGINE != "assistants":
+        return False
+
+    def warm():
+        try:
+            from assistant.pool import getThreadPool
+            getThreadPool(api_key, CHAT_WELCOME_MESSAGE, CONTEXT_LAST_MESSAGES)
+        except Exception as e:
+            print(f"Error warming thread pool: {str(e)}")
+    threading.Thread(target=warm, name="thread-pool-warmup", daemon=True).start()
+    return True
+
+def rerunFragment() -> None:
+    """Rerun the current fragment, or the whole app when running as part of a full rerun."""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+@st.fragment
+def chatFragment() -> None:
+    """
+    Chat pane: messages, input and queue processing.
+
+    Submitting a prompt and streaming the answer rerun only this fragment, so the
+    sidebar, CSS, header and data synchronization checks aren't executed again.
+    """
+    from openfarma.src.fc import handlers
+
+    chat = st.session_state.chat
+    chat.renderChatPane()
+
+    # Process any pending messages in the queue
+    # This handles AI responses and tool calls
+    if chat.prompts_queue:
+        updateStockIfDue()
+    if chat.processQueue(handlers):
+        rerunFragment()
+
+@st.fragment
+def sidebarFragment() -> None:
+    """Store information and logout button."""
+    st.markdown("---")
+    st.markdown("**Sucursal**")
+    st.text(st.session_state.store_name)
+    st.text(st.session_state.store_address)
+    st.text(st.session_state.store_location)
+
+    # ------------------ Logout and Session Cleanup ------------------
+    
+    # Add logout button to sidebar
+    st.markdown("---")
+    if st.button("Cerrar Sesión", key="logout_button"):
+        # Prepare metadata for conversation export
+        metadata = {
+            'Usuario': st.session_state.username,
+            'Sucursal': st.session_state.store_name,
+            'Dirección': st.session_state.store_address,
+            'Localidad': st.session_state.store_location
+        }
+        
+        # Only export and send if there was actual conversation
+        # This prevents empty exports and unnecessary emails
+        if len(st.session_state.chat.messages) > 1:
+            # Queue the conversation for PDF export and email delivery.
+            # Rendering and sending run in the background, so logout doesn't wait on SMTP
+            from openfarma.src.delivery import getDeliveryQueue
+
+            output_path = f"{HISTORY_PATH}/chatbot_{datetime.now().strftime('%Y-%m-%d %H-%M')}.pdf"
+            getDeliveryQueue().submit(
+                messages=st.session_state.chat.messages,
+                metadata=metadata,
+                output_path=output_path,
+                header_logo_path=HEADER_LOGO_PATH
+            )
+        
+        # Report final prompt count and clear chat state
+        st.session_state.chat.clearChat()
+        
+        # Clear all authentication and session state
+        # This ensures a clean logout
+        st.session_state.authenticated = False
+        st.session_state.username = None
+        st.session_state.store_name = None
+        st.session_state.store_address = None
+        st.session_state.store_location = None
+        
+        # Remove data synchronization flags
+        del st.session_state.is_stock
+        del st.session_state.last_stock_update
+        
+        # Rerun the app to return to login screen
+        st.rerun()
+
+
 # ------------------ Main Application Function ------------------
 
 def main():
@@ -156,18 +294,18 @@ def main():
     
     # Check if user is authenticated
     if not st.session_state.authenticated:
+        # Start filling the thread pool while the user logs in
+        warmThreadPool()
+
         # Show login page for unauthenticated users
         loginPage()
     else:
         # ------------------ Authenticated User Interface ------------------
         
-        # Display store information in the sidebar
-        # This provides context about the current store session
-        st.sidebar.markdown("---")
-        st.sidebar.markdown("**Sucursal**")
-        st.sidebar.text(st.session_state.store_name)
-        st.sidebar.text(st.session_state.store_address)
-        st.sidebar.text(st.session_state.store_location)
+        # Display store information and the logout button in the sidebar
+        # The sidebar is a fragment, so it doesn't rerun with the chat
+        with st.sidebar:
+            sidebarFragment()
         
         # ------------------ Data Synchronization ------------------
         
@@ -232,28 +370,16 @@ def main():
         if "last_stock_update" not in st.session_state:
             st.session_state.last_stock_update = time.time()
 
-        # Check if it's time to update stock data
-        # Updates occur every hour (configurable via STOCK_UPDATE_INTERVAL)
-        if time.time() - st.session_state.last_stock_update >= STOCK_UPDATE_INTERVAL:
-            try:
-                env = os.environ.copy()
-                env['PYTHONPATH'] = f"{REPO_DIR}:{env.get('PYTHONPATH', '')}"
-                
-                # Execute stock update script
-                subprocess.run(
-                    [sys.executable, PULL_STOCK_PATH, st.session_state.store_id],
-                    check=True,
-                    env=env
-                )
-                st.session_state.last_stock_update = time.time()
-            except Exception as e:
-                st.error(f"Error actualizando stock: {str(e)}")
+        # Check if it's time to update stock data (also checked by the chat fragment)
+        updateStockIfDue()
 
         # ------------------ Chat Interface Initialization ------------------
         
         # Initialize chat interface if it doesn't exist
         # This creates the main AI assistant interface
         if "chat" not in st.session_state:
+            from openfarma.src.chat import Chat, ChatConfig
+
             # Configure chat interface with store-specific settings
             config = ChatConfig(
                 title="💬 openfarmAI",
@@ -262,72 +388,18 @@ def main():
                 user_avatar_path=AVATAR_USER_PATH,
                 bot_avatar_path=AVATAR_BOT_PATH,
                 input_placeholder="Escriba su consulta aquí...",
-                loading_text="Buscando información..."
+                loading_text="Buscando información...",
+                store_id=st.session_state.store_id
             )
             # Create chat instance with API configuration
             st.session_state.chat = Chat(api_key, assistant_id, config)
         
-        # Apply chat styling to the interface
+        # Apply chat styling and render the static header (full reruns only)
         st.html(st.session_state.chat.style.style)
+        st.session_state.chat.renderHeader()
 
-        # Render the main chat interface
-        st.session_state.chat.renderChatInterface()
-
-        # Process any pending messages in the queue
-        # This handles AI responses and tool calls
-        if st.session_state.chat.processQueue(handlers):
-            st.rerun()
-
-        # ------------------ Logout and Session Cleanup ------------------
-        
-        # Add logout button to sidebar
-        st.sidebar.markdown("---")
-        if st.sidebar.button("Cerrar Sesión", key="logout_button"):
-            # Prepare metadata for conversation export
-            metadata = {
-                'Usuario': st.session_state.username,
-                'Sucursal': st.session_state.store_name,
-                'Dirección': st.session_state.store_address,
-                'Localidad': st.session_state.store_location
-            }
-            
-            # Only export and send if there was actual conversation
-            # This prevents empty exports and unnecessary emails
-            if len(st.session_state.chat.messages) > 1:
-                # Export conversation to PDF with timestamp
-                output_path = f"{HISTORY_PATH}/chatbot_{datetime.now().strftime('%Y-%m-%d %H-%M')}.pdf"
-                st.session_state.chat.exportConversation(
-                    format="pdf", 
-                    metadata=metadata, 
-                    output_path=output_path
-                )
-
-                # Send conversation to email for record keeping
-                st.session_state.chat.sendConversationEmail(
-                    from_email=EMAIL_FROM, 
-                    to_email=EMAIL_TO, 
-                    password=EMAIL_PASSWORD, 
-                    attachments=[output_path], 
-                    metadata=metadata
-                )
-            
-            # Report final prompt count and clear chat state
-            st.session_state.chat.clearChat()
-            
-            # Clear all authentication and session state
-            # This ensures a clean logout
-            st.session_state.authenticated = False
-            st.session_state.username = None
-            st.session_state.store_name = None
-            st.session_state.store_address = None
-            st.session_state.store_location = None
-            
-            # Remove data synchronization flags
-            del st.session_state.is_stock
-            del st.session_state.last_stock_update
-            
-            # Rerun the app to return to login screen
-            st.rerun()
+        # Render messages and input, and process the queue in an isolated fragment
+        chatFragment()
 
 # ------------------ Application Entry Point ------------------
 
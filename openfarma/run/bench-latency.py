@@ -0,0 +1,153 @@
+import os, sys
+import json
+import argparse
+from pathlib import Path
+
+# Add the project root (and src/, like main.py) to the Python path
+project_root = str(Path(__file__).parent.parent.parent)
+for path in (project_root, os.path.join(project_root, "src")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from openfarma.bench.server import StandInServer, StandInConfig
+from openfarma.bench.timing import StageTimer, percentile
+from openfarma.bench.offline import QUERIES, NullTracker, setupOffline
+
+STAGES = ["routing", "run checks", "post message", "run stream", "prefetch wait", "embedding", "retrieval",
+          "csv join", "context", "tool handler", "tool submission", "render", "context budget", "turn"]
+
+ENGINES = ["assistants", "completions"]
+
+def instrument(timer: StageTimer, fc, handlers: dict) -> dict:
+    """Wrap the functions of every stage of a turn (both engines). Returns the timed tool handlers."""
+    from assistant.thread import Thread, EventHandler, StreamedMessage
+    from assistant.completions import CompletionsThread
+    from openfarma.src.chat import Chat
+    from openfarma.src.embeddings import EmbeddingGateway
+    from openfarma.src.prefetch import RetrievalPrefetch
+    from openfarma.src.router import IntentRouter
+
+    for engine in (Thread, CompletionsThread):
+        timer.instrument(engine, "isRunActive", "run checks")
+        timer.instrument(engine, "runWithStreaming", "run stream")
+    timer.instrument(Thread, "_sendMessage", "post message")
+    timer.instrument(CompletionsThread, "addMessage", "post message")
+    timer.instrument(StreamedMessage, "append", "render")
+    timer.instrument(EventHandler, "submitToolOutputs", "tool submission")
+    timer.instrument(CompletionsThread, "submitToolOutputs", "tool submission")
+    timer.instrument(IntentRouter, "route", "routing")
+    timer.instrument(RetrievalPrefetch, "lookup", "prefetch wait")
+    timer.instrument(EmbeddingGateway, "embed", "embedding")
+    timer.instrument(fc, "retrieveVectorDB", "retrieval")
+    timer.instrument(fc, "retrieveSaleData", "csv join")
+    timer.instrument(fc, "retrieveImages", "csv join")
+    timer.instrument(fc, "composeProductContext", "context")
+    timer.instrument(Chat, "manageContext", "context budget")
+
+    timed = {}
+    for name, handler in handlers.items():
+        def run(*args, handler=handler, **kwargs):
+            with timer.stage("tool handler"):
+                return handler(*args, **kwargs)
+        timed[name] = run
+    return timed
+
+parser = argparse.ArgumentParser(description="Latencia por etapa de un turno de chat, sin red (OpenAI simulado).")
+parser.add_argument("--turns", type=int, default=24, help="Turnos medidos")
+parser.add_argument("--warmup", type=int, default=2, help="Turnos previos no medidos")
+parser.add_argument("--engine", choices=ENGINES + ["both"], default="both",
+                    help="Motor de conversación: assistants (threads y runs), completions (historial local) o ambos")
+parser.add_argument("--no-prefetch", action="store_true",
+                    help="No iniciar la búsqueda de productos al encolar la consulta")
+parser.add_argument("--answer-cache", action="store_true",
+                    help="Responder las consultas repetidas desde el caché de respuestas (se mide sin él)")
+parser.add_argument("--no-router", action="store_true",
+                    help="Enviar también al asistente las consultas de estadísticas del catálogo")
+parser.add_argument("--first-token-ms", type=float, default=StandInConfig.first_token_ms)
+parser.add_argument("--tool-call-ms", type=float, default=StandInConfig.tool_call_ms)
+parser.add_argument("--token-ms", type=float, default=StandInConfig.token_ms)
+parser.add_argument("--answer-deltas", type=int, default=StandInConfig.answer_deltas)
+parser.add_argument("--embedding-ms", type=float, default=StandInConfig.embedding_ms)
+parser.add_argument("--request-ms", type=float, default=StandInConfig.request_ms)
+parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+args = parser.parse_args()
+
+config = StandInConfig(
+    first_token_ms=args.first_token_ms, tool_call_ms=args.tool_call_ms, token_ms=args.token_ms,
+    answer_deltas=args.answer_deltas, embedding_ms=args.embedding_ms, request_ms=args.request_ms
+)
+server = StandInServer(config)
+base_url = server.start()
+
+fixture_dir = setupOffline(base_url)
+
+from openfarma.src import fc
+from openfarma.src.chat import Chat, ChatConfig
+
+timer = StageTimer()
+handlers = instrument(timer, fc, fc.handlers)
+engines = ENGINES if args.engine == "both" else [args.engine]
+results = {}
+
+for engine in engines:
+    chat = Chat("sk-bench", "asst_bench", ChatConfig(
+        header_logo_path=fc.HEADER_LOGO_PATH,
+        user_avatar_path=fc.AVATAR_USER_PATH,
+        bot_avatar_path=fc.AVATAR_BOT_PATH,
+        engine=engine,
+        prefetch=not args.no_prefetch,
+        answer_cache=args.answer_cache,
+        intent_router=not args.no_router
+    ))
+    chat.prompt_tracker = NullTracker()
+
+    requests_before = dict(server.requests)
+    for i in range(args.warmup + args.turns):
+        query = QUERIES[i % len(QUERIES)]
+        if i < args.warmup:
+            chat.processUserInput(query)
+            chat.processQueue(handlers)
+            requests_before = dict(server.requests)
+            continue
+        with timer.turn():
+            chat.processUserInput(query)
+            chat.processQueue(handlers)
+        if len(chat.messages) > 40:
+            chat.clearChat(report=False)
+    requests = {name: count - requests_before.get(name, 0) for name, count in server.requests.items()
+                if count - requests_before.get(name, 0)}
+    results[engine] = {"turns": timer.turns, "requests": requests}
+    timer.turns = []
+
+print(f"\nOpenAI simulado en {base_url}: primer token {config.first_token_ms:.0f} ms, "
+      f"llamada a herramienta {config.tool_call_ms:.0f} ms, {config.answer_deltas} deltas cada "
+      f"{config.token_ms:.0f} ms, embeddings {config.embedding_ms:.0f} ms, otras {config.request_ms:.0f} ms")
+for engine, result in results.items():
+    timer.turns = result["turns"]
+    print(f"\nMotor {engine}. Pedidos por turno: "
+          f"{', '.join(f'{name}={count / args.turns:.1f}' for name, count in sorted(result['requests'].items()))}\n")
+    for line in timer.report(STAGES):
+        print(line)
+
+if len(results) > 1:
+    print(f"\n{'turno':<18}" + "".join(f"{engine + ' p50':>18}{'p95':>10}" for engine in results))
+    for stage in ("run checks", "post message", "run stream", "tool submission", "turn"):
+        cells = ""
+        for result in results.values():
+            values = [turn.get(stage, 0.0) * 1000 for turn in result["turns"]]
+            cells += f"{percentile(values, 0.5):>18.1f}{percentile(values, 0.95):>10.1f}"
+        print(f"{stage:<18}{cells}")
+
+if args.output:
+    summary = {}
+    for engine, result in results.items():
+        stages = {}
+        for stage in STAGES:
+            values = [turn.get(stage, 0.0) * 1000 for turn in result["turns"]]
+            stages[stage] = {"p50": round(percentile(values, 0.5), 2), "p95": round(percentile(values, 0.95), 2)}
+        summary[engine] = {"turns": len(result["turns"]), "requests": result["requests"], "stages": stages}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"config": vars(config), "engines": summary}, f, indent=2)
+    print(f"\nResultados guardados en {args.output}")
+
+server.stop()
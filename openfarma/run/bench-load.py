@@ -0,0 +1,106 @@
+import os, sys
+import json
+import argparse
+from dataclasses import asdict
+from pathlib import Path
+
+# Add the project root (and src/, like main.py) to the Python path
+project_root = str(Path(__file__).parent.parent.parent)
+for path in (project_root, os.path.join(project_root, "src")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from openfarma.bench.server import StandInConfig, startProcess, requestCounts
+from openfarma.bench.timing import percentile
+from openfarma.bench.offline import setupOffline
+from openfarma.bench.load import LoadProfile, LoadGenerator
+
+def line(name: str, values: list, unit: str = "ms", scale: float = 1000) -> str:
+    """Report line with the p50, p95 and max of a list of seconds."""
+    values = [value * scale for value in values]
+    return (f"  {name:<22}{percentile(values, 0.5):>10.1f}{percentile(values, 0.95):>10.1f}"
+            f"{max(values, default=0.0):>10.1f}  {unit}")
+
+parser = argparse.ArgumentParser(description="Carga de sesiones concurrentes de todas las sucursales, sin red (OpenAI simulado).")
+parser.add_argument("--sessions", type=int, default=LoadProfile.sessions, help="Sesiones concurrentes")
+parser.add_argument("--turns", type=int, default=LoadProfile.turns, help="Consultas por sesión")
+parser.add_argument("--think", type=float, default=LoadProfile.think_s, help="Segundos promedio entre consultas")
+parser.add_argument("--ramp", type=float, default=LoadProfile.ramp_s, help="Segundos en los que se reparten los ingresos")
+parser.add_argument("--refresh-turns", type=int, default=LoadProfile.stock_refresh_turns,
+                    help="Actualización de stock cada tantas consultas (0 para ninguna)")
+parser.add_argument("--download-ms", type=float, default=LoadProfile.stock_download_ms,
+                    help="Demora simulada de la descarga de stock")
+parser.add_argument("--engine", choices=["assistants", "completions"], default=LoadProfile.engine,
+                    help="Motor de conversación de las sesiones")
+parser.add_argument("--answer-cache", action="store_true",
+                    help="Responder las consultas repetidas de cada sucursal desde el caché de respuestas")
+parser.add_argument("--max-active", type=int, default=None, help="Consultas procesadas a la vez (el resto espera)")
+parser.add_argument("--first-token-ms", type=float, default=StandInConfig.first_token_ms)
+parser.add_argument("--tool-call-ms", type=float, default=StandInConfig.tool_call_ms)
+parser.add_argument("--token-ms", type=float, default=StandInConfig.token_ms)
+parser.add_argument("--answer-deltas", type=int, default=StandInConfig.answer_deltas)
+parser.add_argument("--embedding-ms", type=float, default=StandInConfig.embedding_ms)
+parser.add_argument("--request-ms", type=float, default=StandInConfig.request_ms)
+parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+args = parser.parse_args()
+
+config = StandInConfig(
+    first_token_ms=args.first_token_ms, tool_call_ms=args.tool_call_ms, token_ms=args.token_ms,
+    answer_deltas=args.answer_deltas, embedding_ms=args.embedding_ms, request_ms=args.request_ms
+)
+profile = LoadProfile(
+    sessions=args.sessions, turns=args.turns, think_s=args.think, ramp_s=args.ramp,
+    stock_refresh_turns=args.refresh_turns, stock_download_ms=args.download_ms, max_active=args.max_active,
+    engine=args.engine, answer_cache=args.answer_cache
+)
+
+# The stand-in runs in its own process: its CPU and memory are not charged to the sessions
+server, base_url = startProcess(config)
+try:
+    fixture_dir = setupOffline(base_url)
+    from openfarma.src import fc
+
+    # One session first, so imports and database loads are not part of the measurement
+    print("Calentando (una sesión)...")
+    LoadGenerator(LoadProfile(sessions=1, turns=1, think_s=0, ramp_s=0, stock_refresh_turns=0,
+                              engine=profile.engine), fc.handlers).run()
+
+    generator = LoadGenerator(profile, fc.handlers)
+    stores = len({store for store, _ in generator.users})
+    print(f"Simulando {profile.sessions} sesiones ({stores} sucursales), {profile.turns} consultas cada una...")
+    stats = generator.run()
+    counts = requestCounts(base_url)
+
+    turns = [t for s in stats for t in s.turns]
+    errors = [e for s in stats for e in s.errors]
+    mb = 1024 * 1024
+
+    print(f"\nDuración {generator.wall:.1f} s, {len(turns)} consultas, {len(errors)} errores")
+    print(f"Rendimiento: {len(turns) / generator.wall * 60:.1f} consultas/min, "
+          f"{profile.sessions / generator.wall * 60:.1f} sesiones/min\n")
+    print(f"  {'':<22}{'p50':>10}{'p95':>10}{'máx':>10}")
+    print(line("respuesta", turns))
+    print(line("espera en cola", [d for s in stats for d in s.queue_delays]))
+    print(line("ingreso", [s.login for s in stats]))
+    print(line("actualización stock", [r for s in stats for r in s.refreshes]))
+    print(line("cierre de sesión", [s.logout for s in stats]))
+    print(line("CPU por sesión", [s.cpu for s in stats]))
+    print(f"\nCPU del proceso: {generator.cpu:.2f} s ({generator.cpu / generator.wall:.2f} núcleos en promedio, "
+          f"{generator.cpu / profile.sessions * 1000:.0f} ms por sesión); subprocesos de stock: {generator.children_cpu:.2f} s")
+    print(f"RSS: base {generator.rss_baseline / mb:.0f} MB, pico {generator.rss_peak / mb:.0f} MB, "
+          f"{(generator.rss_peak - generator.rss_baseline) / profile.sessions / mb:.1f} MB por sesión")
+    print(f"Pedidos: {', '.join(f'{name}={count}' for name, count in sorted(counts.items()))}")
+    for error in errors[:5]:
+        print(f"Error: {error}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "config": asdict(config), "profile": asdict(profile), "wall": generator.wall,
+                "cpu": generator.cpu, "children_cpu": generator.children_cpu,
+                "rss_baseline": generator.rss_baseline, "rss_peak": generator.rss_peak,
+                "requests": counts, "sessions": [asdict(s) for s in stats]
+            }, f, indent=2)
+        print(f"\nResultados guardados en {args.output}")
+finally:
+    server.terminate()
@@ -11,6 +11,7 @@ project_root = str(Path(__file__).parent.parent.parent)
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 from openfarma.src.params import ABM_PATH, CHROMA_DB_PATH
+from openfarma.src.ratelimit import getHttpClient
 
 OPENFARMA_API_KEY = st.secrets["OPENFARMA_API_KEY"]
 BASE_COLUMNS = ['Marca', 'Nombre', 'Presentacion']
@@ -117,7 +118,8 @@ def process_csv_data():
     """Process CSV data and create/update vector databases."""
     df = pd.read_csv(ABM_PATH, sep=',', encoding='utf-8')
     combinations = get_column_combinations(df)
-    embedding = OpenAIEmbeddings(api_key=OPENFARMA_API_KEY)
+    # Batch priority: the chat sessions sharing the API key go first
+    embedding = OpenAIEmbeddings(api_key=OPENFARMA_API_KEY, http_client=getHttpClient("batch"))
     
     # Process a database with all columns
     db_name, num_docs = process_database_combination(df, df.columns.tolist(), embedding, name="db_all")
@@ -0,0 +1,28 @@
+import sys
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = str(Path(__file__).parent.parent.parent)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from openfarma.src.params import *
+from openfarma.src.snapshot import Snapshot, writeSnapshotFromCsv
+
+# Tables and the columns indexed for key lookups
+snapshots = {
+    STOCK_PATH: ["ean"],
+    IMAGES_PATH: ["SKU", "EAN"],
+    ABM_PATH: ["EAN"],
+    PRODUCTS_PATH: ["EAN"],
+    LOGIN_PATH: ["Usuario"],
+    STORES_PATH: ["ID"],
+}
+
+# Rebuild every snapshot from the current csv files
+for csv_path, index_columns in snapshots.items():
+    try:
+        snapshot = Snapshot(writeSnapshotFromCsv(csv_path, index_columns=index_columns))
+        print(f"{os.path.basename(csv_path)}: {len(snapshot)} filas -> {snapshot.path}")
+    except Exception as error:
+        print(f"Error building snapshot for {csv_path}:", error)
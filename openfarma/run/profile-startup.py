@@ -0,0 +1,81 @@
+import os, sys
+import argparse
+import subprocess
+from collections import defaultdict
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = str(Path(__file__).parent.parent.parent)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+# Same import paths the application sets up in main.py
+BOOTSTRAP = f"""
+import sys
+for path in {[project_root, os.path.join(project_root, 'src'), os.path.join(project_root, 'openfarma')]!r}:
+    sys.path.insert(0, path)
+import importlib
+"""
+
+def profileImports(modules: list) -> list:
+    """
+    Import the modules in a fresh interpreter with `-X importtime`.
+
+    Returns:
+        list: (level, self_us, cumulative_us, module) for every module imported, in
+            import order (a module appears after the ones it imported).
+    """
+    code = BOOTSTRAP + "".join(f"importlib.import_module({module!r})\n" for module in modules)
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=project_root, capture_output=True, text=True
+    )
+    if process.returncode != 0:
+        lines = [line for line in process.stderr.splitlines() if not line.startswith("import time:")]
+        raise Exception("Error importing modules:\n" + "\n".join(lines[-15:]))
+
+    entries = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # "| json" is a top-level import (level 0), "|   json.decoder" one imported by it (level 1)
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((level, int(self_us), int(cumulative_us), name.strip()))
+    return entries
+
+parser = argparse.ArgumentParser(description="Tiempo de importación por módulo al iniciar la aplicación.")
+parser.add_argument("modules", nargs="*", default=["openfarma.main"],
+                    help="Módulos a importar (por defecto openfarma.main)")
+parser.add_argument("--top", type=int, default=20, help="Cantidad de módulos a listar")
+parser.add_argument("--budget", type=float, default=None,
+                    help="Tiempo máximo en segundos; termina con error si se supera")
+args = parser.parse_args()
+
+try:
+    entries = profileImports(args.modules)
+except Exception as error:
+    print(error)
+    sys.exit(2)
+
+# Time of the modules imported directly by the interpreter (top-level entries)
+total = sum(cumulative for level, _, cumulative, _ in entries if level == 0) / 1e6
+
+# Self time per root package (pandas, langchain_community, chromadb...)
+packages = defaultdict(int)
+for _, self_us, _, name in entries:
+    packages[name.split(".")[0]] += self_us
+
+print(f"Importación de {', '.join(args.modules)}: {total:.3f} s, {len(entries)} módulos\n")
+
+print("Paquetes con mayor tiempo propio:")
+for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+    print(f"  {self_us / 1e3:9.1f} ms  {package}")
+
+print("\nMódulos con mayor tiempo acumulado:")
+for level, _, cumulative, name in sorted(entries, key=lambda entry: -entry[2])[:args.top]:
+    print(f"  {cumulative / 1e3:9.1f} ms  {'  ' * level}{name}")
+
+if args.budget is not None and total > args.budget:
+    print(f"\nSe superó el presupuesto de {args.budget:.3f} s")
+    sys.exit(1)
@@ -10,6 +10,7 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 from openfarma.src.params import *
+from openfarma.src.snapshot import writeSnapshotFromCsv
 from googleapiclient.errors import HttpError
 from google.oauth2.service_account import Credentials
 
@@ -42,3 +43,6 @@ df = df.astype(str)
 
 # Save the DataFrame to a CSV file
 df.to_csv(ABM_PATH, index=False, sep=',', encoding='utf-8')
+
+# Save the memory-mapped snapshot read by the application
+writeSnapshotFromCsv(ABM_PATH, index_columns=["EAN"])
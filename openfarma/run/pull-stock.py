@@ -11,6 +11,7 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 from openfarma.src.params import *
+from openfarma.src.snapshot import writeSnapshotFromCsv
 from googleapiclient.errors import HttpError
 from google.oauth2.service_account import Credentials
 
@@ -93,4 +94,7 @@ df.reset_index(drop=True, inplace=True)
 df.columns = ["codigo", "ean", "stock", "precio", "promo", "descripcion"]
 
 # Save the DataFrame to a CSV file
-df.to_csv(STOCK_PATH, index=False)
\ No newline at end of file
+df.to_csv(STOCK_PATH, index=False)
+
+# Save the memory-mapped snapshot read by the application
+writeSnapshotFromCsv(STOCK_PATH, index_columns=["ean"])
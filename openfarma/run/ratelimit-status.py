@@ -0,0 +1,36 @@
+import sys
+import time
+import argparse
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = str(Path(__file__).parent.parent.parent)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from openfarma.src.params import RATE_LIMIT_PORT
+from openfarma.src.ratelimit import RemoteRateLimiter, PRIORITIES
+
+parser = argparse.ArgumentParser(description="Estado del limitador de pedidos a OpenAI compartido por los procesos.")
+parser.add_argument("--port", type=int, default=RATE_LIMIT_PORT, help="Puerto local del limitador")
+parser.add_argument("--watch", type=float, default=0, help="Repetir cada tantos segundos (0 para una vez)")
+args = parser.parse_args()
+
+try:
+    limiter = RemoteRateLimiter(port=args.port, take_over=False)
+except OSError:
+    print(f"No hay un limitador compartido en el puerto {args.port} (la aplicación no está corriendo).")
+    sys.exit(0)
+
+while True:
+    for kind, state in limiter.metrics().items():
+        pause = f", en pausa {state['paused_for']:.1f} s" if state["paused_for"] else ""
+        print(f"\n{kind}: {state['requests_available']:.0f} pedidos y {state['tokens_available']} tokens disponibles, "
+              f"ritmo {state['rate_scale'] * 100:.0f}%, {state['throttled']} respuestas 429{pause}")
+        print(f"  {'prioridad':<14}{'en cola':>10}{'atendidos':>12}{'espera s':>12}{'espera máx.':>14}")
+        for priority in PRIORITIES:
+            print(f"  {priority:<14}{state['waiting'][priority]:>10}{state['granted'][priority]:>12}"
+                  f"{state['wait_seconds'][priority]:>12.2f}{state['max_wait'][priority]:>14.2f}")
+    if not args.watch:
+        break
+    time.sleep(args.watch)
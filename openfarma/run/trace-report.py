@@ -0,0 +1,97 @@
+import os, sys
+import json
+import argparse
+from collections import defaultdict
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = str(Path(__file__).parent.parent.parent)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from openfarma.src.params import TRACING_PATH
+
+# Attributes shown next to each span (besides the duration)
+SHOWN_ATTRIBUTES = ["tool", "polls", "busy", "status", "prompt_tokens", "completion_tokens",
+                    "deltas", "render_ms", "output_chars", "ids", "found", "products", "compacted"]
+
+def readSpans(path: str) -> list:
+    """Spans of the file exporter, the rotated file first."""
+    spans = []
+    for file_path in (path + ".1", path):
+        if not os.path.exists(file_path):
+            continue
+        with open(file_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    spans.append(json.loads(line))
+    return spans
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+def printTree(spans: list) -> None:
+    """Print the spans of a trace as a tree, in start order."""
+    children = defaultdict(list)
+    ids = {span["span_id"] for span in spans}
+    for span in sorted(spans, key=lambda span: span["start_ns"]):
+        children[span["parent_id"] if span["parent_id"] in ids else None].append(span)
+
+    def walk(parent_id, depth):
+        for span in children[parent_id]:
+            details = ", ".join(
+                f"{key}={span['attributes'][key]:.0f}" if isinstance(span['attributes'][key], float)
+                else f"{key}={span['attributes'][key]}"
+                for key in SHOWN_ATTRIBUTES if key in span["attributes"]
+            )
+            error = f"  ERROR {span['error']}" if span.get("error") else ""
+            print(f"  {span['duration_ms']:9.1f} ms  {'  ' * depth}{span['name']}"
+                  f"{f'  ({details})' if details else ''}{error}")
+            walk(span["span_id"], depth + 1)
+
+    walk(None, 0)
+
+parser = argparse.ArgumentParser(description="Reporte de las trazas de los turnos del chat.")
+parser.add_argument("--path", default=TRACING_PATH, help="Archivo de spans (exportador 'file')")
+parser.add_argument("--store", help="Filtrar por sucursal (store_id)")
+parser.add_argument("--thread", help="Filtrar por conversación (thread_id)")
+parser.add_argument("--last", type=int, default=5, help="Cantidad de turnos a mostrar")
+parser.add_argument("--slowest", action="store_true", help="Mostrar los turnos más lentos en lugar de los últimos")
+args = parser.parse_args()
+
+spans = readSpans(args.path)
+if args.store:
+    spans = [span for span in spans if str(span["attributes"].get("store_id")) == args.store]
+if args.thread:
+    spans = [span for span in spans if span["attributes"].get("thread_id") == args.thread]
+if not spans:
+    print(f"No hay spans en {args.path} para el filtro indicado.")
+    sys.exit(0)
+
+traces = defaultdict(list)
+for span in spans:
+    traces[span["trace_id"]].append(span)
+
+# Turns: traces with an answer (chat.turn not busy), by start or by total duration
+turns = [trace for trace in traces.values()
+         if any(span["name"] == "chat.turn" and not span["attributes"].get("busy") for span in trace)]
+
+def total(trace):
+    return sum(span["duration_ms"] for span in trace if span["parent_id"] is None)
+
+turns.sort(key=total if args.slowest else (lambda trace: min(span["start_ns"] for span in trace)))
+selected = turns[-args.last:] if args.last else turns
+
+for trace in selected:
+    root = min(trace, key=lambda span: span["start_ns"])
+    print(f"\nTraza {root['trace_id']}  sucursal {root['attributes'].get('store_id', '-')}  "
+          f"conversación {root['attributes'].get('thread_id', '-')}  total {total(trace):.0f} ms")
+    printTree(trace)
+
+durations = defaultdict(list)
+for span in spans:
+    durations[span["name"]].append(span["duration_ms"])
+print(f"\n{'span':<20}{'p50 ms':>10}{'p95 ms':>10}{'cantidad':>10}")
+for name, values in sorted(durations.items(), key=lambda item: -sum(item[1])):
+    print(f"{name:<20}{percentile(values, 0.5):>10.1f}{percentile(values, 0.95):>10.1f}{len(values):>10}")
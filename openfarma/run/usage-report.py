@@ -0,0 +1,49 @@
+import os, sys
+import time
+import argparse
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = str(Path(__file__).parent.parent.parent)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from openfarma.src.params import USAGE_DB_PATH
+from openfarma.src.accounting import UsageLedger
+
+LABELS = {"store": "sucursal", "tool": "herramienta", "model": "modelo", "hour": "hora", "day": "día", "kind": "tipo"}
+
+parser = argparse.ArgumentParser(description="Reporte de tokens y costo de las consultas al asistente.")
+parser.add_argument("--path", default=USAGE_DB_PATH, help="Base de datos de uso (sqlite)")
+parser.add_argument("--days", type=float, default=7, help="Días hacia atrás a incluir (0 para todos)")
+parser.add_argument("--store", help="Filtrar por sucursal (store_id)")
+parser.add_argument("--by", choices=list(LABELS), default="store", help="Agrupar por")
+args = parser.parse_args()
+
+if not os.path.exists(args.path):
+    print(f"No hay registros de uso en {args.path}.")
+    sys.exit(0)
+
+ledger = UsageLedger(path=args.path, enabled=False)
+since = time.time() - args.days * 86400 if args.days else None
+rows = ledger.summary(group_by=args.by, since=since, store_id=args.store)
+if not rows:
+    print("No hay registros de uso para el filtro indicado.")
+    sys.exit(0)
+
+label = LABELS[args.by]
+if args.by == "tool":
+    print(f"{label:<44}{'llamadas':>10}{'tokens':>12}{'caract. prom.':>15}{'costo USD':>12}{'prom. s':>10}")
+    for row in rows:
+        print(f"{str(row['name'] or '-'):<44}{row['calls']:>10}{row['output_tokens']:>12}{row['avg_chars']:>15.0f}"
+              f"{row['cost']:>12.4f}{row['avg_elapsed']:>10.2f}")
+    print("\nTokens de las salidas de cada herramienta, leídas por el modelo como entrada "
+          "(costo al precio de entrada del modelo).")
+else:
+    print(f"{label:<20}{'corridas':>10}{'entrada':>12}{'salida':>10}{'herram.':>10}{'costo USD':>12}{'prom. s':>10}")
+    for row in rows:
+        print(f"{str(row['name'] or '-'):<20}{row['runs']:>10}{row['prompt_tokens']:>12}{row['completion_tokens']:>10}"
+              f"{row['tool_tokens']:>10}{row['cost']:>12.4f}{row['avg_elapsed']:>10.2f}")
+    print(f"\n{'total':<20}{sum(row['runs'] for row in rows):>10}{sum(row['prompt_tokens'] for row in rows):>12}"
+          f"{sum(row['completion_tokens'] for row in rows):>10}{sum(row['tool_tokens'] for row in rows):>10}"
+          f"{sum(row['cost'] for row in rows):>12.4f}")
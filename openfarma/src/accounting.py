@@ -0,0 +1,287 @@
+"""
+Token and cost accounting of the assistant runs, per store, per tool and per hour.
+
+Every run reports its prompt and completion tokens (the `usage` of the Run object) and
+the model that executed it. The prompt tokens include the outputs of the tools called
+during the run, so each tool output is counted and attributed to its handler: that is
+the share of the spend (and of the model's reading time) driven by each tool.
+
+Records are queued in memory and written in batches by a background worker to a local
+sqlite database (USAGE_DB_PATH), so a turn never waits on the disk. Nothing is recorded
+when USAGE_ACCOUNTING is disabled.
+
+Key Components:
+- runCost: Cost in USD of a number of prompt and completion tokens of a model.
+- UsageLedger: Queues the usage of the runs, writes it to the local store and
+  aggregates it by store, tool, model, hour or day.
+- getUsageLedger: Process-wide ledger.
+
+Tables:
+- runs: One row per run (kind "run"), context summary (kind "summary"), answer
+  taken from the answer cache (kind "cache", no tokens) or answered by the intent
+  router (kind "router", no tokens): store,
+  thread, model, status, tokens, number of tool calls, tool-output tokens, cost and
+  elapsed time.
+- tool_calls: One row per tool call: store, tool, output size and tokens, cost of
+  those tokens (at the prompt price of the model) and handler time.
+
+Typical Usage:
+    >>> getUsageLedger().recordRun(chat.last_run, store_id="12", thread_id=thread.thread_id, elapsed=3.2)
+
+    $ python openfarma/run/usage-report.py --days 7 --by store
+"""
+
+import os
+import time
+import atexit
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from .composer import countTokens
+from .params import USAGE_ACCOUNTING, USAGE_DB_PATH, USAGE_FLUSH_INTERVAL, MODEL_PRICES
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id            TEXT,
+    created_at        REAL,
+    hour              TEXT,
+    kind              TEXT,
+    store_id          TEXT,
+    thread_id         TEXT,
+    model             TEXT,
+    status            TEXT,
+    prompt_tokens     INTEGER,
+    completion_tokens INTEGER,
+    total_tokens      INTEGER,
+    tool_calls        INTEGER,
+    tool_tokens       INTEGER,
+    cost              REAL,
+    elapsed           REAL
+);
+CREATE TABLE IF NOT EXISTS tool_calls (
+    run_id            TEXT,
+    created_at        REAL,
+    hour              TEXT,
+    store_id          TEXT,
+    model             TEXT,
+    tool              TEXT,
+    output_chars      INTEGER,
+    output_tokens     INTEGER,
+    cost              REAL,
+    elapsed           REAL
+);
+CREATE INDEX IF NOT EXISTS runs_hour ON runs (hour);
+CREATE INDEX IF NOT EXISTS runs_store ON runs (store_id);
+CREATE INDEX IF NOT EXISTS tool_calls_hour ON tool_calls (hour);
+CREATE INDEX IF NOT EXISTS tool_calls_store ON tool_calls (store_id);
+"""
+
+# Grouping columns of the summary
+GROUPS = {
+    "store": "store_id",
+    "model": "model",
+    "hour": "hour",
+    "day": "substr(hour, 1, 10)",
+    "kind": "kind",
+}
+
+def modelPrices(model: Optional[str], prices: Dict[str, Tuple[float, float]] = MODEL_PRICES) -> Tuple[float, float]:
+    """
+    Prompt and completion price (USD per 1M tokens) of a model.
+
+    The longest matching prefix wins, so dated versions ("gpt-4o-2024-08-06") take
+    the price of their family and "gpt-4o-mini" is not priced as "gpt-4o".
+    Unknown models cost 0.
+    """
+    matches = [name for name in prices if model and model.startswith(name)]
+    return prices[max(matches, key=len)] if matches else (0.0, 0.0)
+
+def runCost(model: Optional[str], prompt_tokens: int, completion_tokens: int,
+            prices: Dict[str, Tuple[float, float]] = MODEL_PRICES) -> float:
+    """Cost in USD of the prompt and completion tokens of a model."""
+    prompt_price, completion_price = modelPrices(model, prices)
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+class UsageLedger:
+    """
+    Local store of the token usage and cost of the runs.
+
+    Attributes:
+        path (str): sqlite database file.
+        prices (dict): USD per 1M prompt and completion tokens, by model prefix.
+        enabled (bool): False when usage accounting is disabled (nothing is recorded).
+    """
+
+    def __init__(self, path: str = USAGE_DB_PATH, prices: Optional[Dict[str, Tuple[float, float]]] = None,
+                 flush_interval: float = USAGE_FLUSH_INTERVAL, enabled: bool = USAGE_ACCOUNTING):
+        """
+        Args:
+            path (str): sqlite database file (created with its folder if missing).
+            prices (dict, optional): Model prices, MODEL_PRICES if omitted.
+            flush_interval (float): Seconds between writes of the queued records.
+            enabled (bool): Record the runs.
+        """
+        self.path = path
+        self.prices = prices if prices is not None else MODEL_PRICES
+        self.flush_interval = flush_interval
+        self.enabled = enabled
+        self._pending: List[dict] = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._schema_ready = False
+        if self.enabled:
+            atexit.register(self.flush)
+
+    def recordRun(self, result, store_id: Optional[str] = None, thread_id: Optional[str] = None,
+                  elapsed: float = 0.0, kind: str = "run") -> None:
+        """
+        Queue the usage of a run. Returns immediately: the tool outputs are tokenized
+        and the records written by the background worker.
+
+        Args:
+            result (RunResult): Outcome of the run (run_id, status, model, usage, tool_calls).
+            store_id (str, optional): Store the conversation belongs to.
+            thread_id (str, optional): Conversation thread.
+            elapsed (float): Duration of the run, in seconds.
+            kind (str): "run" for assistant runs, "summary" for context summaries, "cache"
+                for answers taken from the answer cache, "router" for answers of the intent router.
+        """
+        if not self.enabled or result is None:
+            return
+        record = {
+            "run_id": result.run_id,
+            "created_at": time.time(),
+            "kind": kind,
+            "store_id": str(store_id) if store_id is not None else None,
+            "thread_id": thread_id,
+            "model": result.model,
+            "status": result.status,
+            "usage": dict(result.usage or {}),
+            "tool_calls": [(call.name, call.output, call.output_chars, call.elapsed) for call in result.tool_calls],
+            "elapsed": elapsed,
+        }
+        with self._lock:
+            self._pending.append(record)
+        self._ensureWorker()
+
+    def flush(self) -> int:
+        """
+        Write the queued records now.
+
+        Returns:
+            int: Number of runs written.
+        """
+        with self._lock:
+            records, self._pending = self._pending, []
+        if not records:
+            return 0
+        runs, tools = [], []
+        for record in records:
+            hour = datetime.fromtimestamp(record["created_at"]).strftime("%Y-%m-%d %H:00")
+            model, usage = record["model"], record["usage"]
+            prompt_price, _ = modelPrices(model, self.prices)
+            tool_tokens = 0
+            for name, output, output_chars, tool_elapsed in record["tool_calls"]:
+                tokens = countTokens(output) if output else (output_chars + 3) // 4
+                tool_tokens += tokens
+                tools.append((record["run_id"], record["created_at"], hour, record["store_id"], model, name,
+                              output_chars, tokens, tokens * prompt_price / 1_000_000, tool_elapsed))
+            prompt_tokens = usage.get("prompt_tokens", 0)
+            completion_tokens = usage.get("completion_tokens", 0)
+            runs.append((record["run_id"], record["created_at"], hour, record["kind"], record["store_id"],
+                         record["thread_id"], model, record["status"], prompt_tokens, completion_tokens,
+                         usage.get("total_tokens", prompt_tokens + completion_tokens), len(record["tool_calls"]),
+                         tool_tokens, runCost(model, prompt_tokens, completion_tokens, self.prices),
+                         record["elapsed"]))
+        try:
+            with self._write_lock, closing(self._connect()) as connection, connection:
+                connection.executemany(f"INSERT INTO runs VALUES ({', '.join('?' * 15)})", runs)
+                connection.executemany(f"INSERT INTO tool_calls VALUES ({', '.join('?' * 10)})", tools)
+        except Exception as e:
+            print(f"Error writing usage records: {str(e)}")
+            return 0
+        return len(runs)
+
+    def summary(self, group_by: str = "store", since: Optional[float] = None,
+                store_id: Optional[str] = None) -> List[dict]:
+        """
+        Aggregate the recorded usage.
+
+        Args:
+            group_by (str): "store", "tool", "model", "hour", "day" or "kind".
+            since (float, optional): Only records after this timestamp.
+            store_id (str, optional): Only records of this store.
+
+        Returns:
+            List[dict]: One row per group, by descending cost. Runs groups have runs,
+                prompt_tokens, completion_tokens, tool_tokens, cost and avg_elapsed;
+                tool groups have calls, output_tokens, avg_chars, cost and avg_elapsed.
+        """
+        filters, params = [], []
+        if since is not None:
+            filters.append("created_at >= ?")
+            params.append(since)
+        if store_id is not None:
+            filters.append("store_id = ?")
+            params.append(str(store_id))
+        where = f"WHERE {' AND '.join(filters)}" if filters else ""
+
+        if group_by == "tool":
+            query = f"""
+                SELECT tool AS name, COUNT(*) AS calls, SUM(output_tokens) AS output_tokens,
+                       AVG(output_chars) AS avg_chars, SUM(cost) AS cost, AVG(elapsed) AS avg_elapsed
+                FROM tool_calls {where} GROUP BY tool ORDER BY cost DESC, output_tokens DESC
+            """
+        elif group_by in GROUPS:
+            query = f"""
+                SELECT {GROUPS[group_by]} AS name, COUNT(*) AS runs, SUM(prompt_tokens) AS prompt_tokens,
+                       SUM(completion_tokens) AS completion_tokens, SUM(tool_tokens) AS tool_tokens,
+                       SUM(cost) AS cost, AVG(elapsed) AS avg_elapsed
+                FROM runs {where} GROUP BY name ORDER BY cost DESC, prompt_tokens DESC
+            """
+        else:
+            raise ValueError(f"Unknown usage grouping: {group_by}")
+
+        self.flush()
+        if not os.path.exists(self.path):
+            return []
+        with closing(self._connect()) as connection:
+            connection.row_factory = sqlite3.Row
+            return [dict(row) for row in connection.execute(query, params)]
+
+    def _connect(self) -> sqlite3.Connection:
+        """Connection to the store (one per call: sqlite connections are bound to their thread)."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        if not self._schema_ready:
+            connection.executescript(SCHEMA)
+            self._schema_ready = True
+        return connection
+
+    def _ensureWorker(self) -> None:
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="usage-ledger", daemon=True)
+                self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+_usage_ledger: Optional[UsageLedger] = None
+_usage_ledger_lock = threading.Lock()
+
+def getUsageLedger() -> UsageLedger:
+    """Get the process-wide usage ledger."""
+    global _usage_ledger
+    with _usage_ledger_lock:
+        if _usage_ledger is None:
+            _usage_ledger = UsageLedger()
+        return _usage_ledger
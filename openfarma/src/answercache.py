@@ -0,0 +1,311 @@
+"""
+Store-scoped cache of answers to repeated questions.
+
+Reps of the same branch ask the same questions many times a day, and each one costs a
+full assistant turn with tool calls. The answers of self-contained questions are kept
+per store and handed out again, instantly, when the same question (or a near duplicate
+of it) is asked while the data it was answered from is unchanged.
+
+Matching:
+- Exact: the search terms of the question (accent-folded, without stopwords, in any
+  order) are the same as a cached one's. No request is made.
+- Semantic: the embedding of the question is at least ANSWER_CACHE_MIN_SIMILARITY
+  similar (cosine) to a cached one's. Questions are embedded through the embedding
+  gateway, and only when the store has cached answers.
+
+Invalidation is strict: the answers of a store are scoped to the versions of the stock
+(stock and promos), catalog (ABM) and images tables and to the assistant configuration
+(model, instructions and tools). When any of them changes, every answer of the store is
+dropped. Answers also expire after ANSWER_CACHE_TTL seconds.
+
+Only self-contained answers are cached: the run completed, called at least one tool,
+and the queries of its tool calls come from the question itself (at least
+ANSWER_CACHE_MIN_OVERLAP of their search terms are in it), so follow-ups such as
+"¿y en crema?", answered from the earlier context, are never reused.
+
+Key Components:
+- dataVersion: Versions of the tables and assistant configuration answers depend on.
+- CachedAnswer: A cached answer and its question.
+- AnswerCache: Per-store answers with lookup(), store() and contains() (exact terms only).
+- getAnswerCache: Process-wide cache, shared by every session.
+
+Typical Usage:
+    >>> cache = getAnswerCache()
+    >>> cached = cache.lookup("¿Qué protector solar tienen en promo?", store_id="12", assistant_id=assistant_id)
+    >>> if cached is None:
+    ...     result = thread.runWithStreaming(assistant_id, handlers)
+    ...     cache.store(question, result, store_id="12", assistant_id=assistant_id)
+"""
+
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .tracing import span
+from .snapshot import tableVersion
+from .prefetch import searchTerms
+from .params import (
+    STOCK_PATH, ABM_PATH, IMAGES_PATH, ASSISTANT_CONFIG_PATH, FC_CONFIG_PATH,
+    ANSWER_CACHE_ENABLED, ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL, ANSWER_CACHE_MIN_SIMILARITY,
+    ANSWER_CACHE_MIN_TERMS, ANSWER_CACHE_MIN_OVERLAP
+)
+
+# Files the answers depend on: data tables and assistant configuration
+VERSIONED_FILES = (STOCK_PATH, ABM_PATH, IMAGES_PATH)
+CONFIG_FILES = (ASSISTANT_CONFIG_PATH, FC_CONFIG_PATH)
+
+_config_versions: Dict[tuple, str] = {}
+
+def _configVersion(paths: Tuple[str, ...] = CONFIG_FILES) -> str:
+    """Content hash of the assistant configuration files (re-read only when they change)."""
+    stats = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            stats.append((path, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            stats.append((path, 0, 0))
+    key = tuple(stats)
+    version = _config_versions.get(key)
+    if version is None:
+        digest = hashlib.blake2b(digest_size=8)
+        for path in paths:
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    digest.update(f.read())
+        version = _config_versions[key] = digest.hexdigest()
+    return version
+
+def dataVersion() -> Tuple[str, ...]:
+    """Versions of the stock, catalog and images tables and of the assistant configuration."""
+    return tuple(tableVersion(path) for path in VERSIONED_FILES) + (_configVersion(),)
+
+def questionKey(question: str) -> str:
+    """Exact-match key of a question: its sorted search terms."""
+    return " ".join(sorted(searchTerms(question)))
+
+@dataclass
+class CachedAnswer:
+    """
+    Answer of a question, reusable while the data is unchanged.
+
+    Attributes:
+        question (str): Question as it was asked.
+        text (str): Answer.
+        created_at (float): Timestamp of the answer.
+        vector (List[float], optional): Normalized embedding of the question (set in
+            the background after storing).
+        hits (int): Times it was handed out.
+    """
+    question: str
+    text: str
+    created_at: float = field(default_factory=time.time)
+    vector: Optional[List[float]] = field(default=None, repr=False)
+    hits: int = 0
+
+class _StoreAnswers:
+    """Answers of one store and assistant, valid for one data version."""
+
+    def __init__(self, version: Tuple[str, ...]):
+        self.version = version
+        self.answers: "OrderedDict[str, CachedAnswer]" = OrderedDict()  # Least recently used first
+
+class AnswerCache:
+    """
+    Answers of self-contained questions, per store, for the current data version.
+
+    Attributes:
+        max_entries (int): Answers kept per store (least recently used are dropped).
+        ttl (float): Seconds an answer is valid.
+        min_similarity (float): Cosine similarity for a semantic match (None: exact only).
+        enabled (bool): False to neither store nor hand out answers.
+        stats (Dict[str, int]): lookups, hits (exact), semantic_hits, stored, invalidations.
+    """
+
+    def __init__(self, max_entries: int = ANSWER_CACHE_MAX_ENTRIES, ttl: float = ANSWER_CACHE_TTL,
+                 min_similarity: Optional[float] = ANSWER_CACHE_MIN_SIMILARITY,
+                 embed: Optional[Callable[[str], List[float]]] = None,
+                 version: Callable[[], Tuple[str, ...]] = dataVersion, enabled: bool = ANSWER_CACHE_ENABLED):
+        """
+        Args:
+            max_entries (int): Answers kept per store.
+            ttl (float): Seconds an answer is valid.
+            min_similarity (float, optional): Cosine similarity for a semantic match.
+            embed (Callable, optional): Embedding of a text; fc.embedQuery if omitted.
+            version (Callable): Current data version (dataVersion).
+            enabled (bool): Cache answers.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.min_similarity = min_similarity
+        self.enabled = enabled
+        self.stats = {"lookups": 0, "hits": 0, "semantic_hits": 0, "stored": 0, "invalidations": 0}
+        self._embed = embed
+        self._version = version
+        self._stores: Dict[tuple, _StoreAnswers] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _embedding(self, text: str) -> List[float]:
+        """Normalized embedding of a text."""
+        if self._embed is None:
+            # Imported here: fc opens the vector databases
+            from .fc import embedQuery
+            self._embed = embedQuery
+        vector = self._embed(text)
+        norm = sum(value * value for value in vector) ** 0.5 or 1.0
+        return [value / norm for value in vector]
+
+    def _answers(self, scope: tuple) -> _StoreAnswers:
+        """Answers of a store for the current data version, dropping them if it changed. Call with the lock held."""
+        version = self._version()
+        answers = self._stores.get(scope)
+        if answers is None or answers.version != version:
+            if answers is not None and answers.answers:
+                self.stats["invalidations"] += 1
+            answers = self._stores[scope] = _StoreAnswers(version)
+        now = time.time()
+        for key in [key for key, answer in answers.answers.items() if now - answer.created_at > self.ttl]:
+            del answers.answers[key]
+        return answers
+
+    def lookup(self, question: str, store_id: Optional[str] = None,
+               assistant_id: Optional[str] = None) -> Optional[CachedAnswer]:
+        """
+        Cached answer of a question, if the store has one for it (or a near duplicate).
+
+        Args:
+            question (str): Question asked.
+            store_id (str, optional): Store of the session.
+            assistant_id (str, optional): Assistant answering it.
+
+        Returns:
+            CachedAnswer, optional: The answer, None on a miss.
+        """
+        key = questionKey(question)
+        if not self.enabled or len(key.split()) < ANSWER_CACHE_MIN_TERMS:
+            return None
+        scope = (str(store_id), assistant_id)
+        with span("answer.cache", store_id=store_id) as lookup:
+            with self._lock:
+                self.stats["lookups"] += 1
+                answers = self._answers(scope)
+                answer = answers.answers.get(key)
+                candidates = [item for item in answers.answers.items() if item[1].vector is not None]
+            match = "exact" if answer is not None else None
+
+            if answer is None and candidates and self.min_similarity is not None:
+                try:
+                    vector = self._embedding(question)
+                except Exception as e:
+                    print(f"Error embedding question for the answer cache: {str(e)}")
+                    vector = None
+                if vector is not None:
+                    similarity, key, answer = max(
+                        ((sum(a * b for a, b in zip(vector, cached.vector)), cached_key, cached)
+                         for cached_key, cached in candidates),
+                        key=lambda item: item[0]
+                    )
+                    lookup.setAttribute("similarity", round(similarity, 4))
+                    if similarity < self.min_similarity:
+                        answer = None
+                    else:
+                        match = "semantic"
+
+            lookup.setAttribute("match", match or "miss")
+            if answer is None:
+                return None
+            with self._lock:
+                if key in answers.answers:
+                    answers.answers.move_to_end(key)
+                answer.hits += 1
+                self.stats["hits" if match == "exact" else "semantic_hits"] += 1
+            return answer
+
+    def contains(self, question: str, store_id: Optional[str] = None, assistant_id: Optional[str] = None) -> bool:
+        """
+        True if the store has an answer with the exact search terms of a question.
+
+        A cheap check (no embedding, no statistics) to skip work a cached answer makes
+        unnecessary, such as the speculative retrieval of the prompt.
+        """
+        key = questionKey(question)
+        if not self.enabled or len(key.split()) < ANSWER_CACHE_MIN_TERMS:
+            return False
+        with self._lock:
+            answers = self._answers((str(store_id), assistant_id))
+            return key in answers.answers
+
+    def store(self, question: str, result, store_id: Optional[str] = None,
+              assistant_id: Optional[str] = None) -> bool:
+        """
+        Cache the answer of a question when it is self-contained.
+
+        Args:
+            question (str): Question asked.
+            result (RunResult): Run that answered it (status, text and tool calls).
+            store_id (str, optional): Store of the session.
+            assistant_id (str, optional): Assistant that answered it.
+
+        Returns:
+            bool: True if the answer was cached.
+        """
+        key = questionKey(question)
+        if not self.enabled or result is None or not self._cacheable(key, result):
+            return False
+        answer = CachedAnswer(question=question, text=result.text)
+        with self._lock:
+            answers = self._answers((str(store_id), assistant_id))
+            answers.answers[key] = answer
+            answers.answers.move_to_end(key)
+            while len(answers.answers) > self.max_entries:
+                answers.answers.popitem(last=False)
+            self.stats["stored"] += 1
+            if self.min_similarity is not None:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="answer-cache")
+                self._executor.submit(self._embedAnswer, answer)
+        return True
+
+    def _cacheable(self, key: str, result) -> bool:
+        """Completed run with tool calls whose queries come from the question."""
+        terms = set(key.split())
+        if len(terms) < ANSWER_CACHE_MIN_TERMS or result.status != "completed" or not result.text:
+            return False
+        if not result.tool_calls:
+            return False
+        for call in result.tool_calls:
+            query = searchTerms(" ".join(str(value) for value in (call.arguments or {}).values()))
+            if query and len(query & terms) / len(query) < ANSWER_CACHE_MIN_OVERLAP:
+                return False
+        return True
+
+    def _embedAnswer(self, answer: CachedAnswer) -> None:
+        """Embed the question of a stored answer, making it available to semantic matches."""
+        try:
+            answer.vector = self._embedding(answer.question)
+        except Exception as e:
+            print(f"Error embedding question for the answer cache: {str(e)}")
+
+    def clear(self, store_id: Optional[str] = None) -> None:
+        """Drop the answers of a store (of every store if None)."""
+        with self._lock:
+            for scope in list(self._stores):
+                if store_id is None or scope[0] == str(store_id):
+                    del self._stores[scope]
+
+_answer_cache: Optional[AnswerCache] = None
+_answer_cache_lock = threading.Lock()
+
+def getAnswerCache() -> AnswerCache:
+    """Get the process-wide answer cache."""
+    global _answer_cache
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            _answer_cache = AnswerCache()
+        return _answer_cache
@@ -0,0 +1,120 @@
+"""
+This module keeps a process-wide cache of the static images used by the interface
+(header logo and avatars). Each image is read and encoded once per process and file
+version, instead of on every Streamlit rerun, login render or export.
+
+Key Components:
+- StaticAsset: An encoded image: PNG bytes, base64 string, data URI and, on first use,
+  the decoded RGB samples used to embed it in PDF files.
+- getAsset: Returns the cached asset of a path, re-encoding it only when the file's
+  modification time changes. PNG files are used as they are; PIL is only imported to
+  convert other formats and to decode images for PDF files.
+- dataUri / encodeImage: Shortcuts for HTML embedding and Streamlit avatars.
+
+Typical Usage:
+    >>> st.markdown(f'<img src="{dataUri(HEADER_LOGO_PATH)}">', unsafe_allow_html=True)
+    >>> st.chat_message("assistant", avatar=dataUri(AVATAR_BOT_PATH))
+"""
+
+import io, os, zlib
+import base64, threading
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Dict
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+@dataclass(frozen=True)
+class PdfImage:
+    """
+    Image decoded for PDF embedding.
+
+    Attributes:
+        width (int): Width in pixels.
+        height (int): Height in pixels.
+        data (bytes): Zlib-compressed 8-bit RGB samples.
+    """
+    width: int
+    height: int
+    data: bytes
+
+class StaticAsset:
+    """
+    Image encoded once for every use in the application.
+
+    Attributes:
+        path (str): Absolute path of the image.
+        mtime_ns (int): Modification time of the encoded version.
+        png (bytes): Image as PNG bytes.
+        base64 (str): Base64 encoding of the PNG bytes.
+        data_uri (str): "data:image/png;base64,..." URI for HTML and Streamlit avatars.
+    """
+
+    def __init__(self, path: str, mtime_ns: int, png: bytes):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.png = png
+        self.base64 = base64.b64encode(png).decode()
+        self.data_uri = f"data:image/png;base64,{self.base64}"
+
+    @cached_property
+    def pdf_image(self) -> PdfImage:
+        """Decoded RGB samples, transparent pixels flattened on a white background."""
+        from PIL import Image
+
+        with Image.open(io.BytesIO(self.png)) as source:
+            rgba = source.convert("RGBA")
+        rgb = Image.new("RGB", rgba.size, (255, 255, 255))
+        rgb.paste(rgba, mask=rgba.getchannel("A"))
+        return PdfImage(rgb.width, rgb.height, zlib.compress(rgb.tobytes()))
+
+_assets: Dict[str, StaticAsset] = {}
+_assets_lock = threading.Lock()
+
+def getAsset(image_path: str) -> StaticAsset:
+    """
+    Get the encoded version of an image, shared by the whole process.
+
+    The image is re-encoded only when its modification time changes.
+
+    Args:
+        image_path (str): Path of the image.
+
+    Returns:
+        StaticAsset: The encoded image.
+
+    Raises:
+        FileNotFoundError: If the image doesn't exist.
+        Exception: If the image can't be decoded.
+    """
+    path = os.path.abspath(image_path)
+    mtime_ns = os.stat(path).st_mtime_ns
+    asset = _assets.get(path)
+    if asset is not None and asset.mtime_ns == mtime_ns:
+        return asset
+
+    with open(path, "rb") as f:
+        png = f.read()
+    if not png.startswith(PNG_SIGNATURE):
+        # Other formats are converted to PNG (PIL is only imported for them)
+        from PIL import Image
+
+        with Image.open(io.BytesIO(png)) as image:
+            buffered = io.BytesIO()
+            image.save(buffered, format="PNG")
+        png = buffered.getvalue()
+    asset = StaticAsset(path, mtime_ns, png)
+    with _assets_lock:
+        current = _assets.get(path)
+        # Another session may have encoded a newer version meanwhile
+        if current is None or current.mtime_ns <= mtime_ns:
+            _assets[path] = asset
+    return asset
+
+def dataUri(image_path: str) -> str:
+    """Data URI of an image, for HTML embedding and Streamlit avatars."""
+    return getAsset(image_path).data_uri
+
+def encodeImage(image_path: str) -> str:
+    """Base64 string of an image (as PNG)."""
+    return getAsset(image_path).base64
@@ -0,0 +1,263 @@
+"""
+Precomputed aggregates of the catalog (ABM) and stock tables.
+
+The statistics tools (brand count and list, brand check, products with stock, products
+on promotion) used to read and scan a whole column on every call. The aggregates are
+computed once per version of the tables (see snapshot.tableVersion) and shared by the
+whole process, so both the tool handlers and the intent router answer from memory.
+
+Brands are looked up in a BrandIndex: the catalog brands normalized (accent-folded,
+punctuation and spaces ignored), so "La Roche-Posay", "la roche posay" and "LaRochePosay"
+are the same brand, and a trigram index for misspellings ("Euserin"): the brands sharing
+trigrams with the name are candidates, the most similar one (Dice coefficient at least
+BRAND_MATCH_MIN_SIMILARITY) is accepted if it is within BRAND_MATCH_MAX_DISTANCE edits.
+
+Key Components:
+- readColumn: Every value of a column, from the memory-mapped snapshot when available.
+- normalizeText: Accent-folded, lowercase text with the punctuation as spaces.
+- BrandMatch / BrandIndex: Canonical brand and product count of a brand name.
+- CatalogStats: Brands, products with stock and products on promotion.
+- getCatalogStats: Process-wide aggregates, recomputed when the tables change.
+
+Typical Usage:
+    >>> stats = getCatalogStats()
+    >>> stats.brand_count, stats.products_with_stock, stats.hasBrand("eucerin")
+    (9, 1240, True)
+    >>> stats.brand_index.lookup("la roche-posay").name
+    'La roche posay'
+"""
+
+import re
+import threading
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from .snapshot import loadSnapshot, tableVersion
+from .prefetch import foldText
+from .params import ABM_PATH, STOCK_PATH, BRAND_MATCH_MIN_SIMILARITY, BRAND_MATCH_MAX_DISTANCE
+
+def readColumn(file_path: str, column: str) -> list:
+    """
+    Read every value of a column, from the memory-mapped snapshot when it's available.
+
+    Args:
+        file_path (str): Path to the csv file.
+        column (str): Column name.
+
+    Returns:
+        list: Column values as strings.
+    """
+    snapshot = loadSnapshot(file_path)
+    if snapshot is not None:
+        return snapshot.column(column)
+
+    import pandas as pd
+    return pd.read_csv(file_path, usecols=[column])[column].astype(str).tolist()
+
+def normalizeText(text: str) -> str:
+    """Accent-folded, lowercase text with the punctuation replaced by spaces ("L'Oréal" -> "l oreal")."""
+    return " ".join(re.sub(r"[^\w]+", " ", foldText(text)).split())
+
+def _trigrams(key: str) -> Set[str]:
+    """Trigrams of a compact name, padded so short names and their ends count."""
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _editDistance(a: str, b: str) -> int:
+    """Levenshtein distance between two strings."""
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+@dataclass(frozen=True)
+class BrandMatch:
+    """
+    Catalog brand matched by a name.
+
+    Attributes:
+        brand (str): Lowercase brand, as in the catalog.
+        name (str): Display name (capitalized).
+        products (int): Catalog products of the brand.
+        exact (bool): The name is the brand (normalized), not a misspelling of it.
+        text (str): Name matched, normalized.
+    """
+    brand: str
+    name: str
+    products: int
+    exact: bool = True
+    text: str = ""
+
+class BrandIndex:
+    """
+    Catalog brands by normalized name, with a trigram index for misspelled names.
+
+    Spellings of one brand ("la roche-posay", "la roche posay") are one entry: its
+    products are summed and it is named after its most common spelling.
+
+    Attributes:
+        products (Dict[str, int]): Canonical lowercase brand to its number of catalog products.
+    """
+
+    def __init__(self, products: Dict[str, int], min_similarity: float = BRAND_MATCH_MIN_SIMILARITY,
+                 max_distance: float = BRAND_MATCH_MAX_DISTANCE):
+        """
+        Args:
+            products (Dict[str, int]): Lowercase brand, as written in the catalog, to its
+                number of catalog products.
+            min_similarity (float): Trigram similarity (Dice) of a misspelled name.
+            max_distance (float): Edits allowed, as a share of the brand length.
+        """
+        self.min_similarity = min_similarity
+        self.max_distance = max_distance
+        spellings: Dict[str, Counter] = defaultdict(Counter)    # Compact name to its spellings
+        for brand, count in products.items():
+            key = normalizeText(brand).replace(" ", "")
+            if key:
+                spellings[key][brand] += count
+        self._keys: Dict[str, str] = {                          # Compact name to canonical brand
+            key: counts.most_common(1)[0][0] for key, counts in spellings.items()
+        }
+        self.products = {self._keys[key]: sum(counts.values()) for key, counts in spellings.items()}
+        self._trigrams: Dict[str, Set[str]] = {}                # Compact name to its trigrams
+        self._postings: Dict[str, Set[str]] = defaultdict(set)  # Trigram to compact names
+        for key in self._keys:
+            self._trigrams[key] = _trigrams(key)
+            for trigram in self._trigrams[key]:
+                self._postings[trigram].add(key)
+        # Brand mentions in a normalized text (every spelling), longest first, spaces between words optional
+        names = sorted({normalizeText(brand) for counts in spellings.values() for brand in counts}, key=len, reverse=True)
+        self._mentions = re.compile(
+            r"\b(?:" + "|".join(" ?".join(map(re.escape, name.split())) for name in names) + r")\b"
+        ) if names else None
+
+    def _match(self, key: str, exact: bool, text: str) -> BrandMatch:
+        brand = self._keys[key]
+        return BrandMatch(brand, brand.capitalize(), self.products[brand], exact, text)
+
+    def brands(self) -> List[BrandMatch]:
+        """Every catalog brand (one per normalized name), sorted by display name."""
+        return sorted((self._match(key, exact=True, text=normalizeText(self._keys[key])) for key in self._keys),
+                      key=lambda match: match.name)
+
+    def lookup(self, name: str) -> Optional[BrandMatch]:
+        """
+        Catalog brand of a name, exact (normalized) or misspelled.
+
+        Args:
+            name (str): Brand name as written ("la roche-posay", "Euserin").
+
+        Returns:
+            BrandMatch, optional: The brand, None when no brand is close enough or two
+                are equally close.
+        """
+        text = normalizeText(name)
+        key = text.replace(" ", "")
+        if not key:
+            return None
+        if key in self._keys:
+            return self._match(key, exact=True, text=text)
+
+        trigrams = _trigrams(key)
+        shared = Counter(candidate for trigram in trigrams for candidate in self._postings.get(trigram, ()))
+        best, best_score = [], 0.0
+        for candidate, count in shared.items():
+            score = 2 * count / (len(trigrams) + len(self._trigrams[candidate]))
+            if score < self.min_similarity:
+                continue
+            if _editDistance(key, candidate) > max(1, int(len(candidate) * self.max_distance)):
+                continue
+            if score > best_score:
+                best, best_score = [candidate], score
+            elif score == best_score:
+                best.append(candidate)
+        return self._match(best[0], exact=False, text=text) if len(best) == 1 else None
+
+    def mentions(self, text: str) -> List[BrandMatch]:
+        """Catalog brands written (exactly, normalized) in a text, in order of appearance."""
+        if self._mentions is None:
+            return []
+        found = {}
+        for mention in self._mentions.finditer(normalizeText(text)):
+            key = mention.group(0).replace(" ", "")
+            found.setdefault(key, self._match(key, exact=True, text=mention.group(0)))
+        return list(found.values())
+
+@dataclass
+class CatalogStats:
+    """
+    Aggregates of one version of the catalog and stock tables.
+
+    Attributes:
+        brands (Dict[str, str]): Canonical lowercase brand (one per normalized name, see
+            BrandIndex) to its display name (capitalized).
+        brand_index (BrandIndex): Brand lookups and product counts per brand.
+        products_with_stock (int): Stock rows with stock above zero (unparsable cells skipped).
+        products_on_promo (int): Stock rows with a promotion.
+        version (Tuple[str, str]): Versions of the ABM and stock tables.
+    """
+    brands: Dict[str, str] = field(default_factory=dict)
+    brand_index: BrandIndex = field(default_factory=lambda: BrandIndex({}))
+    products_with_stock: int = 0
+    products_on_promo: int = 0
+    version: Tuple[str, str] = ("", "")
+
+    @property
+    def brand_count(self) -> int:
+        """Number of distinct brands."""
+        return len(self.brands)
+
+    @property
+    def brand_names(self) -> List[str]:
+        """Display names of the brands, sorted."""
+        return sorted(self.brands.values())
+
+    def hasBrand(self, brand: str) -> bool:
+        """True if the brand is in the catalog (normalized or misspelled, see BrandIndex)."""
+        return self.brand_index.lookup(brand) is not None
+
+def _stockAbove(value: str, threshold: float) -> bool:
+    """True if a stock cell is a number above the threshold (empty or non-numeric cells aren't)."""
+    try:
+        return float(value) > threshold
+    except ValueError:
+        return False
+
+def computeCatalogStats(abm_path: str = ABM_PATH, stock_path: str = STOCK_PATH) -> CatalogStats:
+    """
+    Compute the aggregates of the catalog and stock tables.
+
+    Raises:
+        Exception: If a table can't be read.
+    """
+    version = (tableVersion(abm_path), tableVersion(stock_path))
+    try:
+        # Brands are counted once per normalized name, as the index looks them up
+        brand_index = BrandIndex(dict(Counter(brand.strip().lower() for brand in readColumn(abm_path, 'Marca'))))
+        products_with_stock = sum(_stockAbove(x, 0) for x in readColumn(stock_path, 'stock'))
+        products_on_promo = sum(x.lower() != 'no promo' for x in readColumn(stock_path, 'promo'))
+    except Exception as e:
+        raise Exception(f"Error computing catalog statistics: {str(e)}")
+    return CatalogStats(
+        brands={match.brand: match.name for match in brand_index.brands()},
+        brand_index=brand_index,
+        products_with_stock=products_with_stock,
+        products_on_promo=products_on_promo,
+        version=version
+    )
+
+_catalog_stats: Optional[CatalogStats] = None
+_catalog_stats_lock = threading.Lock()
+
+def getCatalogStats() -> CatalogStats:
+    """Get the process-wide catalog aggregates, recomputed when the ABM or stock table changes."""
+    global _catalog_stats
+    version = (tableVersion(ABM_PATH), tableVersion(STOCK_PATH))
+    with _catalog_stats_lock:
+        if _catalog_stats is None or _catalog_stats.version != version:
+            _catalog_stats = computeCatalogStats()
+        return _catalog_stats
@@ -28,22 +28,29 @@ This module is designed for production use in pharmaceutical assistance applicat
 providing a robust, customizable chat interface with comprehensive export and tracking capabilities.
 """
 
-import io, os
-import time, base64
-import smtplib
+import os, time
 import streamlit as st
 from dataclasses import dataclass
+from contextlib import nullcontext
 from typing import List, Dict, Optional
 from datetime import datetime
-from fpdf import FPDF
-from PIL import Image
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.application import MIMEApplication
-
-from assistant.thread import Thread
-from .params import USER_CHAT_COLUMNS, BOT_CHAT_COLUMNS
+
+from assistant.thread import Thread, RunResult
+from assistant.completions import CompletionsThread
+from assistant.pool import getThreadPool
+from .tracing import span, newTraceId
+from .accounting import getUsageLedger
+from .prefetch import startPrefetch, usePrefetch
+from .answercache import getAnswerCache
+from .router import getIntentRouter
+from .params import (
+    USER_CHAT_COLUMNS, BOT_CHAT_COLUMNS, CHAT_LIVE_TURNS, CHAT_WELCOME_MESSAGE,
+    CONTEXT_LAST_MESSAGES, CONTEXT_TOKEN_BUDGET, CONTEXT_KEEP_MESSAGES, CONTEXT_SUMMARY_MODEL,
+    CHAT_ENGINE, PREFETCH_ENABLED, ANSWER_CACHE_ENABLED, INTENT_ROUTER_ENABLED
+)
 from .utils import PromptTracker
+from .assets import dataUri, getAsset
+from .export import ConversationExporter, computeElapsedTime
 
 def encodeImage(image_path: str) -> str:
     """
@@ -87,14 +94,12 @@ def encodeImage(image_path: str) -> str:
 
     Note:
         - Images are converted to PNG format for consistency
+        - Encodings are cached per process by assets.getAsset (keyed by path and mtime)
         - Base64 encoding increases file size by approximately 33%
         - Large images may impact performance when embedded
         - Useful for creating portable, self-contained applications
     """
-    image = Image.open(image_path)
-    buffered = io.BytesIO()
-    image.save(buffered, format="PNG")
-    return base64.b64encode(buffered.getvalue()).decode()
+    return getAsset(image_path).base64
 
 @dataclass
 class ChatStyle:
@@ -234,6 +239,30 @@ class ChatStyle:
             margin: 60px auto 0 auto;
             font-size: 24px;
         }
+        /* Mensajes anteriores (colapsados), renderizados como un único bloque */
+        .history-row {
+            display: flex;
+            align-items: flex-start;
+            gap: 8px;
+            margin-bottom: 16px;
+        }
+        .history-row .chat-message {
+            top: 0;
+            flex: 1;
+        }
+        .history-user {
+            margin-left: 50%;  /* Igual que USER_CHAT_COLUMNS */
+        }
+        .history-assistant {
+            margin-right: 20%;  /* Igual que BOT_CHAT_COLUMNS */
+        }
+        .history-avatar {
+            width: 2rem;
+            height: 2rem;
+            flex-shrink: 0;
+            border-radius: 0.5rem;
+            background-size: cover;
+        }
         div[data-testid="stChatInput"] textarea {
             font-size: 20px;  /* Ajusta el tamaño de la fuente aquí */
         }
@@ -259,8 +288,22 @@ class ChatConfig:
     Configuration Elements:
     - Branding: Title, header caption, logo paths
     - Avatars: User and bot avatar images
-    - UI Text: Input placeholders, loading messages
+    - UI Text: Input placeholders, loading messages, welcome message, reply shown when a
+      run ends without text
+    - Threads: thread_pool takes ready threads from the process-wide warm pool
+    - Engine: "assistants" (OpenAI threads and runs) or "completions" (history kept
+      locally, streamed chat completions and the tool loop run in-process)
+    - Prefetch: start the product search of each prompt as soon as it is queued
+    - Answer cache: answer_cache reuses the answers of the store to repeated questions,
+      shown with cached_answer_caption
+    - Intent router: intent_router answers catalog statistics questions (brand count,
+      list and check, products with stock or on promotion) locally, without a run
+    - Transcript: local_transcript keeps assistant replies out of the thread
+      (the run already stored them there)
+    - Context budget: messages read per run (context_last_messages) and prompt tokens
+      above which older messages are folded into a rolling summary (context_token_budget)
     - File Paths: All image and asset locations
+    - Tracing: store_id is attached to the tracing spans of every turn
 
     Examples:
         # Use default configuration
@@ -306,6 +349,19 @@ class ChatConfig:
     bot_avatar_path: str = "path/to/bot/avatar"
     input_placeholder: str = "Escriba su consulta aquí..."
     loading_text: str = "Buscando información..."
+    local_transcript: bool = True  # keep assistant replies local, the thread already has them
+    empty_response_text: str = "Lo siento, no pude generar una respuesta. Por favor, intenta nuevamente."
+    context_last_messages: Optional[int] = CONTEXT_LAST_MESSAGES    # None: the model reads the whole thread
+    context_token_budget: Optional[int] = CONTEXT_TOKEN_BUDGET      # None: never summarize
+    context_keep_messages: int = CONTEXT_KEEP_MESSAGES
+    welcome_message: str = CHAT_WELCOME_MESSAGE
+    thread_pool: bool = True    # take threads from the warm pool instead of creating them
+    engine: str = CHAT_ENGINE   # "assistants" (OpenAI threads and runs) or "completions" (local history)
+    prefetch: bool = PREFETCH_ENABLED   # search the prompt while the run starts, tools reuse the candidates
+    answer_cache: bool = ANSWER_CACHE_ENABLED   # answer repeated questions of the store from the answer cache
+    cached_answer_caption: str = "⚡ Respuesta reutilizada de una consulta anterior de la sucursal."
+    intent_router: bool = INTENT_ROUTER_ENABLED     # answer catalog statistics questions without a run
+    store_id: Optional[str] = None  # store of the session, recorded in the tracing spans
 
 class Chat:
     """
@@ -443,27 +499,62 @@ class Chat:
             - prompt_tracker: PromptTracker for analytics
 
         Welcome Message:
-            A default welcome message is automatically added to start the conversation:
-            "Hola, ¿en qué te puedo ayudar?"
+            The configured welcome message starts the conversation (default:
+            "Hola, ¿en qué te puedo ayudar?"). The thread is created with it, so it
+            only has to be added to the local transcript.
 
         Note:
             - API key should be kept secure and not logged
             - Assistant ID must be valid and accessible
             - Configuration and styling can be modified after initialization
-            - Thread is created fresh for each Chat instance
+            - Thread is fresh for each Chat instance, taken from the warm pool when
+              config.thread_pool is set (no request on the session start)
             - Welcome message is added to both UI and Thread
         """
         self.config = config or ChatConfig()
         self.style = style or ChatStyle()
         self.messages: List[Dict[str, str]] = []
-        self.thread = Thread(api_key)
+        self.thread = self._newThread(api_key)
         self.assistant_id = assistant_id
         self.is_processing = False
         self.prompts_queue: List[str] = []
+        self._prompt_traces: List[str] = []     # Trace id of each queued prompt
+        self._prefetches: list = []             # Speculative retrieval of each queued prompt
+        self._render_trace: Optional[str] = None  # Trace of the answer awaiting its final render
         self.prompt_tracker = PromptTracker()
+        self.last_run: Optional[RunResult] = None
+        self.summary = ""               # Rolling summary of the messages left out of the thread
+        self._summarized_count = 0      # Messages already folded into the summary
+        self._header_html: Optional[str] = None
+        self._history_html = ""
+        self._history_count = 0
         
-        # Initialize with welcome message
-        self.addMessage("Hola, ¿en qué te puedo ayudar?", "assistant")
+        # Initialize with welcome message (the thread already holds it)
+        self.addMessage(self.config.welcome_message, "assistant", sync=False)
+
+    def _newThread(self, api_key: str) -> Thread:
+        """
+        Get a fresh thread holding the welcome message.
+
+        Args:
+            api_key (str): OpenAI API key.
+
+        Returns:
+            Thread: From the warm pool when config.thread_pool is set, created otherwise.
+                A CompletionsThread (same interface, no request) with the "completions" engine.
+        """
+        welcome = [{"role": "assistant", "content": self.config.welcome_message}]
+        if self.config.engine == "completions":
+            return CompletionsThread(api_key, truncation_messages=self.config.context_last_messages,
+                                     initial_messages=welcome)
+        if self.config.thread_pool:
+            pool = getThreadPool(api_key, self.config.welcome_message, self.config.context_last_messages)
+            return pool.acquire()
+        return Thread(
+            api_key,
+            truncation_messages=self.config.context_last_messages,
+            initial_messages=welcome
+        )
 
     def _exportToTxt(self, output_path: str, metadata: dict) -> str:
         """
@@ -541,99 +632,17 @@ class Chat:
             - Empty metadata fields are automatically filtered out
             - File path should be writable by the application
         """
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(f"Chat Export - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write("=" * 50 + "\n\n")
-            
-            # Add metadata
-            f.write("INFORMACIÓN\n")
-            f.write("-" * 50 + "\n")
-            for key, value in metadata.items():
-                if value:  # Only write if value is not empty
-                    f.write(f"{key}: {value}\n")
-            f.write("-" * 50 + "\n\n")
-            
-            for msg in self.messages:
-                role = "Usuario" if msg["role"] == "user" else "Asistente"
-                timestamp = msg["timestamp"].strftime("%H:%M:%S")
-                f.write(f"[{role} - {timestamp}]\n")
-                f.write(f"{msg['content']}\n")
-                f.write("-" * 50 + "\n\n")
-        
-        return output_path
+        return ConversationExporter(self.messages, self.config.header_logo_path).toTxt(output_path, metadata)
 
     def _exportToMd(self, output_path: str, metadata: dict) -> str:
         """Export conversation to a markdown file with header logo"""
-        with open(output_path, 'w', encoding='utf-8') as f:
-            # Add header logo as base64 image
-            with open(self.config.header_logo_path, "rb") as img_file:
-                b64_image = base64.b64encode(img_file.read()).decode()
-                f.write(f'<img src="data:image/png;base64,{b64_image}" width="150px" align="left"/>\n\n')
-            
-            f.write(f"# ChatBot - Conversación - {datetime.now().strftime('%Y-%m-%d')}\n\n")
-            
-            # Add metadata
-            f.write("## Información\n\n")
-            for key, value in metadata.items():
-                if value:  # Only write if value is not empty
-                    f.write(f"- **{key}:** {value}\n")
-            f.write("\n---\n\n")
-            
-            for msg in self.messages:
-                role = "👤 Usuario" if msg["role"] == "user" else "🤖 Asistente"
-                timestamp = msg["timestamp"].strftime("%H:%M:%S")
-                f.write(f"### {role} ({timestamp})\n\n")
-                f.write(f"{msg['content']}\n\n")
-                f.write("---\n\n")
-        
-        return output_path
+        return ConversationExporter(self.messages, self.config.header_logo_path).toMd(output_path, metadata)
 
     def _exportToPdf(self, output_path: str, metadata: dict) -> str:
         """Export conversation to a PDF file with header logo"""
-        pdf = FPDF()
-        pdf.add_page()
-        
-        # Add header logo
-        pdf.image(self.config.header_logo_path, x=10, y=10, w=40)  # Adjust w=40 to change logo size
-        pdf.ln(30)  # Space after logo
-        
-        # Configure fonts and add title
-        pdf.set_font("Arial", "B", 16)
-        pdf.cell(0, 10, f"ChatBot - Conversación - {datetime.now().strftime('%Y-%m-%d')}", ln=True)
-        pdf.ln(10)
-        
-        # Add metadata
-        pdf.set_font("Arial", "B", 14)
-        pdf.cell(0, 10, "Información:", ln=True)
-        pdf.set_font("Arial", size=12)
-        for key, value in metadata.items():
-            if value:  # Only write if value is not empty
-                pdf.cell(0, 10, f"{key}: {value}", ln=True)
-        pdf.ln(10)
-        
-        # Add messages
-        pdf.set_font("Arial", size=12)
-        for msg in self.messages:
-            role = "Usuario" if msg["role"] == "user" else "Asistente"
-            timestamp = msg["timestamp"].strftime("%H:%M:%S")
-            
-            # Role header with timestamp
-            pdf.set_font("Arial", "B", 12)
-            pdf.cell(0, 10, f"{role} - {timestamp}:", ln=True)
-            
-            # Message content
-            pdf.set_font("Arial", size=12)
-            pdf.multi_cell(0, 10, msg['content'])
-            pdf.ln(5)
-            
-            # Separator line
-            pdf.line(10, pdf.get_y(), 200, pdf.get_y())
-            pdf.ln(10)
-        
-        pdf.output(output_path)
-        return output_path
+        return ConversationExporter(self.messages, self.config.header_logo_path).toPdf(output_path, metadata)
     
-    def addMessage(self, content: str, role: str) -> None:
+    def addMessage(self, content: str, role: str, sync: bool = True, cached: bool = False) -> None:
         """
         Add a message to both the UI messages list and the OpenAI thread.
 
@@ -644,9 +653,12 @@ class Chat:
         Args:
             content (str): The message content to add. Can be user input or AI response.
             role (str): The role of the message sender. Must be "user" or "assistant".
+            sync (bool): Whether to post the message to the OpenAI thread. Use False for
+                assistant replies produced by a run, which are already in the thread.
+            cached (bool): The reply comes from the answer cache (shown with a caption).
 
         Returns:
-            None. The message is added to both local storage and OpenAI thread.
+            None. The message is added to local storage (and the OpenAI thread if sync).
 
         Raises:
             Exception: If there's an error adding the message to the OpenAI thread.
@@ -656,6 +668,7 @@ class Chat:
             - role: "user" or "assistant"
             - content: The message text
             - timestamp: DateTime when the message was added
+            - cached: True for replies taken from the answer cache (only then present)
 
         Examples:
             # Add user message
@@ -690,8 +703,11 @@ class Chat:
             "content": content,
             "timestamp": datetime.now()
         }
+        if cached:
+            message["cached"] = True
         self.messages.append(message)
-        self.thread.addMessage(content=content, role=role)
+        if sync:
+            self.thread.addMessage(content=content, role=role)
 
     def addStyleToMessage(self, message: str, role: str) -> str:
         """
@@ -717,25 +733,68 @@ class Chat:
         if report:
             self.prompt_tracker.reportPrompts()  # Report prompts before clearing
         self.messages = []
-        self.thread = Thread(self.thread.api_key)
-        self.addMessage("Hola, ¿en qué te puedo ayudar?", "assistant")
+        self._history_html, self._history_count = "", 0
+        self.summary, self._summarized_count = "", 0
+        self.thread = self._newThread(self.thread.api_key)
+        self.addMessage(self.config.welcome_message, "assistant", sync=False)
 
     def displayMessages(self, chat_container) -> None:
-        """Display all messages in the Streamlit container"""
+        """
+        Display the messages in the Streamlit container.
+
+        Only the last CHAT_LIVE_TURNS turns are rendered as chat messages. Older
+        messages are collapsed behind a toggle and, when shown, rendered as a single
+        HTML block built incrementally (each message is converted once), so the
+        cost per rerun doesn't grow with the length of the conversation.
+        """
+        older = max(len(self.messages) - 2 * CHAT_LIVE_TURNS, 0)
         with chat_container:
-            for msg in self.messages:
+            if older:
+                self.displayHistory(older)
+            for msg in self.messages[older:]:
                 if msg["role"] == "user":
                     _, right = st.columns(USER_CHAT_COLUMNS)
                     with right:
-                        with st.chat_message(msg["role"], avatar=self.config.user_avatar_path):
+                        with st.chat_message(msg["role"], avatar=dataUri(self.config.user_avatar_path)):
                             message = self.addStyleToMessage(msg["content"], msg["role"])
                             st.write(message, unsafe_allow_html=True)
                 else:
                     left, _ = st.columns(BOT_CHAT_COLUMNS)
                     with left:
-                        with st.chat_message(msg["role"], avatar=self.config.bot_avatar_path):
+                        with st.chat_message(msg["role"], avatar=dataUri(self.config.bot_avatar_path)):
                             message = self.addStyleToMessage(msg["content"], msg["role"])
                             st.write(message, unsafe_allow_html=True)
+                            if msg.get("cached"):
+                                st.caption(self.config.cached_answer_caption)
+
+    def displayHistory(self, count: int) -> None:
+        """
+        Display the first `count` messages collapsed, expanded on demand.
+
+        Args:
+            count (int): Number of messages outside the live window.
+        """
+        if st.toggle(f"Mostrar {count} mensajes anteriores", key="show_history"):
+            st.markdown(self._historyHtml(count), unsafe_allow_html=True)
+
+    def _historyHtml(self, count: int) -> str:
+        """Get the HTML of the first `count` messages, converting only the new ones."""
+        if self._history_count > count:  # Conversation was cleared
+            self._history_html, self._history_count = "", 0
+        if not self._history_html:
+            # Avatars are set once for the whole block instead of once per message
+            self._history_html = f"""<style>
+                .history-user .history-avatar {{background-image: url("{dataUri(self.config.user_avatar_path)}");}}
+                .history-assistant .history-avatar {{background-image: url("{dataUri(self.config.bot_avatar_path)}");}}
+            </style>"""
+        for msg in self.messages[self._history_count:count]:
+            side = "user" if msg["role"] == "user" else "assistant"
+            self._history_html += (
+                f'<div class="history-row history-{side}"><div class="history-avatar"></div>'
+                f'{self.addStyleToMessage(msg["content"], msg["role"])}</div>'
+            )
+        self._history_count = count
+        return self._history_html
 
     def exportConversation(self, format: str = "txt", output_path: str = None, metadata: dict = None) -> str:
         """
@@ -817,7 +876,7 @@ class Chat:
             - Legal documentation and audit trails
 
         Note:
-            - PDF export requires FPDF library
+            - Rendering is done by ConversationExporter (see export.py)
             - Markdown export includes embedded logo
             - All exports include timestamps and conversation flow
             - File paths should be writable by the application
@@ -828,14 +887,7 @@ class Chat:
             filename = f"chat_export_{timestamp}.{format}"
             output_path = os.path.join(os.getcwd(), filename)
 
-        if format.lower() == "txt":
-            return self._exportToTxt(output_path, metadata)
-        elif format.lower() == "md":
-            return self._exportToMd(output_path, metadata) 
-        elif format.lower() == "pdf":
-            return self._exportToPdf(output_path, metadata)
-        else:
-            raise ValueError("Format must be 'txt', 'md', or 'pdf'")
+        return ConversationExporter(self.messages, self.config.header_logo_path).export(format, output_path, metadata)
 
     def processQueue(self, handlers) -> bool:
         """
@@ -895,13 +947,26 @@ class Chat:
         Integration with Thread:
             - Uses Thread.runWithStreaming() for real-time responses
             - Handlers are passed through to Thread for tool calling
-            - Response is retrieved from Thread and added to conversation
+            - The RunResult returned by the run carries the response, which is added to
+              the conversation and kept in `last_run` (usage, tool-call log)
+            - The product search started for the prompt when it was queued is made
+              available to the search tools, which reuse its candidates when their
+              query matches the prompt (see prefetch.py)
+            - A question answered before in the store, with the same stock, catalog and
+              assistant configuration, gets that answer without a run (answercache.py);
+              the answers of new self-contained questions are cached
+            - Catalog statistics questions are answered by the intent router from the
+              catalog aggregates, before the cache and without a run (router.py)
             - Thread state is managed automatically
 
         Analytics Integration:
             - PromptTracker is updated after successful processing
+            - The tokens, cost and tool outputs of the run are queued to the usage
+              ledger (see accounting.py)
             - Conversation metrics are maintained
             - Processing status affects UI state
+            - The turn is traced as a "chat.turn" span (run checks, run, tool calls and
+              their sub-steps, context management), in the trace of its prompt
 
         Note:
             - This method is typically called in a loop or event handler
@@ -909,29 +974,173 @@ class Chat:
             - Streaming provides real-time user experience
             - Queue processing prevents message loss during busy periods
         """
-        if self.prompts_queue and not self.thread.isRunActive():
+        if not self.prompts_queue:
+            return False
+
+        # The turn continues the trace started when the prompt was submitted
+        trace_id = self._prompt_traces[0] if self._prompt_traces else None
+        with span("chat.turn", trace_id=trace_id, store_id=self.config.store_id,
+                  thread_id=self.thread.thread_id) as turn:
+            if self.thread.isRunActive():
+                turn.setAttribute("busy", True)
+                return False
+
             # Pop the first prompt from the queue
             # It has already been added to the thread by the processUserInput method
-            self.prompts_queue.pop(0)
-            
-            # Process in thread
-            with st.spinner(self.config.loading_text):
-                self.thread.runWithStreaming(self.assistant_id, handlers)
-
-            # Get and add assistant response
-            response = self.thread.retrieveLastMessage()
-            content = response["content"][0].text.value
-            self.addMessage(content, "assistant")
+            prompt = self.prompts_queue.pop(0)
+            if self._prompt_traces:
+                self._prompt_traces.pop(0)
+            prefetch = self._prefetches.pop(0) if self._prefetches else None
+
+            # Catalog statistics are answered locally; a repeated question of the store, with
+            # unchanged data, gets the previous answer
+            start = time.perf_counter()
+            routed = getIntentRouter().route(prompt) if self.config.intent_router else None
+            cache = getAnswerCache() if self.config.answer_cache and routed is None else None
+            cached = cache.lookup(prompt, self.config.store_id, self.assistant_id) if cache else None
+            if routed is not None:
+                turn.setAttribute("intent", routed.name)
+                self.last_run = RunResult(status="routed", messages=[routed.answer])
+                getUsageLedger().recordRun(self.last_run, store_id=self.config.store_id,
+                                           thread_id=self.thread.thread_id, elapsed=time.perf_counter() - start,
+                                           kind="router")
+                self.addMessage(routed.answer, "assistant", sync=True)
+            elif cached is not None:
+                turn.setAttribute("cached", True)
+                if prefetch is not None:
+                    prefetch.cancel()   # A near duplicate: its searches weren't skipped at queue time
+                self.last_run = RunResult(status="cached", messages=[cached.text])
+                getUsageLedger().recordRun(self.last_run, store_id=self.config.store_id,
+                                           thread_id=self.thread.thread_id, elapsed=time.perf_counter() - start,
+                                           kind="cache")
+                # No run stored the reply: it's posted so the thread keeps the whole conversation
+                self.addMessage(cached.text, "assistant", sync=True, cached=True)
+            else:
+                # Process in thread, the search tools reuse the retrieval started at queue time
+                with st.spinner(self.config.loading_text), usePrefetch(prefetch):
+                    start = time.perf_counter()
+                    self.last_run = self.thread.runWithStreaming(self.assistant_id, handlers)
+                getUsageLedger().recordRun(self.last_run, store_id=self.config.store_id,
+                                           thread_id=self.thread.thread_id, elapsed=time.perf_counter() - start)
+                if cache:
+                    cache.store(prompt, self.last_run, self.config.store_id, self.assistant_id)
+
+                # The answer comes with the run result, no need to read it back from the thread
+                content = self.last_run.text or self.config.empty_response_text
+                # In local-transcript mode the reply is only recorded locally: the run already
+                # stored it in the thread, posting it again would duplicate it in the context
+                self.addMessage(content, "assistant", sync=not self.config.local_transcript)
             
             # Update processing status
             self.is_processing = bool(self.prompts_queue)
 
+            # Keep the input of the next runs within the context budget
+            if not self.prompts_queue:
+                with span("context.manage") as context:
+                    context.setAttribute("compacted", self.manageContext())
+
             # Increment prompt counter
             self.prompt_tracker.incrementPromptCount()
+
+            # The rerun that follows renders the answer as part of this trace
+            self._render_trace = turn.trace_id or None
             
             return True
-        return False
     
+    def manageContext(self) -> bool:
+        """
+        Fold older messages into a rolling summary before the model stops reading them.
+
+        When the context read by the last model step of the run (its prompt tokens, not
+        the sum over the tool rounds) is above context_token_budget, or when the next
+        prompt would push messages not yet summarized out of the truncation window
+        (context_last_messages), the
+        messages before the last context_keep_messages are summarized (together with
+        the previous summary) and the thread is replaced by one holding the summary and
+        the recent messages. The local transcript is not modified, so the interface
+        and the exports keep the whole conversation.
+
+        Returns:
+            bool: True if the context was compacted.
+
+        Note:
+            A failure while summarizing leaves the thread as it is; the truncation
+            strategy still bounds the input of the runs.
+        """
+        if self.last_run is None:
+            return False
+        # The run usage adds up every step; the last one read the whole context
+        budget = self.config.context_token_budget
+        context_tokens = self.last_run.context_tokens or self.last_run.usage.get("prompt_tokens", 0)
+        over_budget = bool(budget) and context_tokens > budget
+        # The thread holds the summary and the messages since; the next prompt joins them
+        # before the run reads the last context_last_messages, so fold them in time
+        window = self.config.context_last_messages
+        pending = len(self.messages) - self._summarized_count + (1 if self.summary else 0)
+        leaving_window = window is not None and pending + 1 > window
+        if not over_budget and not leaving_window:
+            return False
+
+        keep = self.config.context_keep_messages
+        end = len(self.messages) - keep
+        folded = self.messages[self._summarized_count:end]
+        if not folded:
+            return False
+
+        try:
+            summary = self._summarize(folded)
+            recent = [(message["content"], message["role"]) for message in self.messages[end:]]
+            self.thread.compact(summary, recent)
+        except Exception as e:
+            print(f"Error compacting conversation context: {str(e)}")
+            return False
+
+        self.summary, self._summarized_count = summary, end
+        return True
+
+    def _summarize(self, messages: List[Dict[str, str]]) -> str:
+        """
+        Update the rolling summary with a block of messages.
+
+        Args:
+            messages (List[Dict[str, str]]): Messages to fold into the summary.
+
+        Returns:
+            str: The new summary.
+        """
+        transcript = "\n".join(
+            f"{'Usuario' if message['role'] == 'user' else 'Asistente'}: {message['content']}"
+            for message in messages
+        )
+        start = time.perf_counter()
+        response = self.thread.client.chat.completions.create(
+            model=CONTEXT_SUMMARY_MODEL,
+            temperature=0,
+            messages=[
+                {"role": "system", "content": (
+                    "Resume la conversación entre un cliente y el asistente de una farmacia. "
+                    "Conserva las necesidades del cliente, los productos, marcas y precios "
+                    "mencionados y cualquier dato que haga falta para continuarla. "
+                    "No incluyas listados completos de productos. Máximo 200 palabras."
+                )},
+                {"role": "user", "content": (
+                    f"Resumen previo:\n{self.summary or '(ninguno)'}\n\n"
+                    f"Mensajes nuevos:\n{transcript}"
+                )}
+            ]
+        )
+        usage = response.usage
+        getUsageLedger().recordRun(
+            RunResult(run_id=response.id, status="completed", model=response.model, usage={
+                "prompt_tokens": usage.prompt_tokens,
+                "completion_tokens": usage.completion_tokens,
+                "total_tokens": usage.total_tokens
+            } if usage else {}),
+            store_id=self.config.store_id, thread_id=self.thread.thread_id,
+            elapsed=time.perf_counter() - start, kind="summary"
+        )
+        return response.choices[0].message.content.strip()
+
     def processUserInput(self, user_input: str) -> None:
         """
         Process user input and add it to the processing queue.
@@ -941,8 +1150,24 @@ class Chat:
         """
         if user_input:
             # Add user message immediately and rerun to show it
-            self.addMessage(user_input, "user")
+            trace_id = newTraceId()
+            with span("chat.input", trace_id=trace_id, store_id=self.config.store_id,
+                      thread_id=self.thread.thread_id, chars=len(user_input)):
+                self.addMessage(user_input, "user")
             self.prompts_queue.append(user_input)
+            self._prompt_traces.append(trace_id)
+            # Speculative retrieval: the search runs while the turn reaches the model
+            # (questions the intent router or the answer cache answer never get there)
+            try:
+                routed = self.config.intent_router and getIntentRouter().classify(user_input) is not None
+            except Exception as e:
+                # The catalog can't be read: the turn will go to the assistant
+                print(f"Error classifying question: {str(e)}")
+                routed = False
+            cached = (self.config.answer_cache and not routed
+                      and getAnswerCache().contains(user_input, self.config.store_id, self.assistant_id))
+            prefetch = self.config.prefetch and not routed and not cached
+            self._prefetches.append(startPrefetch(user_input, trace_id) if prefetch else None)
             self.is_processing = True
 
     def renderChatInterface(self) -> None:
@@ -986,7 +1211,7 @@ class Chat:
 
         Header Features:
             - Fixed position at top of page
-            - Embedded logo image (base64 encoded)
+            - Embedded logo image (data URI, encoded once per process)
             - Customizable caption text
             - Professional styling and layout
 
@@ -1016,26 +1241,51 @@ class Chat:
 
         Note:
             - Must be called after Chat initialization
+            - Equivalent to renderHeader() followed by renderChatPane(); main.py calls
+              them separately so only the chat pane runs in a fragment
             - Interface is rendered in the current Streamlit session
             - Header logo should be accessible at configured path
             - Styling is applied globally to the chat interface
             - Input field automatically handles user submissions
         """
-        # Header
-        header_logo = encodeImage(self.config.header_logo_path)
-        st.markdown(f"""
+        self.renderHeader()
+        self.renderChatPane()
+
+    def renderHeader(self) -> None:
+        """
+        Render the fixed header (logo and caption).
+
+        The header is static: in fragment-based layouts it's rendered on full reruns
+        only, outside the chat fragment. Its HTML is built once per Chat instance.
+        """
+        if self._header_html is None:
+            self._header_html = f"""
             <div class="fixed-header">
                 <div class="header-content">
-                    <img src="data:image/jpeg;base64,{header_logo}" class="header-image">
+                    <img src="{dataUri(self.config.header_logo_path)}" class="header-image">
                 </div>
             </div>
-        """, unsafe_allow_html=True)
+        """
+        st.markdown(self._header_html, unsafe_allow_html=True)
         st.markdown(f"""<div class="header-caption">{self.config.header_caption}</div>""", unsafe_allow_html=True)
         st.markdown('<div class="chat-container">', unsafe_allow_html=True)
 
+    def renderChatPane(self) -> None:
+        """
+        Render the messages and the chat input.
+
+        This is the part of the interface that changes with every prompt, meant to
+        run inside a Streamlit fragment (see main.chatFragment).
+        """
         # Chat container - display messages
-        chat_container = st.container()
-        self.displayMessages(chat_container)
+        # The first render after an answer closes the trace of its turn (other reruns
+        # aren't traced)
+        trace_id, self._render_trace = self._render_trace, None
+        render = span("chat.render", trace_id=trace_id, store_id=self.config.store_id,
+                      thread_id=self.thread.thread_id, messages=len(self.messages)) if trace_id else nullcontext()
+        with render:
+            chat_container = st.container()
+            self.displayMessages(chat_container)
 
         # Chat input
         st.chat_input(
@@ -1056,7 +1306,7 @@ class Chat:
         if role == "user":
             _, right = st.columns(USER_CHAT_COLUMNS)
             with right:
-                with st.chat_message(role, avatar=self.config.user_avatar_path):
+                with st.chat_message(role, avatar=dataUri(self.config.user_avatar_path)):
                     container = st.empty()
                     current_text = ""
                     for char in content:
@@ -1067,7 +1317,7 @@ class Chat:
         else:
             left, _ = st.columns(BOT_CHAT_COLUMNS)
             with left:
-                with st.chat_message(role, avatar=self.config.bot_avatar_path):
+                with st.chat_message(role, avatar=dataUri(self.config.bot_avatar_path)):
                     container = st.empty()
                     current_text = ""
                     for char in content:
@@ -1105,9 +1355,8 @@ class Chat:
             None. Email is sent via SMTP.
 
         Raises:
-            smtplib.SMTPAuthenticationError: If email credentials are invalid.
-            smtplib.SMTPConnectError: If connection to SMTP server fails.
-            Exception: If there's an error sending the email or attaching files.
+            Exception: If email credentials are invalid, the SMTP server can't be
+                reached, or there's an error sending the email or attaching files.
 
         Email Features:
             - Professional HTML formatting
@@ -1149,8 +1398,6 @@ class Chat:
             >>> try:
             ...     chat.sendConversationEmail(from_email, to_email, password, attachments, metadata)
             ...     print("Email sent successfully")
-            ... except smtplib.SMTPAuthenticationError:
-            ...     print("Authentication failed. Check email and password.")
             ... except Exception as e:
             ...     print(f"Email sending failed: {e}")
 
@@ -1164,7 +1411,7 @@ class Chat:
             - Beta version disclaimer
 
         SMTP Configuration:
-            - Uses Gmail SMTP server (smtp.gmail.com:587)
+            - Uses SMTP_HOST:SMTP_PORT from params (Gmail by default)
             - Requires TLS encryption
             - Supports app-specific passwords
             - Handles authentication errors gracefully
@@ -1189,87 +1436,23 @@ class Chat:
             - Conversation details are in attachments for privacy
             - Beta version disclaimer is included automatically
         """
+        from .delivery import SmtpConnection, buildConversationEmail
+
+        message = buildConversationEmail(
+            from_email=from_email,
+            to_email=to_email,
+            attachments=attachments,
+            metadata=metadata,
+            message_count=len(self.messages),
+            elapsed_time=self._computeChatElapsedTime()
+        )
+        smtp = SmtpConnection(from_email, password)
         try:
-
-            # Email settings
-            message = MIMEMultipart()
-            message['From'] = from_email
-            message['To'] = to_email
-            message['Subject'] = f'Dev:Reporte de Conversación OpenFarma - {datetime.now().strftime("%Y-%m-%d %H:%M")}'
-
-            # Create email body
-            body = f"""
-            <html>
-            <body style="font-family: Arial, sans-serif; line-height: 1.6;">
-                <h2 style="color: #2c3e50;">Reporte de Conversación - OpenFarma AI</h2>
-                
-                <div style="background-color: #f8f9fa; padding: 15px; border-radius: 5px;">
-                    <h3 style="color: #2c3e50;">Información General:</h3>
-                    <ul style="list-style-type: none; padding-left: 0;">
-                        <li><strong>Fecha:</strong> {datetime.now().strftime("%d/%m/%Y")}</li>
-                        <li><strong>Hora:</strong> {datetime.now().strftime("%H:%M:%S")}</li>
-                        <li><strong>Usuario:</strong> {metadata.get('Usuario', 'No especificado')}</li>
-                        <li><strong>Sucursal:</strong> {metadata.get('Sucursal', 'No especificada')}</li>
-                        <li><strong>Dirección:</strong> {metadata.get('Dirección', 'No especificada')}</li>
-                        <li><strong>Localidad:</strong> {metadata.get('Localidad', 'No especificada')}</li>
-                    </ul>
-                </div>
-
-                <div style="margin-top: 20px;">
-                    <h3 style="color: #2c3e50;">Detalles de la Conversación:</h3>
-                    <ul>
-                        <li>Cantidad de mensajes intercambiados: {len(self.messages)}</li>
-                        <li>Duración de la conversación: {self._computeChatElapsedTime()}</li>
-                        <li>Archivos adjuntos: {len(attachments)} documento(s)</li>
-                    </ul>
-                </div>
-
-                <p style="color: #666; font-style: italic;">
-                    Nota: Por razones de privacidad y seguridad, el contenido detallado 
-                    de la conversación se encuentra en los archivos adjuntos.
-                </p>
-
-                <hr style="border: 1px solid #eee; margin: 20px 0;">
-                
-                <footer style="color: #666; font-size: 12px;">
-                    <p>Este es un mensaje automático generado por OpenFarma AI Assistant.</p>
-                    <p>Por favor no responda a este correo.</p>
-                    <p style="color: #ff0000;">Esta conversación fue enviada desde la versión beta del software.</p>
-                </footer>
-            </body>
-            </html>
-            """
-
-            # Attach body
-            message.attach(MIMEText(body, 'html'))
-
-            # Attach files
-            for file_path in attachments:
-                try:
-                    with open(file_path, "rb") as f:
-                        part = MIMEApplication(f.read(), _subtype="pdf")
-                        part.add_header('Content-Disposition', 'attachment', 
-                                      filename=os.path.basename(file_path))
-                        message.attach(part)
-                except Exception as e:
-                    raise Exception(f"Error attaching file {file_path}: {str(e)}")
-
-            # Start SMTP session
-            session = smtplib.SMTP('smtp.gmail.com', 587)
-            session.starttls()
-            session.login(from_email, password)
-
-            # Send email
-            text = message.as_string()
-            session.sendmail(from_email, to_email, text)
-            session.quit()
-
-        except smtplib.SMTPAuthenticationError:
-            raise Exception("Authentication error. Check email address and password.")
-        except smtplib.SMTPConnectError:
-            raise Exception("Failed to connect to SMTP server. Check internet connection.")
+            smtp.send(message, to_email)
         except Exception as e:
             raise Exception(f"Error sending email: {str(e)}")
+        finally:
+            smtp.close()
 
     def _computeChatElapsedTime(self) -> str:
         """
@@ -1339,18 +1522,4 @@ class Chat:
             - Output is in Spanish for consistency with application
             - Precision is to the minute level
         """
-        if len(self.messages) < 2:
-            return "Menos de 1 minuto"
-        
-        start_time = self.messages[0]["timestamp"]
-        end_time = self.messages[-1]["timestamp"]
-        duration = end_time - start_time
-        
-        minutes = duration.total_seconds() / 60
-        if minutes < 1:
-            return "Menos de 1 minuto"
-        elif minutes < 60:
-            return f"{int(minutes)} minutos"
-        else:
-            hours = minutes / 60
-            return f"{int(hours)} horas {int(minutes % 60)} minutos"
\ No newline at end of file
+        return computeElapsedTime(self.messages)
@@ -0,0 +1,211 @@
+"""
+Composition of the tool outputs returned to the assistant by the product search functions.
+
+The vector databases store every product as "Column: value" pairs (`db_all` holds every
+ABM column), and the tool outputs stay in the thread, so the model reads them again on
+every later turn. The composer keeps only the fields relevant to the invoking function
+and fits the output into a token budget counted locally.
+
+Key Components:
+- ProductEntry: A product found by a search: its vector database fields plus the sale
+  data (stock, price, promotion) and image URL.
+- parseProduct: Splits a vector database document into its fields.
+- countTokens: Counts tokens with the model's tokenizer (estimate when unavailable).
+- composeProductContext: Renders the products of a tool call within its token budget.
+  The first TOOL_OUTPUT_INTACT_PRODUCTS products are always complete; the following
+  ones get their descriptive fields shortened and are dropped once the budget is spent.
+
+Typical Usage:
+    >>> entries = [ProductEntry(parseProduct(text), stock, price, promo, url), ...]
+    >>> composeProductContext(entries, tool="buscar_productos_por_beneficios")
+"""
+
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from .params import TOOL_OUTPUT_TOKEN_BUDGET, TOOL_OUTPUT_INTACT_PRODUCTS, TOKENIZER_ENCODING
+
+# Columns of the ABM table, in the order they are written in the vector databases
+PRODUCT_FIELDS = ['EAN', 'Marca', 'Nombre', 'Presentacion', 'Indicaciones', 'Categoria',
+                  'Modo de uso', 'Beneficios', 'Propiedades', 'General']
+BASE_FIELDS = ['Marca', 'Nombre', 'Presentacion']
+
+# Descriptive fields kept for each function (besides BASE_FIELDS). Functions not listed
+# keep every field.
+TOOL_FIELDS = {
+    "buscar_productos": ['Indicaciones', 'Beneficios', 'General'],
+    "buscar_productos_por_presentacion": ['General'],
+    "buscar_productos_por_presentacion_y_tamano": ['General'],
+    "buscar_productos_por_beneficios": ['Beneficios'],
+    "buscar_productos_por_categoria": ['Categoria'],
+    "buscar_productos_por_indicaciones": ['Indicaciones'],
+    "buscar_productos_por_modo_uso": ['Modo de uso'],
+    "buscar_productos_por_propiedades": ['Propiedades'],
+    "buscar_productos_por_problema_y_promocion": ['Indicaciones', 'Beneficios'],
+}
+
+HEADER = "Los productos encontrados son:\n\n"
+ELLIPSIS = "…"
+
+_FIELD_PATTERN = re.compile(
+    r"(?:^|\s)(" + "|".join(re.escape(field) for field in PRODUCT_FIELDS) + r"): "
+)
+
+@dataclass
+class ProductEntry:
+    """
+    Product found by a search.
+
+    Attributes:
+        fields (Dict[str, str]): Vector database fields (see parseProduct).
+        stock (str): Units in stock.
+        price (str): Price.
+        promo (str): Promotion ("No promo" when there is none).
+        url (str): Image URL, empty when there is none.
+    """
+    fields: Dict[str, str]
+    stock: str
+    price: str
+    promo: str
+    url: str = ""
+
+def parseProduct(page_content: str) -> Dict[str, str]:
+    """
+    Split a vector database document ("Marca: X Nombre: Y ...") into its fields.
+
+    Args:
+        page_content (str): Document text.
+
+    Returns:
+        Dict[str, str]: Field values by column name. A text without known columns is
+            returned whole under 'General'.
+    """
+    matches = list(_FIELD_PATTERN.finditer(page_content))
+    if not matches:
+        return {'General': page_content.strip()}
+
+    fields = {}
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(page_content)
+        fields[match.group(1)] = page_content[match.end():end].strip()
+    return fields
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+def _getEncoding():
+    """Tokenizer of the assistant's model, loaded once. False if it can't be loaded."""
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+                except Exception:
+                    _encoding = False  # Offline or missing tokenizer files: estimate
+    return _encoding
+
+def countTokens(text: str) -> int:
+    """
+    Count the tokens of a text as the model sees them.
+
+    Falls back to an estimate of 4 characters per token when the tokenizer isn't available.
+    """
+    encoding = _getEncoding()
+    if encoding:
+        return len(encoding.encode(text))
+    return (len(text) + 3) // 4
+
+def _renderProduct(entry: ProductEntry, fields: List[str]) -> str:
+    """Render a product with the given descriptive fields."""
+    base = " ".join(f"{field}: {entry.fields[field]}" for field in BASE_FIELDS if entry.fields.get(field))
+    lines = [base] if base else []
+    lines += [f"{field}: {entry.fields[field]}" for field in fields if entry.fields.get(field)]
+    lines.append(f"Stock: {entry.stock}. Precio: ${entry.price}. Promoción: {entry.promo}")
+    if entry.url:
+        lines.append(f"URL: {entry.url if entry.url.startswith('http') else 'https://' + entry.url}")
+    return "\n".join(lines) + "\n\n"
+
+def _shorten(text: str, tokens: int) -> str:
+    """Cut a text to about `tokens` tokens, on a word boundary."""
+    if tokens <= 0:
+        return ""
+    if countTokens(text) <= tokens:
+        return text
+    words = text.split()
+    low, high = 0, len(words)
+    # Longest prefix of words that fits
+    while low < high:
+        middle = (low + high + 1) // 2
+        if countTokens(" ".join(words[:middle]) + ELLIPSIS) <= tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return " ".join(words[:low]) + ELLIPSIS if low else ""
+
+def _fitProduct(entry: ProductEntry, fields: List[str], tokens: int) -> Optional[str]:
+    """
+    Render a product within `tokens` tokens, shortening its descriptive fields evenly.
+
+    Returns:
+        Optional[str]: The rendered product, or None if not even its name, presentation
+            and sale data fit.
+    """
+    text = _renderProduct(entry, fields)
+    if countTokens(text) <= tokens:
+        return text
+
+    bare = _renderProduct(entry, [])
+    spare = tokens - countTokens(bare)
+    present = [field for field in fields if entry.fields.get(field)]
+    if spare <= 0:
+        return None
+    if not present:
+        return bare
+
+    # Each line costs its label too; share what's left evenly among the fields
+    share = spare // len(present) - 4
+    shortened = dict(entry.fields)
+    for field in present:
+        shortened[field] = _shorten(entry.fields[field], share)
+    kept = [field for field in present if shortened[field]]
+    text = _renderProduct(ProductEntry(shortened, entry.stock, entry.price, entry.promo, entry.url), kept)
+    return text if countTokens(text) <= tokens else bare
+
+def composeProductContext(entries: List[ProductEntry], tool: Optional[str] = None,
+                          budget: int = TOOL_OUTPUT_TOKEN_BUDGET,
+                          intact: int = TOOL_OUTPUT_INTACT_PRODUCTS) -> str:
+    """
+    Render the products of a tool call within a token budget.
+
+    Args:
+        entries (List[ProductEntry]): Products in relevance order.
+        tool (str, optional): Name of the invoking function, selects the fields kept
+            (see TOOL_FIELDS). None keeps every field.
+        budget (int): Maximum tokens of the output.
+        intact (int): Leading products always rendered complete, even over budget.
+
+    Returns:
+        str: The context, starting with "Los productos encontrados son:".
+    """
+    fields = TOOL_FIELDS.get(tool, [field for field in PRODUCT_FIELDS
+                                     if field not in BASE_FIELDS + ['EAN']])
+    context = HEADER
+    used = countTokens(HEADER)
+    omitted = 0
+    for i, entry in enumerate(entries):
+        if i < intact:
+            text = _renderProduct(entry, fields)
+        else:
+            text = _fitProduct(entry, fields, budget - used)
+            if text is None:
+                omitted = len(entries) - i
+                break
+        context += text
+        used += countTokens(text)
+
+    if omitted:
+        context += f"({omitted} productos más omitidos por extensión.)\n"
+    return context
@@ -0,0 +1,602 @@
+"""
+This module delivers conversation reports by email from a background worker, so
+logging out doesn't wait on PDF rendering or on the SMTP server.
+
+Key Components:
+- DeliveryJob: Serializable snapshot of a finished conversation (messages and metadata).
+- SmtpConnection: Authenticated SMTP session reused across deliveries.
+- DeliveryQueue: Process-wide job queue. Jobs are written to a spool directory under
+  HISTORY_PATH before being queued, rendered and mailed by a worker thread with retries,
+  and removed from the spool once delivered. Pending jobs are resumed on restart.
+  In digest mode (DELIVERY_DIGEST_MODE) jobs are held in the spool and sent as one
+  email per window (hourly, or daily per store) with the PDFs bundled in a zip file.
+- buildConversationEmail: Builds the report email (HTML body and attachments).
+- buildDigestEmail: Builds the digest email for a group of conversations.
+
+Typical Usage:
+    >>> getDeliveryQueue().submit(chat.messages, metadata, output_path, HEADER_LOGO_PATH)
+"""
+
+import os, json, time
+import uuid, queue, zipfile
+import smtplib, threading
+from dataclasses import dataclass, field, asdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.mime.application import MIMEApplication
+
+from .export import ConversationExporter, computeElapsedTime
+from .params import (
+    EMAIL_FROM,
+    EMAIL_TO,
+    EMAIL_PASSWORD,
+    SMTP_HOST,
+    SMTP_PORT,
+    SMTP_IDLE_TIMEOUT,
+    DELIVERY_SPOOL_PATH,
+    DELIVERY_MAX_RETRIES,
+    DELIVERY_RETRY_DELAY,
+    DELIVERY_DIGEST_MODE,
+    DELIVERY_DIGEST_CHECK_INTERVAL
+)
+
+DIGEST_MODES = (None, "hourly", "daily")
+
+def buildConversationEmail(from_email: str, to_email: str, attachments: List[str], metadata: dict,
+                           message_count: int, elapsed_time: str,
+                           sent_at: Optional[datetime] = None) -> MIMEMultipart:
+    """
+    Build the conversation report email.
+
+    Args:
+        from_email (str): Sender's email address.
+        to_email (str): Recipient's email address.
+        attachments (List[str]): Paths of the files to attach.
+        metadata (dict): Conversation metadata (Usuario, Sucursal, Dirección, Localidad).
+        message_count (int): Number of messages exchanged.
+        elapsed_time (str): Human-readable duration of the conversation.
+        sent_at (Optional[datetime]): Date shown in the report. Defaults to now.
+
+    Returns:
+        MIMEMultipart: The email, ready to be sent.
+
+    Raises:
+        Exception: If an attachment can't be read.
+    """
+    sent_at = sent_at or datetime.now()
+
+    # Email settings
+    message = MIMEMultipart()
+    message['From'] = from_email
+    message['To'] = to_email
+    message['Subject'] = f'Dev:Reporte de Conversación OpenFarma - {sent_at.strftime("%Y-%m-%d %H:%M")}'
+
+    # Create email body
+    body = f"""
+    <html>
+    <body style="font-family: Arial, sans-serif; line-height: 1.6;">
+        <h2 style="color: #2c3e50;">Reporte de Conversación - OpenFarma AI</h2>
+
+        <div style="background-color: #f8f9fa; padding: 15px; border-radius: 5px;">
+            <h3 style="color: #2c3e50;">Información General:</h3>
+            <ul style="list-style-type: none; padding-left: 0;">
+                <li><strong>Fecha:</strong> {sent_at.strftime("%d/%m/%Y")}</li>
+                <li><strong>Hora:</strong> {sent_at.strftime("%H:%M:%S")}</li>
+                <li><strong>Usuario:</strong> {metadata.get('Usuario', 'No especificado')}</li>
+                <li><strong>Sucursal:</strong> {metadata.get('Sucursal', 'No especificada')}</li>
+                <li><strong>Dirección:</strong> {metadata.get('Dirección', 'No especificada')}</li>
+                <li><strong>Localidad:</strong> {metadata.get('Localidad', 'No especificada')}</li>
+            </ul>
+        </div>
+
+        <div style="margin-top: 20px;">
+            <h3 style="color: #2c3e50;">Detalles de la Conversación:</h3>
+            <ul>
+                <li>Cantidad de mensajes intercambiados: {message_count}</li>
+                <li>Duración de la conversación: {elapsed_time}</li>
+                <li>Archivos adjuntos: {len(attachments)} documento(s)</li>
+            </ul>
+        </div>
+
+        <p style="color: #666; font-style: italic;">
+            Nota: Por razones de privacidad y seguridad, el contenido detallado
+            de la conversación se encuentra en los archivos adjuntos.
+        </p>
+
+        <hr style="border: 1px solid #eee; margin: 20px 0;">
+
+        <footer style="color: #666; font-size: 12px;">
+            <p>Este es un mensaje automático generado por OpenFarma AI Assistant.</p>
+            <p>Por favor no responda a este correo.</p>
+            <p style="color: #ff0000;">Esta conversación fue enviada desde la versión beta del software.</p>
+        </footer>
+    </body>
+    </html>
+    """
+
+    # Attach body
+    message.attach(MIMEText(body, 'html'))
+
+    # Attach files
+    for file_path in attachments:
+        try:
+            with open(file_path, "rb") as f:
+                subtype = os.path.splitext(file_path)[1].lstrip(".") or "octet-stream"
+                part = MIMEApplication(f.read(), _subtype=subtype)
+                part.add_header('Content-Disposition', 'attachment',
+                                filename=os.path.basename(file_path))
+                message.attach(part)
+        except Exception as e:
+            raise Exception(f"Error attaching file {file_path}: {str(e)}")
+
+    return message
+
+def buildDigestEmail(from_email: str, to_email: str, zip_path: str, jobs: List["DeliveryJob"],
+                     window_start: datetime, window_end: datetime,
+                     store: Optional[str] = None) -> MIMEMultipart:
+    """
+    Build the digest email for the conversations of a window.
+
+    Args:
+        from_email (str): Sender's email address.
+        to_email (str): Recipient's email address.
+        zip_path (str): Path of the zip file with the conversation PDFs.
+        jobs (List[DeliveryJob]): Conversations included in the digest.
+        window_start (datetime): Start of the window.
+        window_end (datetime): End of the window.
+        store (Optional[str]): Store of the digest, None if it covers every store.
+
+    Returns:
+        MIMEMultipart: The email, ready to be sent.
+
+    Raises:
+        Exception: If the zip file can't be read.
+    """
+    message = MIMEMultipart()
+    message['From'] = from_email
+    message['To'] = to_email
+    message['Subject'] = (
+        f'Dev:Resumen de Conversaciones OpenFarma - {store + " - " if store else ""}'
+        f'{window_start.strftime("%Y-%m-%d %H:%M")}'
+    )
+
+    rows = ""
+    for job in jobs:
+        messages = job.chatMessages()
+        rows += f"""
+                <tr>
+                    <td>{messages[0]["timestamp"].strftime("%d/%m/%Y %H:%M")}</td>
+                    <td>{job.metadata.get('Usuario', 'No especificado')}</td>
+                    <td>{job.metadata.get('Sucursal', 'No especificada')}</td>
+                    <td>{len(messages)}</td>
+                    <td>{computeElapsedTime(messages)}</td>
+                </tr>"""
+
+    body = f"""
+    <html>
+    <body style="font-family: Arial, sans-serif; line-height: 1.6;">
+        <h2 style="color: #2c3e50;">Resumen de Conversaciones - OpenFarma AI</h2>
+
+        <div style="background-color: #f8f9fa; padding: 15px; border-radius: 5px;">
+            <h3 style="color: #2c3e50;">Información General:</h3>
+            <ul style="list-style-type: none; padding-left: 0;">
+                <li><strong>Desde:</strong> {window_start.strftime("%d/%m/%Y %H:%M")}</li>
+                <li><strong>Hasta:</strong> {window_end.strftime("%d/%m/%Y %H:%M")}</li>
+                <li><strong>Sucursal:</strong> {store or 'Todas'}</li>
+                <li><strong>Conversaciones:</strong> {len(jobs)}</li>
+            </ul>
+        </div>
+
+        <div style="margin-top: 20px;">
+            <h3 style="color: #2c3e50;">Detalles de las Conversaciones:</h3>
+            <table style="border-collapse: collapse;" cellpadding="6">
+                <tr style="text-align: left;">
+                    <th>Inicio</th><th>Usuario</th><th>Sucursal</th><th>Mensajes</th><th>Duración</th>
+                </tr>{rows}
+            </table>
+        </div>
+
+        <p style="color: #666; font-style: italic;">
+            Nota: Por razones de privacidad y seguridad, el contenido detallado
+            de las conversaciones se encuentra en el archivo adjunto ({os.path.basename(zip_path)}).
+        </p>
+
+        <hr style="border: 1px solid #eee; margin: 20px 0;">
+
+        <footer style="color: #666; font-size: 12px;">
+            <p>Este es un mensaje automático generado por OpenFarma AI Assistant.</p>
+            <p>Por favor no responda a este correo.</p>
+            <p style="color: #ff0000;">Estas conversaciones fueron enviadas desde la versión beta del software.</p>
+        </footer>
+    </body>
+    </html>
+    """
+    message.attach(MIMEText(body, 'html'))
+
+    try:
+        with open(zip_path, "rb") as f:
+            part = MIMEApplication(f.read(), _subtype="zip")
+            part.add_header('Content-Disposition', 'attachment', filename=os.path.basename(zip_path))
+            message.attach(part)
+    except Exception as e:
+        raise Exception(f"Error attaching file {zip_path}: {str(e)}")
+
+    return message
+
+class SmtpConnection:
+    """
+    Authenticated SMTP session reused across deliveries.
+
+    The session is opened (STARTTLS and login) on the first send and kept open,
+    so consecutive reports share one handshake. A session dropped by the server
+    is re-established once per send.
+
+    Attributes:
+        from_email (str): Sender's email address, also used as the login.
+        password (str): Sender's email password or app-specific password.
+        host (str): SMTP server host.
+        port (int): SMTP server port.
+    """
+
+    def __init__(self, from_email: str, password: str, host: str = SMTP_HOST,
+                 port: int = SMTP_PORT, timeout: int = 30):
+        self.from_email = from_email
+        self.password = password
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._session: Optional[smtplib.SMTP] = None
+
+    def _connect(self) -> None:
+        """Open and authenticate a new SMTP session."""
+        session = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            session.starttls()
+            session.login(self.from_email, self.password)
+        except Exception:
+            session.close()
+            raise
+        self._session = session
+
+    def send(self, message: MIMEMultipart, to_email: str) -> None:
+        """
+        Send an email over the shared session.
+
+        Args:
+            message (MIMEMultipart): The email to send.
+            to_email (str): Recipient's email address.
+
+        Raises:
+            Exception: If the email can't be sent.
+        """
+        for attempt in range(2):
+            try:
+                if self._session is None:
+                    self._connect()
+                self._session.sendmail(self.from_email, to_email, message.as_string())
+                return
+            except smtplib.SMTPAuthenticationError:
+                self.close()
+                raise Exception("Authentication error. Check email address and password.")
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError) as e:
+                self.close()
+                if attempt:
+                    raise Exception(f"Failed to connect to SMTP server: {str(e)}")
+
+    def close(self) -> None:
+        """Close the session, if any."""
+        if self._session is not None:
+            try:
+                self._session.quit()
+            except Exception:
+                self._session.close()
+            self._session = None
+
+@dataclass
+class DeliveryJob:
+    """
+    Snapshot of a finished conversation waiting to be delivered.
+
+    Attributes:
+        job_id (str): Unique identifier, also the spool file name.
+        messages (List[Dict]): Conversation messages ("timestamp" as ISO string).
+        metadata (Dict): Conversation metadata.
+        output_path (str): Path of the rendered PDF.
+        header_logo_path (str): Path of the logo embedded in the PDF.
+        created_at (str): ISO timestamp of the submission.
+        attempts (int): Failed delivery attempts so far.
+    """
+    job_id: str
+    messages: List[Dict]
+    metadata: Dict
+    output_path: str
+    header_logo_path: str
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat(timespec="seconds"))
+    attempts: int = 0
+
+    @classmethod
+    def fromMessages(cls, messages: List[Dict], metadata: Dict, output_path: str,
+                     header_logo_path: str) -> "DeliveryJob":
+        """Create a job from Chat messages (with datetime timestamps)."""
+        snapshot = [
+            {"role": msg["role"], "content": msg["content"], "timestamp": msg["timestamp"].isoformat()}
+            for msg in messages
+        ]
+        return cls(uuid.uuid4().hex, snapshot, dict(metadata), output_path, header_logo_path)
+
+    def chatMessages(self) -> List[Dict]:
+        """Get the messages with datetime timestamps, as Chat stores them."""
+        return [
+            {"role": msg["role"], "content": msg["content"],
+             "timestamp": datetime.fromisoformat(msg["timestamp"])}
+            for msg in self.messages
+        ]
+
+    def digestWindow(self, mode: str) -> Tuple[datetime, datetime, Optional[str]]:
+        """
+        Get the digest window of the job.
+
+        Args:
+            mode (str): "hourly" (one digest for every store) or "daily" (one per store).
+
+        Returns:
+            Tuple[datetime, datetime, Optional[str]]: Window start, window end and store
+                (None for hourly digests).
+        """
+        created_at = datetime.fromisoformat(self.created_at)
+        if mode == "hourly":
+            start = created_at.replace(minute=0, second=0, microsecond=0)
+            return start, start + timedelta(hours=1), None
+        start = created_at.replace(hour=0, minute=0, second=0, microsecond=0)
+        return start, start + timedelta(days=1), self.metadata.get('Sucursal') or 'Sin sucursal'
+
+class DeliveryQueue:
+    """
+    Process-wide queue that renders and emails conversation reports in the background.
+
+    `submit` only writes the job to the spool directory and queues it, so it returns
+    immediately. The worker renders the PDF, sends it over a reused SmtpConnection and
+    removes the spool file. Failed jobs are retried with exponential backoff up to
+    DELIVERY_MAX_RETRIES times, then left in the spool as `<job_id>.failed.json`.
+
+    In digest mode jobs stay in the spool until their window (hour, or day per store)
+    is over. Then the worker renders their PDFs into one zip file and sends one email
+    per window, every digest of a check sharing the same SMTP session.
+    """
+
+    def __init__(self, from_email: str = EMAIL_FROM, to_email: str = EMAIL_TO,
+                 password: str = EMAIL_PASSWORD, spool_path: str = DELIVERY_SPOOL_PATH,
+                 digest_mode: Optional[str] = DELIVERY_DIGEST_MODE):
+        """
+        Initialize the queue and resume the jobs left in the spool directory.
+
+        Args:
+            from_email (str): Sender's email address.
+            to_email (str): Recipient's email address.
+            password (str): Sender's email password.
+            spool_path (str): Directory holding the pending jobs.
+            digest_mode (Optional[str]): None (one email per conversation), "hourly" or "daily".
+
+        Raises:
+            ValueError: If the digest mode is not supported.
+        """
+        if digest_mode not in DIGEST_MODES:
+            raise ValueError("Digest mode must be None, 'hourly' or 'daily'")
+        self.from_email = from_email
+        self.to_email = to_email
+        self.spool_path = spool_path
+        self.digest_mode = digest_mode
+        self.smtp = SmtpConnection(from_email, password)
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._digest_retry_at: Dict[Tuple, float] = {}
+
+        os.makedirs(self.spool_path, exist_ok=True)
+        pending = self._spooledJobIds()
+        if not self.digest_mode:
+            for job_id in pending:
+                self._queue.put(job_id)
+        if pending:
+            self._ensureWorker()
+
+    def submit(self, messages: List[Dict], metadata: Dict, output_path: str,
+               header_logo_path: str) -> str:
+        """
+        Queue a conversation report and return immediately.
+
+        Args:
+            messages (List[Dict]): Chat messages (copied into the job).
+            metadata (Dict): Conversation metadata.
+            output_path (str): Path of the PDF to render and attach.
+            header_logo_path (str): Path of the logo embedded in the PDF.
+
+        Returns:
+            str: The job identifier.
+        """
+        job = DeliveryJob.fromMessages(messages, metadata, output_path, header_logo_path)
+        self._saveJob(job)
+        if not self.digest_mode:
+            self._queue.put(job.job_id)
+        self._ensureWorker()
+        return job.job_id
+
+    def pending(self) -> int:
+        """Number of jobs waiting in the spool directory."""
+        return len(self._spooledJobIds())
+
+    def flushDigests(self, force: bool = False) -> int:
+        """
+        Send the digests whose window is over.
+
+        Args:
+            force (bool): Send the digests of the current windows too.
+
+        Returns:
+            int: Number of digests sent.
+        """
+        groups: Dict[Tuple, List[DeliveryJob]] = {}
+        for job_id in self._spooledJobIds():
+            job = self._loadJob(job_id)
+            if job is not None:
+                groups.setdefault(job.digestWindow(self.digest_mode or "hourly"), []).append(job)
+
+        now = datetime.now()
+        sent = 0
+        for window, jobs in sorted(groups.items(), key=lambda item: item[0][0]):
+            if not force and (window[1] > now or self._digest_retry_at.get(window, 0) > time.time()):
+                continue
+            try:
+                self._deliverDigest(window, jobs)
+            except Exception as e:
+                self._retryDigest(window, jobs, e)
+                continue
+            self._digest_retry_at.pop(window, None)
+            for job in jobs:
+                os.remove(self._jobPath(job.job_id))
+            sent += 1
+        return sent
+
+    def _spooledJobIds(self) -> List[str]:
+        """Identifiers of the jobs in the spool directory, oldest first."""
+        names = [
+            name for name in os.listdir(self.spool_path)
+            if name.endswith(".json") and not name.endswith(".failed.json")
+        ]
+        names.sort(key=lambda name: os.path.getmtime(os.path.join(self.spool_path, name)))
+        return [name[:-len(".json")] for name in names]
+
+    def _jobPath(self, job_id: str) -> str:
+        return os.path.join(self.spool_path, f"{job_id}.json")
+
+    def _saveJob(self, job: DeliveryJob) -> None:
+        """Write a job to the spool directory atomically."""
+        tmp_path = f"{self._jobPath(job.job_id)}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(asdict(job), f, ensure_ascii=False)
+        os.replace(tmp_path, self._jobPath(job.job_id))
+
+    def _loadJob(self, job_id: str) -> Optional[DeliveryJob]:
+        """Read a job from the spool directory, None if it's gone."""
+        try:
+            with open(self._jobPath(job_id), "r", encoding="utf-8") as f:
+                return DeliveryJob(**json.load(f))
+        except FileNotFoundError:
+            return None
+
+    def _setAside(self, job: DeliveryJob, error: Exception) -> None:
+        """Keep a job that ran out of retries as `<job_id>.failed.json`."""
+        print(f"Error delivering conversation {job.job_id}, giving up: {str(error)}")
+        os.replace(self._jobPath(job.job_id), os.path.join(self.spool_path, f"{job.job_id}.failed.json"))
+
+    def _render(self, job: DeliveryJob) -> str:
+        """Render the PDF of a job and return its path."""
+        ConversationExporter(job.chatMessages(), job.header_logo_path).toPdf(job.output_path, job.metadata)
+        return job.output_path
+
+    def _deliver(self, job: DeliveryJob) -> None:
+        """Render the PDF and email it."""
+        messages = job.chatMessages()
+        email = buildConversationEmail(
+            from_email=self.from_email,
+            to_email=self.to_email,
+            attachments=[self._render(job)],
+            metadata=job.metadata,
+            message_count=len(messages),
+            elapsed_time=computeElapsedTime(messages),
+            sent_at=datetime.fromisoformat(job.created_at)
+        )
+        self.smtp.send(email, self.to_email)
+
+    def _deliverDigest(self, window: Tuple, jobs: List[DeliveryJob]) -> None:
+        """Render the PDFs of a window into a zip file and email it."""
+        window_start, window_end, store = window
+        name = f"chatbot_{window_start.strftime('%Y-%m-%d %H-%M')}"
+        if store:
+            name += f"_{store}"
+        zip_path = os.path.join(self.spool_path, f"{name}.zip")
+        try:
+            with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as bundle:
+                for number, job in enumerate(jobs, start=1):
+                    # Rendered one at a time, so jobs sharing an output path don't overwrite each other
+                    bundle.write(self._render(job), arcname=f"{number:02d}_{os.path.basename(job.output_path)}")
+            email = buildDigestEmail(self.from_email, self.to_email, zip_path, jobs,
+                                     window_start, window_end, store)
+            self.smtp.send(email, self.to_email)
+        finally:
+            if os.path.exists(zip_path):
+                os.remove(zip_path)
+
+    def _retryDigest(self, window: Tuple, jobs: List[DeliveryJob], error: Exception) -> None:
+        """Schedule a failed digest for a retry, setting aside jobs out of retries."""
+        attempts = 0
+        for job in jobs:
+            job.attempts += 1
+            attempts = max(attempts, job.attempts)
+            if job.attempts < DELIVERY_MAX_RETRIES:
+                self._saveJob(job)
+            else:
+                self._setAside(job, error)
+        delay = DELIVERY_RETRY_DELAY * 2 ** (attempts - 1)
+        self._digest_retry_at[window] = time.time() + delay
+        print(f"Error delivering digest {window[0]} ({len(jobs)} conversations), retrying in {delay}s: {str(error)}")
+
+    def _process(self, job_id: str) -> None:
+        """Deliver a job, scheduling a retry on failure."""
+        job = self._loadJob(job_id)
+        if job is None:
+            return
+        try:
+            self._deliver(job)
+            os.remove(self._jobPath(job_id))
+        except Exception as e:
+            job.attempts += 1
+            if job.attempts < DELIVERY_MAX_RETRIES:
+                self._saveJob(job)
+                delay = DELIVERY_RETRY_DELAY * 2 ** (job.attempts - 1)
+                print(f"Error delivering conversation {job_id}, retrying in {delay}s: {str(e)}")
+                retry = threading.Timer(delay, self._queue.put, args=(job_id,))
+                retry.daemon = True
+                retry.start()
+            else:
+                self._setAside(job, e)
+
+    def _ensureWorker(self) -> None:
+        """Start the background worker if it's not running."""
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="conversation-delivery", daemon=True)
+                self._worker.start()
+
+    def _run(self) -> None:
+        """Process jobs (or digests), closing the SMTP session when idle."""
+        while True:
+            if self.digest_mode:
+                time.sleep(DELIVERY_DIGEST_CHECK_INTERVAL)
+                try:
+                    self.flushDigests()
+                except Exception as e:
+                    print(f"Error flushing digests: {str(e)}")
+                finally:
+                    # One session per check: digests are too far apart to keep it open
+                    self.smtp.close()
+                continue
+            try:
+                job_id = self._queue.get(timeout=SMTP_IDLE_TIMEOUT)
+            except queue.Empty:
+                self.smtp.close()
+                continue
+            self._process(job_id)
+
+_delivery_queue: Optional[DeliveryQueue] = None
+_delivery_queue_lock = threading.Lock()
+
+def getDeliveryQueue() -> DeliveryQueue:
+    """Get the process-wide delivery queue."""
+    global _delivery_queue
+    with _delivery_queue_lock:
+        if _delivery_queue is None:
+            _delivery_queue = DeliveryQueue()
+        return _delivery_queue
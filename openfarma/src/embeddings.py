@@ -0,0 +1,141 @@
+"""
+Embedding gateway: the query embeddings of concurrent product searches are merged into
+as few embeddings requests as possible.
+
+Every search embeds its query before looking up the vector database. With many sessions
+searching at the same time, the gateway:
+- Single-flight: a query already being embedded is not sent again; its callers wait for
+  the same result.
+- Micro-batching: distinct queries arriving within EMBEDDING_BATCH_WINDOW_MS of the
+  first one are sent together in one embeddings request (up to EMBEDDING_MAX_BATCH
+  inputs), so the number of requests grows sub-linearly with the concurrent users.
+
+Batches are sent by a pool of EMBEDDING_MAX_CONCURRENT workers, so a slow request
+doesn't hold the next batch.
+
+Key Components:
+- EmbeddingGateway: Collects the queries, sends the batches and hands out the vectors.
+- getEmbeddingGateway: Process-wide gateway of an embeddings model.
+
+Typical Usage:
+    >>> gateway = getEmbeddingGateway(database.embeddings)
+    >>> vector = gateway.embed("protector solar para niños")
+"""
+
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from .tracing import currentSpan
+from .params import EMBEDDING_BATCH_WINDOW_MS, EMBEDDING_MAX_BATCH, EMBEDDING_MAX_CONCURRENT
+
+class EmbeddingGateway:
+    """
+    Single-flight and micro-batching front of an embeddings model.
+
+    Attributes:
+        embedding: Embeddings model (langchain Embeddings: `embed_documents`).
+        window (float): Seconds a batch waits for more queries after the first one.
+        max_batch (int): Maximum inputs of a request.
+        stats (Dict[str, int]): queries, shared (joined an in-flight query), requests
+            (embeddings requests sent) and inputs (queries sent).
+    """
+
+    def __init__(self, embedding, window_ms: float = EMBEDDING_BATCH_WINDOW_MS,
+                 max_batch: int = EMBEDDING_MAX_BATCH, max_concurrent: int = EMBEDDING_MAX_CONCURRENT):
+        """
+        Args:
+            embedding: Embeddings model of the vector databases.
+            window_ms (float): Batching window; 0 sends every query on its own (still single-flight).
+            max_batch (int): Maximum inputs of a request.
+            max_concurrent (int): Requests in flight at the same time.
+        """
+        self.embedding = embedding
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.stats = {"queries": 0, "shared": 0, "requests": 0, "inputs": 0}
+        self._inflight: Dict[str, Future] = {}  # Queries pending or being embedded
+        self._pending: List[str] = []
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="embedding")
+        self._worker: Optional[threading.Thread] = None
+
+    def embed(self, text: str) -> List[float]:
+        """
+        Embedding of a query, shared with any identical query in flight and sent in a
+        batch with the queries arriving at the same time.
+
+        Args:
+            text (str): Query text.
+
+        Returns:
+            List[float]: The embedding.
+
+        Raises:
+            Exception: The error of the embeddings request.
+        """
+        with self._condition:
+            self.stats["queries"] += 1
+            future = self._inflight.get(text)
+            shared = future is not None
+            if shared:
+                self.stats["shared"] += 1
+            else:
+                future = self._inflight[text] = Future()
+                self._pending.append(text)
+                self._condition.notify()
+                self._ensureWorker()
+        currentSpan().setAttribute("shared", shared)
+        return future.result()
+
+    def _ensureWorker(self) -> None:
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+            self._worker.start()
+
+    def _run(self) -> None:
+        """Close a batch once the window of its first query ends (or it's full) and send it."""
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(timeout=remaining)
+                batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+                self.stats["requests"] += 1
+                self.stats["inputs"] += len(batch)
+            try:
+                self._executor.submit(self._send, batch)
+            except RuntimeError:  # Interpreter shutting down: send it here, its callers are waiting
+                self._send(batch)
+
+    def _send(self, batch: List[str]) -> None:
+        """Embed a batch in one request and resolve the futures of its queries."""
+        try:
+            vectors = self.embedding.embed_documents(batch)
+            error = None
+        except Exception as e:
+            vectors, error = None, e
+        with self._condition:
+            futures = [self._inflight.pop(text) for text in batch]
+        for i, future in enumerate(futures):
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(vectors[i])
+
+_gateways: Dict[int, EmbeddingGateway] = {}
+_gateways_lock = threading.Lock()
+
+def getEmbeddingGateway(embedding) -> EmbeddingGateway:
+    """Get the process-wide gateway of an embeddings model (shared by every vector database using it)."""
+    with _gateways_lock:
+        gateway = _gateways.get(id(embedding))
+        if gateway is None or gateway.embedding is not embedding:
+            gateway = _gateways[id(embedding)] = EmbeddingGateway(embedding)
+        return gateway
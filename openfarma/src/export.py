@@ -0,0 +1,451 @@
+"""
+This module renders conversation transcripts to files. It works on plain message
+snapshots (lists of dictionaries with role, content and timestamp), so the same code
+is used by Chat for on-demand exports and by the background delivery worker, which
+no longer has access to the Chat instance.
+
+Every format is written while iterating the messages once (`iterMessages`), and PDF
+pages are written to disk as soon as they are laid out, so export time and memory
+grow linearly with the conversation and only one page is held in memory.
+
+Key Components:
+- ConversationExporter: Renders a message snapshot to TXT, MD or PDF.
+- PdfStreamWriter: Minimal PDF writer (standard Helvetica fonts, one image) that
+  streams finished pages to the output file.
+- computeElapsedTime: Human-readable duration of a conversation, in Spanish.
+
+Typical Usage:
+    >>> exporter = ConversationExporter(chat.messages, HEADER_LOGO_PATH)
+    >>> exporter.export("pdf", "history/chatbot.pdf", {"Usuario": "Beiro"})
+"""
+
+import zlib
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .assets import PdfImage, getAsset
+
+def computeElapsedTime(messages: List[Dict]) -> str:
+    """
+    Compute the elapsed time between the first and the last message.
+
+    Args:
+        messages (List[Dict]): Messages with a "timestamp" datetime.
+
+    Returns:
+        str: Human-readable duration in Spanish.
+            Examples: "Menos de 1 minuto", "5 minutos", "2 horas 30 minutos"
+    """
+    if len(messages) < 2:
+        return "Menos de 1 minuto"
+
+    start_time = messages[0]["timestamp"]
+    end_time = messages[-1]["timestamp"]
+    duration = end_time - start_time
+
+    minutes = duration.total_seconds() / 60
+    if minutes < 1:
+        return "Menos de 1 minuto"
+    elif minutes < 60:
+        return f"{int(minutes)} minutos"
+    else:
+        hours = minutes / 60
+        return f"{int(hours)} horas {int(minutes % 60)} minutos"
+
+class PdfStreamWriter:
+    """
+    Minimal PDF writer that streams pages to disk.
+
+    Text uses the standard Helvetica fonts (WinAnsi encoding, no embedding), positions
+    are in millimeters from the top-left corner like FPDF. Each page is compressed and
+    written as soon as the next one starts, so only the current page is kept in memory.
+
+    Attributes:
+        output_path (str): Path of the PDF file.
+        page_width (float): Page width in mm (A4 by default).
+        page_height (float): Page height in mm.
+        margin (float): Left, right and top margin in mm.
+        bottom_margin (float): Space kept free at the bottom of each page, in mm.
+        y (float): Current vertical position in mm.
+    """
+
+    SCALE = 72 / 25.4  # points per mm
+    FONTS = {False: ("F1", "Helvetica", "helvetica"), True: ("F2", "Helvetica-Bold", "helveticaB")}
+
+    # Reserved object numbers
+    CATALOG, PAGES, FONT, FONT_BOLD, IMAGE = 1, 2, 3, 4, 5
+
+    def __init__(self, output_path: str, page_width: float = 210, page_height: float = 297,
+                 margin: float = 10, bottom_margin: float = 20):
+        self.output_path = output_path
+        self.page_width = page_width
+        self.page_height = page_height
+        self.margin = margin
+        self.bottom_margin = bottom_margin
+        self.y = margin
+        self._file = open(output_path, "wb")
+        self._offsets: Dict[int, int] = {}
+        self._next_object = self.IMAGE + 1
+        self._pages: List[int] = []
+        self._content: List[str] = []
+        self._image: Optional[PdfImage] = None
+        self._bold = False
+        self._size = 12.0
+        self._units: Dict[Tuple[bool, str], int] = {}
+
+        self._file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        for number, (_, name, _) in ((self.FONT, self.FONTS[False]), (self.FONT_BOLD, self.FONTS[True])):
+            self._writeObject(number, f"<< /Type /Font /Subtype /Type1 /BaseFont /{name} "
+                                      f"/Encoding /WinAnsiEncoding >>".encode())
+
+    def __enter__(self) -> "PdfStreamWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+
+    @property
+    def width(self) -> float:
+        """Usable width between the margins, in mm."""
+        return self.page_width - 2 * self.margin
+
+    def setFont(self, bold: bool = False, size: float = 12) -> None:
+        """Select Helvetica (or Helvetica-Bold) at the given size in points."""
+        self._bold = bold
+        self._size = size
+
+    def lineHeight(self, factor: float = 1.4) -> float:
+        """Line height for the current font size, in mm."""
+        return self._size / self.SCALE * factor
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def charWidths(cls) -> Dict[bool, List[int]]:
+        """
+        Glyph widths (1/1000 of the font size) of each WinAnsi byte, by bold flag.
+
+        Read from FPDF's font metrics on first use: importing fpdf takes a noticeable
+        part of the application startup.
+        """
+        from fpdf.fonts import fpdf_charwidths
+        return {
+            bold: [fpdf_charwidths[metrics].get(chr(byte), 0) for byte in range(256)]
+            for bold, (_, _, metrics) in cls.FONTS.items()
+        }
+
+    def textWidth(self, text: str) -> float:
+        """Width of a text in the current font, in mm."""
+        # Conversations repeat words a lot (product names, units), so widths are memoized
+        key = (self._bold, text)
+        units = self._units.get(key)
+        if units is None:
+            widths = self.charWidths()[self._bold]
+            units = self._units[key] = sum(map(widths.__getitem__, self._encode(text)))
+        return units * self._size / 1000 / self.SCALE
+
+    def image(self, image: PdfImage, x: float, y: float, w: float) -> float:
+        """
+        Draw the document image (one per document) and return its height in mm.
+
+        The current position isn't moved, as in FPDF.
+        """
+        if self._image is None:
+            self._image = image
+            self._writeObject(
+                self.IMAGE,
+                f"<< /Type /XObject /Subtype /Image /Width {image.width} /Height {image.height} "
+                f"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /FlateDecode "
+                f"/Length {len(image.data)} >>".encode(),
+                image.data
+            )
+        h = w * image.height / image.width
+        self._ensurePage()
+        self._content.append(
+            f"q {w * self.SCALE:.2f} 0 0 {h * self.SCALE:.2f} {x * self.SCALE:.2f} "
+            f"{(self.page_height - y - h) * self.SCALE:.2f} cm /I1 Do Q"
+        )
+        return h
+
+    def ln(self, h: float) -> None:
+        """Move the current position down."""
+        self.y += h
+
+    def cell(self, text: str, h: Optional[float] = None) -> None:
+        """Write one line of text and move to the next line."""
+        h = h or self.lineHeight()
+        self._breakIfNeeded(h)
+        baseline = self.y + 0.5 * h + 0.3 * self._size / self.SCALE
+        font = self.FONTS[self._bold][0]
+        self._content.append(
+            f"BT /{font} {self._size:.2f} Tf {self.margin * self.SCALE:.2f} "
+            f"{(self.page_height - baseline) * self.SCALE:.2f} Td ({self._escape(text)}) Tj ET"
+        )
+        self.y += h
+
+    def paragraph(self, text: str, h: Optional[float] = None) -> None:
+        """Write a text wrapped to the usable width, breaking pages as needed."""
+        h = h or self.lineHeight()
+        for line in self._wrap(text):
+            self.cell(line, h)
+
+    def line(self) -> None:
+        """Draw a horizontal separator at the current position."""
+        self._ensurePage()
+        y = (self.page_height - self.y) * self.SCALE
+        self._content.append(
+            f"0.57 w {self.margin * self.SCALE:.2f} {y:.2f} m "
+            f"{(self.page_width - self.margin) * self.SCALE:.2f} {y:.2f} l S"
+        )
+
+    def close(self) -> str:
+        """Write the last page, the page tree and the cross-reference table."""
+        self._ensurePage()
+        self._flushPage()
+        kids = " ".join(f"{number} 0 R" for number in self._pages)
+        self._writeObject(self.PAGES, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._pages)} >>".encode())
+        self._writeObject(self.CATALOG, f"<< /Type /Catalog /Pages {self.PAGES} 0 R >>".encode())
+
+        xref = self._file.tell()
+        count = self._next_object
+        self._file.write(f"xref\n0 {count}\n0000000000 65535 f \n".encode())
+        for number in range(1, count):
+            # The image slot stays free when the document has no image
+            if number in self._offsets:
+                self._file.write(f"{self._offsets[number]:010d} 00000 n \n".encode())
+            else:
+                self._file.write(b"0000000000 65535 f \n")
+        self._file.write(f"trailer\n<< /Size {count} /Root {self.CATALOG} 0 R >>\n"
+                         f"startxref\n{xref}\n%%EOF\n".encode())
+        self._file.close()
+        return self.output_path
+
+    def _encode(self, text: str) -> bytes:
+        return text.encode("cp1252", errors="replace")
+
+    def _escape(self, text: str) -> str:
+        raw = self._encode(text).replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+        return raw.replace(b"\r", b"").decode("latin-1")
+
+    def _wrap(self, text: str) -> Iterator[str]:
+        """Split a text in lines that fit the usable width."""
+        space = self.textWidth(" ")
+        width = self.width
+        for paragraph in text.split("\n"):
+            line, line_width = "", 0.0
+            for word in paragraph.split(" "):
+                word_width = self.textWidth(word)
+                # Words longer than a line are split by characters
+                while word_width > width:
+                    if line:
+                        yield line
+                        line, line_width = "", 0.0
+                    cut, used = 0, 0.0
+                    for char in word:
+                        char_width = self.textWidth(char)
+                        if cut and used + char_width > width:
+                            break
+                        used += char_width
+                        cut += 1
+                    yield word[:cut]
+                    word = word[cut:]
+                    word_width = self.textWidth(word)
+                if line and line_width + space + word_width > width:
+                    yield line
+                    line, line_width = word, word_width
+                elif line:
+                    line += " " + word
+                    line_width += space + word_width
+                else:
+                    line, line_width = word, word_width
+            yield line
+
+    def _breakIfNeeded(self, h: float) -> None:
+        if self._content and self.y + h > self.page_height - self.bottom_margin:
+            self._flushPage()
+            self.y = self.margin
+        self._ensurePage()
+
+    def _ensurePage(self) -> None:
+        if not self._content:
+            self._content.append("")  # Page started
+
+    def _flushPage(self) -> None:
+        """Write the current page and release its content."""
+        stream = zlib.compress("\n".join(self._content).encode("latin-1"))
+        content_number = self._reserveObject()
+        self._writeObject(content_number, f"<< /Length {len(stream)} /Filter /FlateDecode >>".encode(), stream)
+
+        resources = f"/Font << /F1 {self.FONT} 0 R /F2 {self.FONT_BOLD} 0 R >>"
+        if self._image is not None:
+            resources += f" /XObject << /I1 {self.IMAGE} 0 R >>"
+        page_number = self._reserveObject()
+        self._writeObject(page_number, (
+            f"<< /Type /Page /Parent {self.PAGES} 0 R "
+            f"/MediaBox [0 0 {self.page_width * self.SCALE:.2f} {self.page_height * self.SCALE:.2f}] "
+            f"/Resources << {resources} >> /Contents {content_number} 0 R >>"
+        ).encode())
+        self._pages.append(page_number)
+        self._content = []
+
+    def _reserveObject(self) -> int:
+        number = self._next_object
+        self._next_object += 1
+        return number
+
+    def _writeObject(self, number: int, dictionary: bytes, stream: Optional[bytes] = None) -> None:
+        self._offsets[number] = self._file.tell()
+        self._file.write(f"{number} 0 obj\n".encode() + dictionary)
+        if stream is not None:
+            self._file.write(b"\nstream\n" + stream + b"\nendstream")
+        self._file.write(b"\nendobj\n")
+
+class ConversationExporter:
+    """
+    Renders a conversation snapshot to TXT, MD or PDF files.
+
+    Attributes:
+        messages (List[Dict]): Messages with "role", "content" and "timestamp" (datetime).
+        header_logo_path (str): Path of the logo embedded in MD and PDF exports.
+    """
+
+    FORMATS = ("txt", "md", "pdf")
+
+    def __init__(self, messages: List[Dict], header_logo_path: str):
+        """
+        Initialize the exporter.
+
+        Args:
+            messages (List[Dict]): Conversation messages. The list is copied, so the
+                export isn't affected by messages added afterwards.
+            header_logo_path (str): Path of the header logo.
+        """
+        self.messages = list(messages)
+        self.header_logo_path = header_logo_path
+
+    def export(self, format: str, output_path: str, metadata: Optional[dict] = None) -> str:
+        """
+        Export the conversation in the given format.
+
+        Args:
+            format (str): "txt", "md" or "pdf".
+            output_path (str): Path of the exported file.
+            metadata (Optional[dict]): Information written before the messages.
+
+        Returns:
+            str: Path of the exported file.
+
+        Raises:
+            ValueError: If the format is not supported.
+        """
+        metadata = metadata or {}
+        if format.lower() == "txt":
+            return self.toTxt(output_path, metadata)
+        elif format.lower() == "md":
+            return self.toMd(output_path, metadata)
+        elif format.lower() == "pdf":
+            return self.toPdf(output_path, metadata)
+        else:
+            raise ValueError("Format must be 'txt', 'md', or 'pdf'")
+
+    def iterMessages(self) -> Iterator[Tuple[bool, str, str]]:
+        """
+        Iterate the messages in export order.
+
+        Yields:
+            Tuple[bool, str, str]: Whether the user wrote it, "%H:%M:%S" timestamp and content.
+        """
+        for msg in self.messages:
+            yield msg["role"] == "user", msg["timestamp"].strftime("%H:%M:%S"), msg["content"]
+
+    def toTxt(self, output_path: str, metadata: dict) -> str:
+        """Export conversation to a formatted plain text file"""
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(f"Chat Export - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+            f.write("=" * 50 + "\n\n")
+
+            # Add metadata
+            f.write("INFORMACIÓN\n")
+            f.write("-" * 50 + "\n")
+            for key, value in metadata.items():
+                if value:  # Only write if value is not empty
+                    f.write(f"{key}: {value}\n")
+            f.write("-" * 50 + "\n\n")
+
+            for is_user, timestamp, content in self.iterMessages():
+                role = "Usuario" if is_user else "Asistente"
+                f.write(f"[{role} - {timestamp}]\n")
+                f.write(f"{content}\n")
+                f.write("-" * 50 + "\n\n")
+
+        return output_path
+
+    def toMd(self, output_path: str, metadata: dict) -> str:
+        """Export conversation to a markdown file with header logo"""
+        with open(output_path, 'w', encoding='utf-8') as f:
+            # Add header logo as base64 image (encoded once per process)
+            f.write(f'<img src="{getAsset(self.header_logo_path).data_uri}" width="150px" align="left"/>\n\n')
+
+            f.write(f"# ChatBot - Conversación - {datetime.now().strftime('%Y-%m-%d')}\n\n")
+
+            # Add metadata
+            f.write("## Información\n\n")
+            for key, value in metadata.items():
+                if value:  # Only write if value is not empty
+                    f.write(f"- **{key}:** {value}\n")
+            f.write("\n---\n\n")
+
+            for is_user, timestamp, content in self.iterMessages():
+                role = "👤 Usuario" if is_user else "🤖 Asistente"
+                f.write(f"### {role} ({timestamp})\n\n")
+                f.write(f"{content}\n\n")
+                f.write("---\n\n")
+
+        return output_path
+
+    def toPdf(self, output_path: str, metadata: dict) -> str:
+        """Export conversation to a PDF file with header logo, streaming pages to disk"""
+        with PdfStreamWriter(output_path) as pdf:
+            # Add header logo (decoded once per process)
+            pdf.image(getAsset(self.header_logo_path).pdf_image, x=10, y=10, w=40)  # Adjust w=40 to change logo size
+            pdf.ln(30)  # Space after logo
+
+            # Add title
+            pdf.setFont(bold=True, size=16)
+            pdf.cell(f"ChatBot - Conversación - {datetime.now().strftime('%Y-%m-%d')}", h=10)
+            pdf.ln(10)
+
+            # Add metadata
+            pdf.setFont(bold=True, size=14)
+            pdf.cell("Información:", h=10)
+            pdf.setFont(size=12)
+            for key, value in metadata.items():
+                if value:  # Only write if value is not empty
+                    pdf.cell(f"{key}: {value}", h=10)
+            pdf.ln(10)
+
+            # Add messages
+            for is_user, timestamp, content in self.iterMessages():
+                role = "Usuario" if is_user else "Asistente"
+
+                # Role header with timestamp
+                pdf.setFont(bold=True, size=12)
+                pdf.cell(f"{role} - {timestamp}:", h=10)
+
+                # Message content, line height follows the font size
+                pdf.setFont(size=12)
+                pdf.paragraph(content)
+                pdf.ln(5)
+
+                # Separator line
+                pdf.line()
+                pdf.ln(10)
+
+        return output_path
+
+    def elapsedTime(self) -> str:
+        """Human-readable duration of the conversation."""
+        return computeElapsedTime(self.messages)
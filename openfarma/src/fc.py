@@ -1,28 +1,57 @@
+import threading
 import streamlit as st
-import pandas as pd
-from langchain_community.vectorstores import Chroma
-from langchain_openai import OpenAIEmbeddings
 from .params import *
-
+from .snapshot import loadSnapshot
+from .composer import ProductEntry, parseProduct, composeProductContext
+from .tracing import span
+from .embeddings import getEmbeddingGateway
+from .prefetch import currentPrefetch
+from .catalog import getCatalogStats
+
+# The vector databases (langchain, Chroma, OpenAI embeddings) and pandas are heavy to
+# import and open, so they are loaded on first use instead of when the module is imported
 api_key = st.secrets["OPENFARMA_API_KEY"]
-embedding = OpenAIEmbeddings(api_key=api_key)
-
-# Loading the vectordatabase
-DB_ALL_PATH = os.path.join(CHROMA_DB_PATH, "db_all")
-DB_BENEFICIOS_PATH = os.path.join(CHROMA_DB_PATH, "db_Beneficios")
-DB_CATEGORIA_PATH = os.path.join(CHROMA_DB_PATH, "db_Categoria")
-DB_GENERALES_PATH = os.path.join(CHROMA_DB_PATH, "db_General")
-DB_INDICACIONES_PATH = os.path.join(CHROMA_DB_PATH, "db_Indicaciones")
-DB_USO_PATH = os.path.join(CHROMA_DB_PATH, "db_Modo de uso")
-DB_PROPIEDADES_PATH = os.path.join(CHROMA_DB_PATH, "db_Propiedades")
-
-db_all = Chroma(persist_directory=DB_ALL_PATH, embedding_function=embedding)
-db_beneficios = Chroma(persist_directory=DB_BENEFICIOS_PATH, embedding_function=embedding)
-db_categoria = Chroma(persist_directory=DB_CATEGORIA_PATH, embedding_function=embedding)
-db_general = Chroma(persist_directory=DB_GENERALES_PATH, embedding_function=embedding)
-db_indicaciones = Chroma(persist_directory=DB_INDICACIONES_PATH, embedding_function=embedding)
-db_uso = Chroma(persist_directory=DB_USO_PATH, embedding_function=embedding)
-db_propiedades = Chroma(persist_directory=DB_PROPIEDADES_PATH, embedding_function=embedding)
+
+# Vector database paths
+DB_PATHS = {
+    "db_all": os.path.join(CHROMA_DB_PATH, "db_all"),
+    "db_beneficios": os.path.join(CHROMA_DB_PATH, "db_Beneficios"),
+    "db_categoria": os.path.join(CHROMA_DB_PATH, "db_Categoria"),
+    "db_general": os.path.join(CHROMA_DB_PATH, "db_General"),
+    "db_indicaciones": os.path.join(CHROMA_DB_PATH, "db_Indicaciones"),
+    "db_uso": os.path.join(CHROMA_DB_PATH, "db_Modo de uso"),
+    "db_propiedades": os.path.join(CHROMA_DB_PATH, "db_Propiedades"),
+}
+
+_databases = {}
+_databases_lock = threading.Lock()
+_embedding = None
+
+def getDatabase(name: str):
+    """
+    Get a vector database, opening it on first use.
+
+    Args:
+        name (str): Database name (a key of DB_PATHS), e.g. "db_general".
+
+    Returns:
+        Chroma: The vector database, shared by the whole process.
+    """
+    global _embedding
+    database = _databases.get(name)
+    if database is not None:
+        return database
+
+    with _databases_lock:
+        if name not in _databases:
+            from langchain_community.vectorstores import Chroma
+            from langchain_openai import OpenAIEmbeddings
+            from .ratelimit import getHttpClient
+
+            if _embedding is None:
+                _embedding = OpenAIEmbeddings(api_key=api_key, http_client=getHttpClient())
+            _databases[name] = Chroma(persist_directory=DB_PATHS[name], embedding_function=_embedding)
+        return _databases[name]
         
 
 def getData(file_path: str, ids_to_check: list, null_stock: bool = False) -> dict:
@@ -40,6 +69,8 @@ def getData(file_path: str, ids_to_check: list, null_stock: bool = False) -> dic
     Returns:
         dict: Dictionary with the ids as keys and the data as values.
     """
+    import pandas as pd
+
     try:
         df = pd.read_csv(file_path)
         df.iloc[:, 1] = df.iloc[:, 1].astype(str)
@@ -55,7 +86,7 @@ def getData(file_path: str, ids_to_check: list, null_stock: bool = False) -> dic
     except Exception as e:
         raise Exception(f"Error getting data: {e}")
 
-def retrieveVectorDB(database: Chroma, context: str, k: int=10) -> list:
+def retrieveVectorDB(database, context: str, k: int=10) -> list:
     """
     Retrieve the ids and their associated text content from the vector database based on similarity to the input context.
 
@@ -69,10 +100,19 @@ def retrieveVectorDB(database: Chroma, context: str, k: int=10) -> list:
 
     Raises:
         Exception: If there's an error retrieving from the vector database
+
+    Note:
+        The query is embedded and searched in two steps (same result as
+        similarity_search_with_score), so each one is traced on its own. The embedding
+        goes through the embedding gateway, which merges the queries of concurrent
+        searches into shared requests.
     """
     retrieve_dict = {}
     try:
-        retrived_from_vdb = database.similarity_search_with_score(context, k=k)
+        with span("vector.embedding", chars=len(context)):
+            query_embedding = getEmbeddingGateway(database.embeddings).embed(context)
+        with span("vector.query", k=k):
+            retrived_from_vdb = database.similarity_search_by_vector_with_relevance_scores(query_embedding, k=k)
         N = len(retrived_from_vdb)
         for i in range(N):
             id = str(retrived_from_vdb[i][0].metadata['EAN']).strip()
@@ -82,12 +122,60 @@ def retrieveVectorDB(database: Chroma, context: str, k: int=10) -> list:
     except Exception as e:
         raise Exception(f"Error retrieving vector database: {e}")
     
+def embedQuery(text: str) -> list:
+    """Embedding of a text with the model of the vector databases, through the embedding gateway."""
+    return getEmbeddingGateway(getDatabase("db_general").embeddings).embed(text)
+
+def searchProducts(name: str, query: str, k: int = K_VALUE_SEARCH) -> dict:
+    """
+    Search a vector database for a tool query, reusing the candidates prefetched for
+    the prompt when the query matches it (see prefetch.py).
+
+    Args:
+        name (str): Database name (a key of DB_PATHS).
+        query (str): Query of the tool call.
+        k (int, optional): Maximum number of results.
+
+    Returns:
+        dict: Dictionary mapping EAN IDs to their text content (as retrieveVectorDB).
+    """
+    prefetch = currentPrefetch()
+    with span("vector.search", database=name) as search:
+        product_data = prefetch.lookup(name, query, k) if prefetch is not None else None
+        search.setAttribute("prefetched", product_data is not None)
+        if product_data is None:
+            product_data = retrieveVectorDB(getDatabase(name), query, k=k)
+        return product_data
+
 def retrieveImages(ids: list, file_path: str) -> dict:
     """
     Retrieve the images for the ids in the list.
+
+    Reads the memory-mapped snapshot of the file when it's available and up to date,
+    otherwise parses the csv file.
     """
     images_by_id = {}
     ids = [str(id).strip() for id in ids]
+
+    snapshot = loadSnapshot(file_path)
+    if snapshot is not None and snapshot.hasIndex('SKU') and snapshot.hasIndex('EAN'):
+        for id in ids:
+            match_sku = snapshot.lookup('SKU', id)
+            match_ean = snapshot.lookup('EAN', id)
+
+            # Skip if multiple matches in either SKU or EAN
+            if len(match_sku) > 1 or len(match_ean) > 1:
+                continue
+
+            # Skip if matches in both SKU and EAN but from different rows
+            if match_sku and match_ean and match_sku != match_ean:
+                continue
+            rows = match_sku or match_ean
+            if rows:
+                images_by_id[id] = snapshot.value(rows[0], 'IMAGEN')
+        return images_by_id
+
+    import pandas as pd
     df_images = pd.read_csv(file_path, sep=',', encoding='utf-8')
     df_images = df_images.astype(str).apply(lambda x: x.str.strip())
     
@@ -115,9 +203,29 @@ def retrieveImages(ids: list, file_path: str) -> dict:
 def retrieveSaleData(ids: list, file_path: str, null_stock: bool = False) -> dict:
     """
     Retrieve the sale data for the ids in the list.
+
+    Reads the memory-mapped snapshot of the file when it's available and up to date,
+    otherwise parses the csv file.
     """
     sale_data = {}
     ids = [str(id).strip() for id in ids]
+
+    snapshot = loadSnapshot(file_path)
+    if snapshot is not None and snapshot.hasIndex('ean'):
+        for id in ids:
+            rows = snapshot.lookup('ean', id)
+            if len(rows) != 1:
+                continue
+            stock = snapshot.value(rows[0], 'stock')
+            if null_stock or stock != '0':
+                sale_data[id] = [
+                    stock,
+                    snapshot.value(rows[0], 'precio'),
+                    snapshot.value(rows[0], 'promo')
+                ]
+        return sale_data
+
+    import pandas as pd
     df_sale = pd.read_csv(file_path, sep=',', encoding='utf-8')
     df_sale = df_sale.astype(str).apply(lambda x: x.str.strip())
 
@@ -146,9 +254,12 @@ def retrieveSaleData(ids: list, file_path: str, null_stock: bool = False) -> dic
 def buildProductContext(ids: list, product_data: dict, null_stock: bool = False, 
                         force_sale: bool = False, include_images: bool = True, 
                         default_message: str = "No se encontraron productos que cumplan \
-                            con los criterios de búsqueda.") -> str:
+                            con los criterios de búsqueda.", tool: str = None) -> str:
     """
     Build context string for products based on provided data and filters.
+
+    The context keeps only the fields relevant to the invoking function and is fitted
+    into TOOL_OUTPUT_TOKEN_BUDGET tokens (see composer.composeProductContext).
     
     Args:
         ids (list): List of product IDs
@@ -156,12 +267,16 @@ def buildProductContext(ids: list, product_data: dict, null_stock: bool = False,
         null_stock (bool): Whether to include products with 0 stock
         force_sale (bool): Whether to only include products on sale
         include_images (bool): Whether to include product images
+        tool (str): Name of the invoking function, selects the fields kept
         
     Returns:
         str: Formatted context string with product details
     """
-    sale_data = retrieveSaleData(ids, STOCK_PATH, null_stock=null_stock)
-    url_data = retrieveImages(ids, IMAGES_PATH) if include_images else {}
+    with span("fc.sale_data", ids=len(ids)) as sale_span:
+        sale_data = retrieveSaleData(ids, STOCK_PATH, null_stock=null_stock)
+        sale_span.setAttribute("found", len(sale_data))
+    with span("fc.images", ids=len(ids)):
+        url_data = retrieveImages(ids, IMAGES_PATH) if include_images else {}
     
     if len(sale_data) > 0:
         productos = []
@@ -171,29 +286,16 @@ def buildProductContext(ids: list, product_data: dict, null_stock: bool = False,
             # Skip if force_sale is True and product not on sale
             if force_sale and sale.lower() == 'no promo':
                 continue
-                
-            product = product_data[id]
-            description = f"{product}\n"
-            description += f"Stock: {stock}. Precio: ${price}. Promoción: {sale}\n"
-            
-            if include_images:
-                url = url_data.get(id, "")
-                if url:
-                    if url.startswith("http"):
-                        description += f"URL: {url}\n"
-                    else:
-                        description += f"URL: https://{url}\n"
-            
-            productos.append(description)
+
+            url = url_data.get(id, "") if include_images else ""
+            productos.append(ProductEntry(parseProduct(product_data[id]), stock, price, sale, url))
 
             if len(productos) >= K_VALUE_THOLD:
                 break
 
         if productos:
-            context = """Los productos encontrados son:\n\n"""
-            for p in productos:
-                context += f"{p}\n"
-            return context
+            with span("fc.compose", products=len(productos)):
+                return composeProductContext(productos, tool=tool)
             
         return default_message
     
@@ -207,7 +309,7 @@ def buildProductContext(ids: list, product_data: dict, null_stock: bool = False,
 
 def buscar_productos(**kwargs):
     problem = kwargs['problem']
-    product_data = retrieveVectorDB(db_general, problem, k=K_VALUE_SEARCH)
+    product_data = searchProducts("db_general", problem, k=K_VALUE_SEARCH)
     ids = list(product_data.keys())
     default_message = f"No se encontraron productos que cumplan con la consulta sobre: {problem}."
     
@@ -217,12 +319,13 @@ def buscar_productos(**kwargs):
         null_stock=False,
         force_sale=False,
         include_images=True,
-        default_message=default_message
+        default_message=default_message,
+        tool="buscar_productos"
     )
     
 def buscar_productos_por_presentacion(**kwargs):
     presentation = kwargs['presentacion']
-    product_data = retrieveVectorDB(db_general, presentation, k=K_VALUE_SEARCH)
+    product_data = searchProducts("db_general", presentation, k=K_VALUE_SEARCH)
     ids = list(product_data.keys())
     default_message = f"No se encontraron productos con la presentación: {presentation}."
 
@@ -232,12 +335,13 @@ def buscar_productos_por_presentacion(**kwargs):
         null_stock=False,
         force_sale=False,
         include_images=True,
-        default_message=default_message
+        default_message=default_message,
+        tool="buscar_productos_por_presentacion"
     )
 
 def buscar_productos_por_beneficios(**kwargs):
     benefits = kwargs['beneficio']
-    product_data = retrieveVectorDB(db_beneficios, benefits, k=K_VALUE_SEARCH)
+    product_data = searchProducts("db_beneficios", benefits, k=K_VALUE_SEARCH)
     ids = list(product_data.keys())
     default_message = f"No se encontraron productos con los beneficios: {benefits}."
 
@@ -247,12 +351,13 @@ def buscar_productos_por_beneficios(**kwargs):
         null_stock=False,
         force_sale=False,
         include_images=True,
-        default_message=default_message
+        default_message=default_message,
+        tool="buscar_productos_por_beneficios"
     )
 
 def buscar_productos_por_categoria(**kwargs):
     category = kwargs['categoria']
-    product_data = retrieveVectorDB(db_categoria, category, k=K_VALUE_SEARCH)
+    product_data = searchProducts("db_categoria", category, k=K_VALUE_SEARCH)
     ids = list(product_data.keys())
     default_message = f"No se encontraron productos en la categoría: {category}."
     
@@ -262,12 +367,13 @@ def buscar_productos_por_categoria(**kwargs):
         null_stock=False,
         force_sale=False,
         include_images=True,
-        default_message=default_message
+        default_message=default_message,
+        tool="buscar_productos_por_categoria"
     )
     
 def buscar_productos_por_indicaciones(**kwargs):
     indications = kwargs['indicacion']
-    product_data = retrieveVectorDB(db_indicaciones, indications, k=K_VALUE_SEARCH)
+    product_data = searchProducts("db_indicaciones", indications, k=K_VALUE_SEARCH)
     ids = list(product_data.keys())
     default_message = f"No se encontraron productos con las indicaciones: {indications}."
     
@@ -277,12 +383,13 @@ def buscar_productos_por_indicaciones(**kwargs):
         null_stock=False,
         force_sale=False,
         include_images=True,
-        default_message=default_message
+        default_message=default_message,
+        tool="buscar_productos_por_indicaciones"
     )
     
 def buscar_productos_por_modo_uso(**kwargs):
     mode_of_use = kwargs['uso']
-    product_data = retrieveVectorDB(db_uso, mode_of_use, k=K_VALUE_SEARCH)
+    product_data = searchProducts("db_uso", mode_of_use, k=K_VALUE_SEARCH)
     ids = list(product_data.keys())
     default_message = f"No se encontraron productos con el modo de uso: {mode_of_use}."
     
@@ -292,12 +399,13 @@ def buscar_productos_por_modo_uso(**kwargs):
         null_stock=False,
         force_sale=False,
         include_images=True,
-        default_message=default_message
+        default_message=default_message,
+        tool="buscar_productos_por_modo_uso"
     )
 
 def buscar_productos_por_propiedades(**kwargs):
     properties = kwargs['propiedad']
-    product_data = retrieveVectorDB(db_propiedades, properties, k=K_VALUE_SEARCH)
+    product_data = searchProducts("db_propiedades", properties, k=K_VALUE_SEARCH)
     ids = list(product_data.keys())
     default_message = f"No se encontraron productos con las propiedades: {properties}."
 
@@ -307,12 +415,13 @@ def buscar_productos_por_propiedades(**kwargs):
         null_stock=False,
         force_sale=False,
         include_images=True,
-        default_message=default_message
+        default_message=default_message,
+        tool="buscar_productos_por_propiedades"
     )
     
 def buscar_productos_por_problema_y_promocion(**kwargs):
     problem = kwargs['problematica']
-    product_data = retrieveVectorDB(db_all, problem, k=K_VALUE_SEARCH)
+    product_data = searchProducts("db_all", problem, k=K_VALUE_SEARCH)
     ids = list(product_data.keys())
     default_message = f"No se encontraron productos en promoción para la consulta sobre: {problem}."
     
@@ -322,12 +431,13 @@ def buscar_productos_por_problema_y_promocion(**kwargs):
         null_stock=False,
         force_sale=True,
         include_images=True,
-        default_message=default_message
+        default_message=default_message,
+        tool="buscar_productos_por_problema_y_promocion"
     )
 
 def buscar_productos_por_presentacion_y_tamano(**kwargs):
     presentation = f"{kwargs['presentacion']} {kwargs['valor']}{kwargs['unidad']}"
-    product_data = retrieveVectorDB(db_general, presentation, k=K_VALUE_SEARCH)
+    product_data = searchProducts("db_general", presentation, k=K_VALUE_SEARCH)
     ids = list(product_data.keys())
     default_message = f"No se encontraron productos con la presentación: {presentation}."
     
@@ -337,42 +447,27 @@ def buscar_productos_por_presentacion_y_tamano(**kwargs):
         null_stock=False,
         force_sale=False,
         include_images=True,
-        default_message=default_message
+        default_message=default_message,
+        tool="buscar_productos_por_presentacion_y_tamano"
     )
 
+# The statistics functions answer from the precomputed catalog aggregates (catalog.py)
+
 def contar_marcas():
-    df = pd.read_csv(ABM_PATH, usecols=['Marca'])
-    brands = df['Marca'].str.lower().tolist()
-    brands = set(brands)
-    return f"Hay {len(brands)} marcas en total."
+    return f"Hay {getCatalogStats().brand_count} marcas en total."
 
 def contar_productos_con_stock():
-    try:
-        df = pd.read_csv(STOCK_PATH)
-        num_products = df.iloc[:, 2].apply(lambda x: x > 0).sum()
-    except Exception as e:
-        raise Exception(f"Error counting products with stock: {e}")
-    return f"Hay {num_products} productos en stock."
+    return f"Hay {getCatalogStats().products_with_stock} productos en stock."
 
 def contar_productos_en_promocion():
-    try:
-        df = pd.read_csv(STOCK_PATH)
-        df.iloc[:, 4] = df.iloc[:, 4].apply(lambda x: x.lower())
-        num_products = df.iloc[:, 4].apply(lambda x: x != 'no promo').sum()
-        return f"Hay {num_products} productos en promoción."
-    except Exception as e:
-        raise Exception(f"Error counting products in promotion: {e}")
+    return f"Hay {getCatalogStats().products_on_promo} productos en promoción."
 
 def listar_marcas():
-    df = pd.read_csv(ABM_PATH, usecols=['Marca'])
-    brands = df['Marca'].str.lower().tolist()
-    brands = set(brands)
-    brands = [brand.capitalize() for brand in brands]
-    return f"Las marcas son: {', '.join(brands)}."
+    return f"Las marcas son: {', '.join(getCatalogStats().brand_names)}."
 
 def listar_productos_en_categorias(**kwargs):
     category = kwargs['categoria']
-    retrived_from_vdb = retrieveVectorDB(db_categoria, category, k=K_VALUE_SEARCH)
+    retrived_from_vdb = retrieveVectorDB(getDatabase("db_categoria"), category, k=K_VALUE_SEARCH)
     ids = list(retrived_from_vdb.keys())
     stock_data = getData(STOCK_PATH, ids, null_stock=True)
 
@@ -392,12 +487,12 @@ def listar_productos_en_categorias(**kwargs):
     return f"Contexto: {context}"
 
 def verificar_marca(**kwargs):
+    # Normalized and misspelled names resolve to the catalog brand ("la roche-posay", "euserin")
     brand_to_check = kwargs['marca'].lower()
-    df = pd.read_csv(ABM_PATH, usecols=['Marca'])
-    brands = df['Marca'].str.lower().tolist()
-    brands = set(brands)
-    result = brand_to_check in brands
-    return f"La marca {brand_to_check.capitalize()} {'sí' if result else 'no'} está en la base de datos."
+    match = getCatalogStats().brand_index.lookup(brand_to_check)
+    if match is None:
+        return f"La marca {brand_to_check.capitalize()} no está en la base de datos."
+    return f"La marca {match.name} sí está en la base de datos ({match.products} productos)."
 
 handlers = {
     "buscar_productos": buscar_productos,
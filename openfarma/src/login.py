@@ -1,16 +1,10 @@
 # ------------------ Imports ------------------
 
 from __future__ import annotations
-import io
-import base64
-import smtplib
 import pandas as pd
 import streamlit as st
-from PIL import Image
 from typing import Optional, Tuple, List
 from hashlib import sha256
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from openfarma.src.params import (
     LOGIN_PATH, 
     STORES_PATH, 
@@ -18,6 +12,7 @@ from openfarma.src.params import (
     EMAIL_FROM,
     EMAIL_PASSWORD
 )
+from openfarma.src.assets import dataUri
 
 # ------------------ Login No password Class ------------------
 
@@ -27,12 +22,10 @@ class LoginNoPassword:
     Only username selection is needed for authentication.
 
     Attributes:
-        HEADER_IMAGE (str): Base64 encoded header image
         USERS_DF (pd.DataFrame): DataFrame containing user information
         STORES_DF (pd.DataFrame): DataFrame containing store information
     """
     
-    HEADER_IMAGE: Optional[str] = None
     USERS_DF: Optional[pd.DataFrame] = None
     STORES_DF: Optional[pd.DataFrame] = None
     
@@ -41,26 +34,6 @@ class LoginNoPassword:
         self._loadStaticData()
         self._initializeSessionState()
 
-    @staticmethod
-    def _encodeImage(image_path: str) -> str:
-        """
-        Encode image to base64.
-        
-        Args:
-            image_path: Path to the image file
-            
-        Returns:
-            Base64 encoded image string
-        """
-        try:
-            with Image.open(image_path) as image:
-                buffered = io.BytesIO()
-                image.save(buffered, format="PNG")
-                return base64.b64encode(buffered.getvalue()).decode()
-        except Exception as e:
-            st.error(f"Error encoding image: {str(e)}")
-            raise
-
     def _getUserData(self, username: str) -> Tuple[Optional[str], Optional[str]]:
         """
         Get user information from database.
@@ -122,8 +95,6 @@ class LoginNoPassword:
     def _loadStaticData(cls) -> None:
         """Load static data that will be shared across all instances."""
         try:
-            if cls.HEADER_IMAGE is None:
-                cls.HEADER_IMAGE = cls._encodeImage(HEADER_LOGO_PATH)
             if cls.USERS_DF is None:
                 cls.USERS_DF = pd.read_csv(LOGIN_PATH)
             if cls.STORES_DF is None:
@@ -150,7 +121,7 @@ class LoginNoPassword:
         """Render page header with logo."""
         st.markdown(
             f"""
-            <img src="data:image/png;base64,{self.HEADER_IMAGE}" 
+            <img src="{dataUri(HEADER_LOGO_PATH)}" 
                  style="width: 350px; display: block; margin: 0 auto;">
             <br><br>
             """, 
@@ -260,12 +231,10 @@ class Login:
     password recovery and UI rendering.
     
     Attributes:
-        HEADER_IMAGE (str): Base64 encoded header image
         USERS_DF (pd.DataFrame): DataFrame containing user credentials
         STORES_DF (pd.DataFrame): DataFrame containing store information
     """
     
-    HEADER_IMAGE: Optional[str] = None
     USERS_DF: Optional[pd.DataFrame] = None
     STORES_DF: Optional[pd.DataFrame] = None
     
@@ -274,26 +243,6 @@ class Login:
         self._loadStaticData()
         self._initializeSessionState()
 
-    @staticmethod
-    def _encodeImage(image_path: str) -> str:
-        """
-        Encode image to base64.
-        
-        Args:
-            image_path: Path to the image file
-            
-        Returns:
-            Base64 encoded image string
-        """
-        try:
-            with Image.open(image_path) as image:
-                buffered = io.BytesIO()
-                image.save(buffered, format="PNG")
-                return base64.b64encode(buffered.getvalue()).decode()
-        except Exception as e:
-            st.error(f"Error encoding image: {str(e)}")
-            raise
-
     def _getUserData(self, username: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
         """
         Get user credentials and email from database.
@@ -357,8 +306,6 @@ class Login:
     def _loadStaticData(cls) -> None:
         """Load static data that will be shared across all instances."""
         try:
-            if cls.HEADER_IMAGE is None:
-                cls.HEADER_IMAGE = cls._encodeImage(HEADER_LOGO_PATH)
             if cls.USERS_DF is None:
                 cls.USERS_DF = pd.read_csv(LOGIN_PATH)
             if cls.STORES_DF is None:
@@ -385,7 +332,7 @@ class Login:
         """Render page header with logo."""
         st.markdown(
             f"""
-            <img src="data:image/png;base64,{self.HEADER_IMAGE}" 
+            <img src="{dataUri(HEADER_LOGO_PATH)}" 
                  style="width: 350px; display: block; margin: 0 auto;">
             <br><br>
             """, 
@@ -497,6 +444,11 @@ class Login:
         Returns:
             Boolean indicating if email was sent successfully
         """
+        # Imported here: the login page only needs them to recover a password
+        import smtplib
+        from email.mime.text import MIMEText
+        from email.mime.multipart import MIMEMultipart
+
         try:
             email = EMAIL_FROM
             message = MIMEMultipart()
@@ -11,6 +11,7 @@ IMAGES_PATH             = os.path.join(ROOT, "openfarma/database/imagenes.csv")
 ABM_PATH                = os.path.join(ROOT, "openfarma/database/abm.csv")              # abm database path
 STORES_PATH             = os.path.join(ROOT, "openfarma/database/sucursales.csv")       # stores database path
 STOCK_PATH              = os.path.join(ROOT, "openfarma/database/stock.csv")            # stock database path
+PRODUCTS_PATH           = os.path.join(ROOT, "openfarma/database/openfarma.csv")        # products database path
 
 STOCK_BOT_10_PATH       = os.path.join(ROOT, "openfarma/database/stock/bot_10.csv")     # stock from id=10 store
 STOCK_BOT_11_PATH       = os.path.join(ROOT, "openfarma/database/stock/bot_11.csv")     # stock from id=11 store
@@ -34,6 +35,7 @@ STOCK_BOT_71_PATH       = os.path.join(ROOT, "openfarma/database/stock/bot_71.cs
 ## folders
 CHROMA_DB_PATH          = os.path.join(ROOT, "openfarma/database/chroma")   # Chroma database path
 HISTORY_PATH            = os.path.join(ROOT, "openfarma/history")           # History folder path
+SNAPSHOT_DB_PATH        = os.path.join(ROOT, "openfarma/database/snapshot") # Memory-mapped snapshots of the csv files
 
 ## json
 ASSISTANT_CONFIG_PATH   = os.path.join(ROOT, "openfarma/config/assistant.json")
@@ -53,6 +55,7 @@ PUSH_ABM_PATH            = os.path.join(ROOT, "openfarma/run/push-abm.py")
 PUSH_IMAGES_PATH         = os.path.join(ROOT, "openfarma/run/push-images.py")
 PUSH_STOCK_PATH          = os.path.join(ROOT, "openfarma/run/push-stock.py")
 BUILD_ABM_DB_PATH        = os.path.join(ROOT, "openfarma/run/build-abm-db.py")
+BUILD_SNAPSHOTS_PATH     = os.path.join(ROOT, "openfarma/run/build-snapshots.py")
 
 # constants
 K_VALUE_SEARCH          = 30            # K value for the search
@@ -60,6 +63,93 @@ K_VALUE_THOLD           = 5             # K value for the threshold
 STOCK_UPDATE_INTERVAL   = 3600          # 1 hour
 USER_CHAT_COLUMNS       = [0.5, 0.5]    # percentage of the column for the user chat
 BOT_CHAT_COLUMNS        = [0.8, 0.2]    # percentage of the column for the bot chat
+CHAT_LIVE_TURNS         = 5             # last turns (user + assistant) rendered live, older ones collapsed
+CHAT_WELCOME_MESSAGE    = "Hola, ¿en qué te puedo ayudar?"  # first assistant message of every conversation
+
+# Context budget settings
+CONTEXT_LAST_MESSAGES   = 12            # thread messages read by the model on each run (summarized before they leave it)
+CONTEXT_TOKEN_BUDGET    = 12000         # prompt tokens of a run above which the history is summarized
+CONTEXT_KEEP_MESSAGES   = 4             # recent messages kept verbatim after a summary
+CONTEXT_SUMMARY_MODEL   = "gpt-4o-mini" # model that writes the rolling summary
+
+# Conversation engine settings
+CHAT_ENGINE                 = "assistants"  # "assistants" (OpenAI threads and runs) or "completions" (local history, Chat Completions)
+COMPLETIONS_MAX_TOOL_ROUNDS = 5             # tool-call rounds of a completions turn before answering without tools
+
+# Thread pool settings
+THREAD_POOL_SIZE            = 4             # threads created ahead of time, per process
+THREAD_POOL_TTL             = 6 * 3600      # seconds an unused thread is kept before being replaced
+THREAD_POOL_CHECK_INTERVAL  = 300           # seconds between expiry checks
+
+# Tool output settings
+TOOL_OUTPUT_TOKEN_BUDGET    = 600           # maximum tokens of a product search output
+TOOL_OUTPUT_INTACT_PRODUCTS = 2             # top products always returned complete
+TOKENIZER_ENCODING          = "o200k_base"  # tokenizer of the assistant's model (gpt-4o)
+
+# Embedding gateway settings (query embeddings of concurrent searches)
+EMBEDDING_BATCH_WINDOW_MS   = 5             # queries arriving this long after the first one share its request
+EMBEDDING_MAX_BATCH         = 64            # maximum queries per embeddings request
+EMBEDDING_MAX_CONCURRENT    = 4             # embeddings requests in flight at the same time
+
+# Speculative retrieval settings (product search started when the prompt is queued)
+PREFETCH_ENABLED            = True          # search the prompt text while the assistant run starts
+PREFETCH_DATABASES          = ("db_general", "db_all")  # vector databases searched ahead
+PREFETCH_MIN_TERMS          = 1             # search terms a prompt needs to be prefetched
+PREFETCH_MIN_OVERLAP        = 0.6           # share of the tool query terms found in the prompt to reuse its candidates
+PREFETCH_WAIT               = 5             # seconds a tool waits for an unfinished prefetch before searching itself
+PREFETCH_MAX_WORKERS        = 4             # searches running ahead at the same time
+
+# Answer cache settings (repeated questions of a store, while stock, catalog and assistant are unchanged)
+ANSWER_CACHE_ENABLED        = True          # hand out the previous answer of a repeated question
+ANSWER_CACHE_MAX_ENTRIES    = 64            # answers kept per store (least recently used are dropped)
+ANSWER_CACHE_TTL            = 4 * 3600      # seconds an answer is valid even if the data is unchanged
+ANSWER_CACHE_MIN_SIMILARITY = 0.95          # cosine similarity of a near-duplicate question (None: exact terms only)
+ANSWER_CACHE_MIN_TERMS      = 2             # search terms a question needs to be cached
+ANSWER_CACHE_MIN_OVERLAP    = 0.6           # share of each tool query's terms found in the question to cache the answer
+
+# Intent router settings (catalog statistics answered from the catalog aggregates, without a run)
+INTENT_ROUTER_ENABLED       = True          # answer brand counts, lists and checks and stock/promo counts locally
+
+# Brand index settings (brand lookups of verificar_marca and the intent router)
+BRAND_MATCH_MIN_SIMILARITY  = 0.4           # trigram similarity (Dice) of a misspelled brand to its catalog brand
+BRAND_MATCH_MAX_DISTANCE    = 0.25          # edits allowed, as a share of the brand length (at least one)
+
+# Rate limit settings (shared by every OpenAI request of the process, or of the host)
+RATE_LIMIT_ENABLED      = True          # schedule the OpenAI requests with the token buckets below
+RATE_LIMITS             = {             # requests and tokens per minute of the API key, per endpoint kind
+    "chat":       (5_000, 450_000),     # assistant runs, threads, messages and chat completions
+    "embeddings": (5_000, 1_000_000),   # query and catalog embeddings
+}
+RATE_LIMIT_RESERVES     = {             # share of each bucket a priority class can't take (left to higher ones)
+    "interactive": 0.0,                 # chat turns and their query embeddings
+    "background":  0.2,                 # thread pool refills
+    "batch":       0.5,                 # catalog rebuilds (build-abm-db.py)
+}
+RATE_LIMIT_RUN_TOKENS   = 6000          # token estimate of a run or tool-output submission (usage unknown beforehand)
+RATE_LIMIT_MAX_BACKOFF  = 60            # maximum pause, in seconds, after repeated 429 responses
+RATE_LIMIT_SHARED       = True          # share the scheduler with other processes of the host (local socket)
+RATE_LIMIT_PORT         = 8768          # local port of the shared scheduler
+RATE_LIMIT_ACQUIRE_TIMEOUT = 90         # seconds a request waits for the shared scheduler before scheduling locally
+RATE_LIMIT_RECONNECT    = 30            # seconds before retrying a shared scheduler that didn't answer
+
+# Tracing settings
+TRACING_EXPORTERS       = ["file"]      # "file", "otlp" and/or "prometheus"; empty disables tracing
+TRACING_PATH            = os.path.join(HISTORY_PATH, "traces/spans.jsonl")  # spans of the file exporter
+TRACING_MAX_BYTES       = 20 * 1024 * 1024  # size at which the spans file is rotated
+TRACING_OTLP_ENDPOINT   = "http://localhost:4318/v1/traces"  # OpenTelemetry collector (OTLP/HTTP, JSON)
+TRACING_PROMETHEUS_PORT = 9464          # port of the /metrics endpoint of the prometheus exporter
+TRACING_PROMETHEUS_HOST = "127.0.0.1"   # interface of the /metrics endpoint ("" for all; metrics include store ids)
+TRACING_FLUSH_INTERVAL  = 5             # seconds between span exports
+TRACING_SERVICE_NAME    = "openfarmai"  # service name reported to the collector
+
+# Usage accounting settings
+USAGE_ACCOUNTING        = True          # record tokens and cost of every run in USAGE_DB_PATH
+USAGE_DB_PATH           = os.path.join(HISTORY_PATH, "usage/usage.sqlite3")  # local usage store (sqlite)
+USAGE_FLUSH_INTERVAL    = 10            # seconds between writes of the queued usage records
+MODEL_PRICES            = {             # USD per 1M tokens (prompt, completion), matched by model prefix
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o":      (2.50, 10.00),
+}
 
 # google sheets
 SPREADSHEET_ID_IMAGES = "19CfuLw6dui_-pIUyq3g7_tNAUvRk7kbCjQ76jINPR0k"
@@ -98,8 +188,17 @@ HEADER_CAPTION = re.sub(pattern=' +', repl=' ',
 EMAIL_FROM      = st.secrets["EMAIL_FROM"]      # email sender
 EMAIL_TO        = st.secrets["EMAIL_TO"]        # email receiver
 EMAIL_PASSWORD  = st.secrets["EMAIL_PASSWORD"]  # email password
+SMTP_HOST       = "smtp.gmail.com"              # smtp server host
+SMTP_PORT       = 587                           # smtp server port (STARTTLS)
+SMTP_IDLE_TIMEOUT       = 120                   # seconds an idle smtp session is kept open
+DELIVERY_SPOOL_PATH     = os.path.join(HISTORY_PATH, "spool")   # conversation reports pending delivery
+DELIVERY_MAX_RETRIES    = 5                     # delivery attempts before a report is set aside
+DELIVERY_RETRY_DELAY    = 30                    # seconds before the first retry (doubles on each attempt)
+DELIVERY_DIGEST_MODE    = None                  # None (one email per logout), "hourly" or "daily" (one per store)
+DELIVERY_DIGEST_CHECK_INTERVAL = 60             # seconds between checks for finished digest windows
 
 # Prompt tracking settings
 PROMPT_TRACKING_INTERVAL_MINUTES = 60        # Report time in minutes
 PROMPT_TRACKING_INTERVAL_HOURS   = 1         # Report time in hours
-PROMPT_TRACKING_SHEET_ID         = "1LJcJvdsy0zOIjzloYXcQHKb5n6EBv_4mWl8lB0iowp4"
\ No newline at end of file
+PROMPT_TRACKING_SHEET_ID         = "1LJcJvdsy0zOIjzloYXcQHKb5n6EBv_4mWl8lB0iowp4"
+PROMPT_TRACKING_SPOOL_PATH       = os.path.join(ROOT, "openfarma/database/spool/prompts.jsonl")  # Rows pending upload
\ No newline at end of file
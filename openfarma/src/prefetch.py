@@ -0,0 +1,158 @@
+"""
+Speculative product retrieval: the product search of a turn starts as soon as the prompt
+is queued, in parallel with the assistant run.
+
+Almost every question ends up in a `buscar_productos*` tool call, but the tool only runs
+after the model has streamed the call, so the query embedding and the vector search add
+to the response time. When a prompt is queued, its raw text is searched right away in
+the databases of PREFETCH_DATABASES (one shared embedding, see embeddings.py). When the
+tool call arrives with a query similar enough to the prompt (at least
+PREFETCH_MIN_OVERLAP of its search terms are in the prompt), the handler takes the
+prefetched candidates, ranked first by the query terms they contain, instead of
+searching again. Otherwise it searches as usual; the prefetch is only discarded.
+
+Key Components:
+- foldText / searchTerms: Accent-folded text, and its words without stopwords.
+- RetrievalPrefetch: Searches started for one prompt; lookup() hands out the candidates
+  of a tool query when they match it.
+- startPrefetch: Start the searches of a prompt in the background.
+- usePrefetch / currentPrefetch: Make the prefetch of the prompt being answered
+  available to the tool handlers (context variable, like requestPriority).
+
+Typical Usage:
+    >>> prefetch = startPrefetch("¿Tienen algo para la tos seca?", trace_id=trace_id)
+    >>> with usePrefetch(prefetch):
+    ...     result = thread.runWithStreaming(assistant_id, handlers)
+
+    # In a tool handler (see fc.searchProducts)
+    >>> candidates = currentPrefetch().lookup("db_general", "tos seca", k=30)
+"""
+
+import re
+import threading
+import contextvars
+import unicodedata
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterator, Optional, Set
+
+from .tracing import span
+from .params import (
+    K_VALUE_SEARCH, PREFETCH_ENABLED, PREFETCH_DATABASES, PREFETCH_MIN_TERMS,
+    PREFETCH_MIN_OVERLAP, PREFETCH_WAIT, PREFETCH_MAX_WORKERS
+)
+
+# Words that say nothing about the product searched
+STOPWORDS = frozenset("""
+    a al algo alguna algun alguno algunos buen buena buenas buenos como con cual cuales de del dia el
+    en es esta este esto gracias hay hola la las le lo los me mi necesito para por que quiero se si
+    sirve su tenes tienen tiene tengo un una uno unos y ya
+""".split())
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+def foldText(text: str) -> str:
+    """Lowercase text without accents ("Protección" -> "proteccion")."""
+    folded = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in folded if not unicodedata.combining(char))
+
+def searchTerms(text: str) -> Set[str]:
+    """Lowercase, accent-folded words of a text (two letters or more), without stopwords."""
+    return {word for word in _WORD.findall(foldText(text)) if len(word) > 1 and word not in STOPWORDS}
+
+class RetrievalPrefetch:
+    """
+    Vector searches started for one prompt.
+
+    Attributes:
+        text (str): Prompt text searched.
+        terms (Set[str]): Search terms of the prompt.
+        k (int): Candidates retrieved per database.
+        trace_id (str, optional): Trace of the prompt the searches are recorded in.
+    """
+
+    def __init__(self, text: str, k: int = K_VALUE_SEARCH, trace_id: Optional[str] = None):
+        self.text = text
+        self.terms = searchTerms(text)
+        self.k = k
+        self.trace_id = trace_id
+        self._results: Dict[str, Future] = {}
+
+    def start(self, executor: ThreadPoolExecutor, databases=PREFETCH_DATABASES) -> "RetrievalPrefetch":
+        """Submit the search of every database to the executor."""
+        for name in databases:
+            self._results[name] = executor.submit(self._search, name)
+        return self
+
+    def _search(self, name: str) -> dict:
+        # Imported here: fc opens the vector databases and imports this module
+        from .fc import getDatabase, retrieveVectorDB
+
+        with span("prefetch.search", trace_id=self.trace_id, database=name, k=self.k):
+            return retrieveVectorDB(getDatabase(name), self.text, k=self.k)
+
+    def lookup(self, name: str, query: str, k: int) -> Optional[dict]:
+        """
+        Prefetched candidates of a tool query, when they can stand in for its search.
+
+        Args:
+            name (str): Database the tool searches (a key of fc.DB_PATHS).
+            query (str): Query of the tool call.
+            k (int): Candidates the tool asks for.
+
+        Returns:
+            dict, optional: EAN to text of the k candidates, the ones containing more
+                terms of the query first (ties keep the similarity order). None when the
+                database wasn't prefetched, the query differs from the prompt or the
+                search failed or isn't finished within PREFETCH_WAIT seconds.
+        """
+        future = self._results.get(name)
+        if future is None or k > self.k:
+            return None
+        terms = searchTerms(query)
+        if not terms or len(terms & self.terms) / len(terms) < PREFETCH_MIN_OVERLAP:
+            return None
+        try:
+            candidates = future.result(timeout=PREFETCH_WAIT)
+        except Exception:
+            return None
+        ranked = sorted(candidates.items(), key=lambda item: -len(terms & searchTerms(item[1])))
+        return dict(ranked[:k])
+
+    def cancel(self) -> None:
+        """Cancel the searches that haven't started (the prompt was answered without tools)."""
+        for future in self._results.values():
+            future.cancel()
+
+_prefetch: contextvars.ContextVar = contextvars.ContextVar("openfarma_prefetch", default=None)
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def startPrefetch(text: str, trace_id: Optional[str] = None) -> Optional[RetrievalPrefetch]:
+    """
+    Start the searches of a prompt in the background.
+
+    Returns:
+        RetrievalPrefetch, optional: None when prefetching is disabled or the prompt has
+            fewer than PREFETCH_MIN_TERMS search terms (greetings, thanks...).
+    """
+    global _executor
+    if not PREFETCH_ENABLED or len(searchTerms(text)) < PREFETCH_MIN_TERMS:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PREFETCH_MAX_WORKERS, thread_name_prefix="prefetch")
+    return RetrievalPrefetch(text, trace_id=trace_id).start(_executor)
+
+@contextmanager
+def usePrefetch(prefetch: Optional[RetrievalPrefetch]) -> Iterator[None]:
+    """Make a prefetch available to the tool handlers called inside the block."""
+    token = _prefetch.set(prefetch)
+    try:
+        yield
+    finally:
+        _prefetch.reset(token)
+
+def currentPrefetch() -> Optional[RetrievalPrefetch]:
+    """Prefetch of the prompt being answered in this thread, if any."""
+    return _prefetch.get()
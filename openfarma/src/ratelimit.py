@@ -0,0 +1,587 @@
+"""
+Process-wide (or host-wide) scheduler of the OpenAI requests, with token buckets and
+priority classes.
+
+Chat runs, the query embeddings of fc.py and the bulk embeddings of build-abm-db.py use
+the same API key. Every request goes through the scheduler before it's sent: it takes
+one request and its estimated tokens from the buckets of its endpoint kind ("chat" or
+"embeddings"), waiting when they are empty. Waiting requests are served by priority
+class ("interactive", then "background", then "batch"), and the lower classes can't
+drain a bucket below their reserve (RATE_LIMIT_RESERVES), so a catalog rebuild leaves
+room for the chat sessions.
+
+A 429 response pauses its endpoint kind for the retry-after of the response (or an
+exponential backoff) and halves the refill rate, which recovers with every successful
+response. The remaining requests and tokens reported by the API lower the buckets when
+other clients of the key are using them.
+
+With RATE_LIMIT_SHARED, the first process of the host serves its scheduler on a local
+socket (RATE_LIMIT_PORT) and the others (e.g. a catalog rebuild next to the app) use it
+through that socket. When the serving process exits, the first client that notices takes
+the port over and serves its own scheduler; the others reconnect to it. A scheduler that
+doesn't answer an acquire within RATE_LIMIT_ACQUIRE_TIMEOUT is bypassed (the request is
+scheduled locally) for RATE_LIMIT_RECONNECT seconds.
+
+Key Components:
+- TokenBucket: Per-minute capacity refilled continuously.
+- RateLimiter: Buckets, priority queues, adaptive backoff and queue metrics per endpoint kind.
+- RateLimitServer / RemoteRateLimiter: The scheduler shared over a local socket.
+- RateLimitedTransport: httpx transport that schedules the requests of an OpenAI client.
+- getRateLimiter / getHttpClient / requestPriority: Process-wide scheduler and helpers.
+
+Typical Usage:
+    >>> client = openai.OpenAI(api_key=api_key, http_client=getHttpClient())
+    >>> embedding = OpenAIEmbeddings(api_key=api_key, http_client=getHttpClient("batch"))
+    >>> with requestPriority("background"):
+    ...     thread = Thread(api_key)
+
+    $ python openfarma/run/ratelimit-status.py
+"""
+
+import json
+import time
+import heapq
+import socket
+import itertools
+import threading
+import contextvars
+import socketserver
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+from .composer import countTokens
+from .tracing import currentSpan, registerMetrics
+from .params import (
+    RATE_LIMIT_ENABLED,
+    RATE_LIMITS,
+    RATE_LIMIT_RESERVES,
+    RATE_LIMIT_RUN_TOKENS,
+    RATE_LIMIT_MAX_BACKOFF,
+    RATE_LIMIT_SHARED,
+    RATE_LIMIT_PORT,
+    RATE_LIMIT_ACQUIRE_TIMEOUT,
+    RATE_LIMIT_RECONNECT
+)
+
+PRIORITIES = ("interactive", "background", "batch")  # highest first
+MIN_RATE_SCALE = 0.1      # lowest refill rate (share of the configured one) after 429s
+RATE_RECOVERY_STEP = 0.05 # refill rate recovered by every successful response
+
+_priority: contextvars.ContextVar = contextvars.ContextVar("openfarma_request_priority", default=None)
+
+@contextmanager
+def requestPriority(priority: str) -> Iterator[None]:
+    """Send the OpenAI requests made inside the block with the given priority class."""
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown request priority: {priority}")
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+class TokenBucket:
+    """
+    Bucket of a per-minute limit, refilled continuously.
+
+    Attributes:
+        capacity (float): Limit per minute (and maximum level).
+        level (float): Units available now.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.rate = self.capacity / 60
+        self.updated = time.monotonic()
+
+    def refill(self, now: float, scale: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate * scale)
+        self.updated = now
+
+    def delay(self, amount: float, reserve: float, scale: float) -> float:
+        """Seconds until `amount` can be taken leaving `reserve` (share of the capacity)."""
+        missing = amount + reserve * self.capacity - self.level
+        return max(0.0, missing / (self.rate * scale))
+
+class _Lane:
+    """Buckets, waiting requests and counters of an endpoint kind."""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.scale = 1.0
+        self.paused_until = 0.0
+        self.consecutive_429 = 0
+        self.queue: List[Tuple[int, int]] = []  # (priority rank, arrival), a heap
+        self.waiting = {priority: 0 for priority in PRIORITIES}
+        self.granted = {priority: 0 for priority in PRIORITIES}
+        self.wait_seconds = {priority: 0.0 for priority in PRIORITIES}
+        self.max_wait = {priority: 0.0 for priority in PRIORITIES}
+        self.throttled = 0
+
+class RateLimiter:
+    """
+    Token-bucket scheduler of the OpenAI requests of an API key.
+
+    Attributes:
+        limits (dict): Requests and tokens per minute per endpoint kind.
+        reserves (dict): Share of each bucket a priority class leaves to the higher ones.
+        max_backoff (float): Maximum pause after repeated 429 responses, in seconds.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, Tuple[float, float]]] = None,
+                 reserves: Optional[Dict[str, float]] = None, max_backoff: float = RATE_LIMIT_MAX_BACKOFF):
+        """
+        Args:
+            limits (dict, optional): RATE_LIMITS if omitted.
+            reserves (dict, optional): RATE_LIMIT_RESERVES if omitted.
+            max_backoff (float): Maximum pause after 429 responses.
+        """
+        self.limits = limits if limits is not None else RATE_LIMITS
+        self.reserves = reserves if reserves is not None else RATE_LIMIT_RESERVES
+        self.max_backoff = max_backoff
+        self._lanes = {kind: _Lane(*limit) for kind, limit in self.limits.items()}
+        self._condition = threading.Condition()
+        self._arrivals = itertools.count()
+
+    def acquire(self, kind: str, tokens: float = 0, priority: str = "interactive") -> float:
+        """
+        Wait until a request of `tokens` estimated tokens can be sent.
+
+        Args:
+            kind (str): Endpoint kind ("chat" or "embeddings"). Unknown kinds aren't limited.
+            tokens (float): Estimated tokens of the request (capped at the bucket capacity).
+            priority (str): "interactive", "background" or "batch".
+
+        Returns:
+            float: Seconds waited.
+        """
+        lane = self._lanes.get(kind)
+        if lane is None:
+            return 0.0
+        rank = PRIORITIES.index(priority) if priority in PRIORITIES else len(PRIORITIES) - 1
+        priority = PRIORITIES[rank]
+        reserve = self.reserves.get(priority, 0.0)
+        amount = min(float(tokens), lane.tokens.capacity * (1 - reserve))
+        ticket = (rank, next(self._arrivals))
+        start = time.monotonic()
+
+        with self._condition:
+            heapq.heappush(lane.queue, ticket)
+            lane.waiting[priority] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    lane.requests.refill(now, lane.scale)
+                    lane.tokens.refill(now, lane.scale)
+                    delay = None  # Not first in line: woken up when the queue moves
+                    if lane.queue[0] == ticket:
+                        delay = max(
+                            lane.paused_until - now,
+                            lane.requests.delay(1, reserve, lane.scale),
+                            lane.tokens.delay(amount, reserve, lane.scale)
+                        )
+                        if delay <= 0:
+                            heapq.heappop(lane.queue)
+                            lane.requests.level -= 1
+                            lane.tokens.level -= amount
+                            break
+                    # Bounded waits: a higher priority arrival may take the head meanwhile
+                    self._condition.wait(timeout=min(delay, 1.0) if delay is not None else 1.0)
+            except BaseException:
+                lane.queue.remove(ticket)
+                heapq.heapify(lane.queue)
+                raise
+            finally:
+                lane.waiting[priority] -= 1
+                self._condition.notify_all()
+
+            waited = time.monotonic() - start
+            lane.granted[priority] += 1
+            lane.wait_seconds[priority] += waited
+            lane.max_wait[priority] = max(lane.max_wait[priority], waited)
+        return waited
+
+    def reportThrottled(self, kind: str, retry_after: Optional[float] = None) -> None:
+        """
+        Back off after a 429 response: pause the endpoint kind and halve its refill rate.
+
+        Args:
+            kind (str): Endpoint kind of the request.
+            retry_after (float, optional): Seconds asked by the API; an exponential
+                backoff (1, 2, 4... up to max_backoff) if omitted.
+        """
+        lane = self._lanes.get(kind)
+        if lane is None:
+            return
+        with self._condition:
+            lane.throttled += 1
+            lane.consecutive_429 += 1
+            lane.scale = max(MIN_RATE_SCALE, lane.scale / 2)
+            backoff = retry_after if retry_after is not None else 2 ** (lane.consecutive_429 - 1)
+            lane.paused_until = max(lane.paused_until, time.monotonic() + min(backoff, self.max_backoff))
+            self._condition.notify_all()
+
+    def reportSuccess(self, kind: str, remaining_requests: Optional[float] = None,
+                      remaining_tokens: Optional[float] = None) -> None:
+        """
+        Recover the refill rate after a successful response, and lower the buckets to
+        the remaining requests and tokens reported by the API (other clients of the key).
+        """
+        lane = self._lanes.get(kind)
+        if lane is None:
+            return
+        with self._condition:
+            lane.consecutive_429 = 0
+            lane.scale = min(1.0, lane.scale + RATE_RECOVERY_STEP)
+            if remaining_requests is not None:
+                lane.requests.level = min(lane.requests.level, remaining_requests)
+            if remaining_tokens is not None:
+                lane.tokens.level = min(lane.tokens.level, remaining_tokens)
+
+    def metrics(self) -> Dict[str, dict]:
+        """
+        State of every endpoint kind: bucket levels, refill scale, pause left, 429
+        count, and waiting requests (queue depth), grants and waits per priority class.
+        """
+        now = time.monotonic()
+        with self._condition:
+            return {
+                kind: {
+                    "requests_available": round(lane.requests.level, 1),
+                    "tokens_available": round(lane.tokens.level),
+                    "rate_scale": round(lane.scale, 3),
+                    "paused_for": round(max(0.0, lane.paused_until - now), 3),
+                    "throttled": lane.throttled,
+                    "waiting": dict(lane.waiting),
+                    "granted": dict(lane.granted),
+                    "wait_seconds": {priority: round(value, 3) for priority, value in lane.wait_seconds.items()},
+                    "max_wait": {priority: round(value, 3) for priority, value in lane.max_wait.items()},
+                }
+                for kind, lane in self._lanes.items()
+            }
+
+class RateLimitServer(socketserver.ThreadingTCPServer):
+    """
+    Serves a RateLimiter on a local socket, one JSON message per line:
+    {"op": "acquire", "kind", "tokens", "priority"} -> {"waited"}, {"op": "throttled",
+    "kind", "retry_after"}, {"op": "success", "kind", "remaining_requests",
+    "remaining_tokens"} and {"op": "metrics"}.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, limiter: RateLimiter, port: int = RATE_LIMIT_PORT):
+        self.limiter = limiter
+        super().__init__(("127.0.0.1", port), _RateLimitHandler)
+
+    def start(self) -> None:
+        threading.Thread(target=self.serve_forever, name="ratelimit-server", daemon=True).start()
+
+class _RateLimitHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        limiter = self.server.limiter
+        for line in self.rfile:
+            try:
+                message = json.loads(line)
+                op = message.get("op")
+                if op == "acquire":
+                    reply = {"waited": limiter.acquire(message["kind"], message.get("tokens", 0),
+                                                       message.get("priority", "interactive"))}
+                elif op == "throttled":
+                    limiter.reportThrottled(message["kind"], message.get("retry_after"))
+                    reply = {}
+                elif op == "success":
+                    limiter.reportSuccess(message["kind"], message.get("remaining_requests"),
+                                          message.get("remaining_tokens"))
+                    reply = {}
+                elif op == "metrics":
+                    reply = {"metrics": limiter.metrics()}
+                else:
+                    reply = {"error": f"Unknown operation: {op}"}
+            except Exception as e:
+                reply = {"error": str(e)}
+            self.wfile.write((json.dumps(reply) + "\n").encode())
+
+class RemoteRateLimiter:
+    """
+    RateLimiter of another process, used through its local socket (one connection
+    per thread).
+
+    If the connection is lost (the serving process exited), this process binds the port
+    and serves its own RateLimiter to the others, or reconnects to the process that got
+    there first. While no scheduler can be reached, or after one didn't answer in time,
+    the requests are scheduled by the local RateLimiter and the shared one is retried
+    after RATE_LIMIT_RECONNECT seconds.
+    """
+
+    def __init__(self, port: int = RATE_LIMIT_PORT, timeout: float = 2.0,
+                 acquire_timeout: float = RATE_LIMIT_ACQUIRE_TIMEOUT, take_over: bool = True):
+        """
+        Args:
+            port (int): Local port of the RateLimitServer.
+            timeout (float): Seconds to connect and to wait for non-acquire replies.
+            acquire_timeout (float): Seconds to wait for an acquire reply.
+            take_over (bool): Serve the port when the server is gone (False for
+                monitoring clients such as ratelimit-status.py).
+
+        Raises:
+            OSError: If there is no server on the port.
+        """
+        self.port = port
+        self.timeout = timeout
+        self.acquire_timeout = acquire_timeout
+        self.take_over = take_over
+        self._local = threading.local()
+        self._limiter: Optional[RateLimiter] = None     # Used when no shared scheduler answers
+        self._server: Optional[RateLimitServer] = None  # Set once this process serves the port
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._send({"op": "metrics"})
+
+    @property
+    def local_limiter(self) -> RateLimiter:
+        """Scheduler of this process (served on the port after a take-over)."""
+        with self._lock:
+            if self._limiter is None:
+                self._limiter = RateLimiter()
+            return self._limiter
+
+    def acquire(self, kind: str, tokens: float = 0, priority: str = "interactive") -> float:
+        reply = self._call({"op": "acquire", "kind": kind, "tokens": tokens, "priority": priority})
+        if reply is None:
+            return self.local_limiter.acquire(kind, tokens, priority)
+        return reply.get("waited", 0.0)
+
+    def reportThrottled(self, kind: str, retry_after: Optional[float] = None) -> None:
+        if self._call({"op": "throttled", "kind": kind, "retry_after": retry_after}) is None:
+            self.local_limiter.reportThrottled(kind, retry_after)
+
+    def reportSuccess(self, kind: str, remaining_requests: Optional[float] = None,
+                      remaining_tokens: Optional[float] = None) -> None:
+        message = {"op": "success", "kind": kind, "remaining_requests": remaining_requests,
+                   "remaining_tokens": remaining_tokens}
+        if self._call(message) is None:
+            self.local_limiter.reportSuccess(kind, remaining_requests, remaining_tokens)
+
+    def metrics(self) -> Dict[str, dict]:
+        reply = self._call({"op": "metrics"})
+        return reply.get("metrics", {}) if reply is not None else self.local_limiter.metrics()
+
+    def _call(self, message: dict) -> Optional[dict]:
+        """
+        Send a message to the shared scheduler.
+
+        Returns:
+            dict, optional: The reply, None when the local scheduler must handle the
+                message (this process serves the port, or no scheduler answered).
+        """
+        if self._server is not None or time.monotonic() < self._retry_at:
+            return None
+        try:
+            return self._send(message)
+        except socket.timeout:
+            print(f"The shared rate limiter didn't answer in time. Scheduling locally for {RATE_LIMIT_RECONNECT} s.")
+        except ValueError as e:
+            print(f"Invalid reply from the shared rate limiter: {str(e)}. Scheduling locally for {RATE_LIMIT_RECONNECT} s.")
+        except OSError:
+            # The serving process is gone: serve the port, or use whoever took it over
+            if self._takeOver():
+                return None
+            try:
+                return self._send(message)
+            except OSError as e:
+                print(f"Error contacting the shared rate limiter: {str(e)}. Scheduling locally for {RATE_LIMIT_RECONNECT} s.")
+        self._retry_at = time.monotonic() + RATE_LIMIT_RECONNECT
+        return None
+
+    def _takeOver(self) -> bool:
+        """Serve the local scheduler on the port. False if another process already serves it."""
+        if not self.take_over:
+            return False
+        limiter = self.local_limiter
+        with self._lock:
+            if self._server is None:
+                try:
+                    self._server = RateLimitServer(limiter, self.port)
+                except OSError:
+                    return False
+                self._server.start()
+                print(f"Serving the shared rate limiter on port {self.port}.")
+        return True
+
+    def _send(self, message: dict) -> dict:
+        """Send a message and read its reply on the connection of the current thread."""
+        connection = getattr(self._local, "connection", None)
+        try:
+            if connection is None:
+                sock = socket.create_connection(("127.0.0.1", self.port), timeout=self.timeout)
+                connection = self._local.connection = (sock, sock.makefile("rb"))
+            sock, reader = connection
+            # An acquire waits its turn in the queue, bounded in case the server is stuck
+            sock.settimeout(self.acquire_timeout if message["op"] == "acquire" else self.timeout)
+            sock.sendall((json.dumps(message) + "\n").encode())
+            line = reader.readline()
+            if not line:
+                raise ConnectionError("connection closed by the server")
+            return json.loads(line)
+        except Exception:
+            if connection is not None:
+                connection[0].close()
+            self._local.connection = None
+            raise
+
+def estimateRequest(request: httpx.Request) -> Tuple[Optional[str], float]:
+    """
+    Endpoint kind and estimated tokens of an OpenAI request.
+
+    Embeddings count the tokens of their input (texts or token ids), chat completions
+    those of their messages plus the completion limit, and runs and tool-output
+    submissions RATE_LIMIT_RUN_TOKENS (their prompt is the thread, unknown here). Other
+    requests (threads, messages, run checks) take a request but no tokens.
+
+    Returns:
+        Tuple[str, float]: ("embeddings" or "chat", tokens).
+    """
+    path = request.url.path
+    if request.method != "POST":
+        return "chat", 0
+    try:
+        body = json.loads(request.read() or b"{}")
+    except Exception:
+        body = {}
+    if path.endswith("/embeddings"):
+        inputs = body.get("input", [])
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        return "embeddings", sum(len(item) if isinstance(item, list) else countTokens(str(item)) for item in inputs)
+    if path.endswith("/chat/completions"):
+        text = " ".join(str(message.get("content", "")) for message in body.get("messages", []))
+        return "chat", countTokens(text) + (body.get("max_tokens") or body.get("max_completion_tokens") or 0)
+    if path.endswith("/runs") or path.endswith("/submit_tool_outputs"):
+        return "chat", RATE_LIMIT_RUN_TOKENS
+    return "chat", 0
+
+def _headerFloat(headers: httpx.Headers, name: str) -> Optional[float]:
+    try:
+        return float(headers[name]) if name in headers else None
+    except ValueError:
+        return None
+
+class RateLimitedTransport(httpx.BaseTransport):
+    """
+    httpx transport that schedules every request with a RateLimiter before sending it
+    and reports the 429 responses and the remaining limits back to it. The time
+    waited is added to the current span ("ratelimit_wait_ms").
+    """
+
+    def __init__(self, limiter, priority: str = "interactive", transport: Optional[httpx.BaseTransport] = None):
+        """
+        Args:
+            limiter (RateLimiter or RemoteRateLimiter): Scheduler of the requests.
+            priority (str): Priority class of the requests sent outside requestPriority.
+            transport (httpx.BaseTransport, optional): Transport that sends the requests.
+        """
+        self.limiter = limiter
+        self.priority = priority
+        self._transport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        kind, tokens = estimateRequest(request)
+        waited = self.limiter.acquire(kind, tokens, _priority.get() or self.priority)
+        if waited >= 0.001:
+            currentSpan().addToAttribute("ratelimit_wait_ms", waited * 1000)
+
+        response = self._transport.handle_request(request)
+        if response.status_code == 429:
+            retry_after_ms = _headerFloat(response.headers, "retry-after-ms")
+            retry_after = retry_after_ms / 1000 if retry_after_ms is not None else _headerFloat(response.headers, "retry-after")
+            self.limiter.reportThrottled(kind, retry_after)
+        elif response.status_code < 400:
+            self.limiter.reportSuccess(kind, _headerFloat(response.headers, "x-ratelimit-remaining-requests"),
+                                       _headerFloat(response.headers, "x-ratelimit-remaining-tokens"))
+        return response
+
+    def close(self) -> None:
+        self._transport.close()
+
+def renderMetrics(metrics: Dict[str, dict]) -> List[str]:
+    """Scheduler metrics in the Prometheus text format."""
+    lines = [
+        "# HELP openfarma_ratelimit_queue_depth OpenAI requests waiting for the rate limiter.",
+        "# TYPE openfarma_ratelimit_queue_depth gauge"
+    ]
+    for kind, state in metrics.items():
+        for priority, count in state["waiting"].items():
+            lines.append(f'openfarma_ratelimit_queue_depth{{kind="{kind}",priority="{priority}"}} {count}')
+    lines += [
+        "# HELP openfarma_ratelimit_wait_seconds_total Time OpenAI requests waited for the rate limiter.",
+        "# TYPE openfarma_ratelimit_wait_seconds_total counter"
+    ]
+    for kind, state in metrics.items():
+        for priority, seconds in state["wait_seconds"].items():
+            lines.append(f'openfarma_ratelimit_wait_seconds_total{{kind="{kind}",priority="{priority}"}} {seconds}')
+    lines += [
+        "# HELP openfarma_ratelimit_throttled_total Responses with status 429.",
+        "# TYPE openfarma_ratelimit_throttled_total counter"
+    ]
+    lines += [f'openfarma_ratelimit_throttled_total{{kind="{kind}"}} {state["throttled"]}' for kind, state in metrics.items()]
+    lines += [
+        "# HELP openfarma_ratelimit_rate_scale Refill rate in use (share of the configured one).",
+        "# TYPE openfarma_ratelimit_rate_scale gauge"
+    ]
+    lines += [f'openfarma_ratelimit_rate_scale{{kind="{kind}"}} {state["rate_scale"]}' for kind, state in metrics.items()]
+    return lines
+
+_rate_limiter = None
+_http_clients: Dict[str, httpx.Client] = {}
+_rate_limit_lock = threading.Lock()
+
+def getRateLimiter():
+    """
+    Get the process-wide scheduler (None when RATE_LIMIT_ENABLED is off).
+
+    With RATE_LIMIT_SHARED, the scheduler of another process of the host is used when
+    one serves RATE_LIMIT_PORT (taken over by this process if that one exits); otherwise
+    this process creates one and serves it.
+    """
+    global _rate_limiter
+    if not RATE_LIMIT_ENABLED:
+        return None
+    with _rate_limit_lock:
+        if _rate_limiter is None:
+            if RATE_LIMIT_SHARED:
+                try:
+                    _rate_limiter = RemoteRateLimiter()
+                except OSError:
+                    pass
+            if _rate_limiter is None:
+                _rate_limiter = RateLimiter()
+                if RATE_LIMIT_SHARED:
+                    try:
+                        RateLimitServer(_rate_limiter).start()
+                    except OSError as e:
+                        print(f"Error sharing the rate limiter on port {RATE_LIMIT_PORT}: {str(e)}")
+            registerMetrics(lambda: renderMetrics(_rate_limiter.metrics()))
+        return _rate_limiter
+
+def getHttpClient(priority: str = "interactive") -> Optional[httpx.Client]:
+    """
+    Process-wide HTTP client for the OpenAI clients (openai.OpenAI, OpenAIEmbeddings),
+    sending its requests through the scheduler with the given default priority class.
+
+    Returns:
+        httpx.Client: The client, or None when rate limiting is disabled (the OpenAI
+            clients then use their own).
+    """
+    limiter = getRateLimiter()
+    if limiter is None:
+        return None
+    with _rate_limit_lock:
+        if priority not in _http_clients:
+            import openai
+            _http_clients[priority] = openai.DefaultHttpxClient(transport=RateLimitedTransport(limiter, priority))
+        return _http_clients[priority]
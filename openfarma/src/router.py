@@ -0,0 +1,195 @@
+"""
+Local intent router: catalog statistics questions are answered without a model round trip.
+
+Counting and listing brands, checking a brand and counting the products with stock or
+on promotion are deterministic lookups, but through the assistant each one costs a run:
+the model decides to call the tool, the output is submitted and a second generation
+writes the answer. The router recognizes these questions with patterns over the
+accent-folded text and answers them from the precomputed catalog aggregates
+(catalog.py).
+
+A question is only routed when exactly one intent matches and every search term of it
+belongs to the vocabulary of that intent (or is the brand checked). Anything else, e.g.
+"¿qué marcas de protector solar tienen?" or a question matching two intents, falls
+through to the assistant.
+
+Intents (named after the tools they replace):
+- contar_marcas: "¿Cuántas marcas tienen?"
+- listar_marcas: "¿Qué marcas manejan?"
+- contar_productos_con_stock: "¿Cuántos productos hay en stock?"
+- contar_productos_en_promocion: "¿Cuántos productos están en promoción?"
+- verificar_marca: "¿Tienen productos de Eucerin?", "¿Manejan la marca Nivea?"
+
+Brands are found with the catalog BrandIndex, so "La Roche-Posay" or a misspelled
+"Euserin" are answered with the catalog brand and its number of products.
+
+Key Components:
+- Intent: A recognized intent, its arguments and its answer.
+- IntentRouter: classify() a question, answer() an intent, or route() both.
+- getIntentRouter: Process-wide router.
+
+Typical Usage:
+    >>> intent = getIntentRouter().route("¿Cuántas marcas tienen?")
+    >>> intent.name, intent.answer
+    ('contar_marcas', 'Tenemos 9 marcas en el catálogo.')
+"""
+
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from .catalog import CatalogStats, getCatalogStats, normalizeText
+from .prefetch import searchTerms
+from .tracing import span
+
+# Patterns over the normalized text (accent-folded, punctuation as spaces), by intent.
+# Every pattern of an intent must match.
+PATTERNS: Dict[str, List[str]] = {
+    "contar_marcas": [r"\bcuant[ao]s (?:tipos de |son las )?marcas\b"],
+    "listar_marcas": [r"\b(?:(?:que|cuales) (?:son las )?marcas|(?:lista\w*|dec\w*|dime|nombra\w*|mostra\w*|muestra\w*) .*\bmarcas)\b"],
+    "contar_productos_con_stock": [r"\bcuant[ao]s productos\b", r"\b(?:stock|existencias?|disponibles?)\b"],
+    "contar_productos_en_promocion": [r"\bcuant[ao]s productos\b", r"\b(?:promo|promos|promocion|promociones|oferta|ofertas)\b"],
+    "verificar_marca": [r"^(?:tienen|tenes|manejan|trabajan|venden|hay|esta|estan|existe)\b"],
+}
+
+# Words a routed question may contain besides stopwords (and the brand checked)
+VOCABULARY = frozenset("""
+    cuantas cuantos tipos son marcas marca total totales distintas diferentes catalogo farmacia sucursal
+    manejan trabajan venden tienen tenes hay estan disponible disponibles existe ofrecen actualmente hoy
+    lista listar listame listado decime decir dime nombrame mostrame muestrame todas todos productos producto
+""".split())
+
+# Words only the questions of one intent may contain ("¿qué marcas tienen en promo?" isn't routed)
+INTENT_VOCABULARY = {
+    "contar_productos_con_stock": frozenset("stock existencia existencias venta".split()),
+    "contar_productos_en_promocion": frozenset("promo promos promocion promociones oferta ofertas".split()),
+}
+
+ANSWERS = {
+    "contar_marcas": "Tenemos {count} marcas en el catálogo.",
+    "listar_marcas": "Las marcas del catálogo son: {brands}.",
+    "contar_productos_con_stock": "Hay {count} productos con stock.",
+    "contar_productos_en_promocion": "Hay {count} productos en promoción.",
+    "verificar_marca": "Sí, la marca {brand} está en el catálogo ({products} productos).",
+    "verificar_marca_ausente": "No, la marca {brand} no está en el catálogo.",
+}
+
+@dataclass
+class Intent:
+    """
+    Intent recognized in a question.
+
+    Attributes:
+        name (str): Intent, named after the tool it replaces.
+        arguments (dict): Tool arguments (the brand of verificar_marca).
+        answer (str): Answer, set by IntentRouter.answer().
+    """
+    name: str
+    arguments: dict = field(default_factory=dict)
+    answer: str = ""
+
+class IntentRouter:
+    """
+    Recognizes the catalog statistics questions and answers them from the catalog aggregates.
+
+    Attributes:
+        patterns (Dict[str, List[re.Pattern]]): Compiled patterns by intent.
+    """
+
+    def __init__(self, patterns: Dict[str, List[str]] = PATTERNS):
+        self.patterns = {name: [re.compile(pattern) for pattern in group] for name, group in patterns.items()}
+
+    def classify(self, text: str, stats: Optional[CatalogStats] = None) -> Optional[Intent]:
+        """
+        Intent of a question, if it is unambiguously one of the routed intents.
+
+        Args:
+            text (str): Question.
+            stats (CatalogStats, optional): Catalog aggregates; getCatalogStats() if omitted.
+
+        Returns:
+            Intent, optional: The intent (without answer), None when the question must go
+                to the assistant.
+        """
+        normalized = normalizeText(text)
+        matches = [name for name, patterns in self.patterns.items()
+                   if all(pattern.search(normalized) for pattern in patterns)]
+        # Asking for the number of products also matches the brand check ("hay"...)
+        if len(matches) > 1 and "verificar_marca" in matches:
+            matches.remove("verificar_marca")
+        if len(matches) != 1:
+            return None
+
+        terms = searchTerms(normalized) - VOCABULARY - INTENT_VOCABULARY.get(matches[0], frozenset())
+        if matches[0] != "verificar_marca":
+            return Intent(matches[0]) if not terms else None
+
+        index = (stats or getCatalogStats()).brand_index
+        found = index.mentions(normalized)
+        if len(found) > 1 or (found and terms - set(found[0].text.split())):
+            return None
+        if found:
+            return Intent("verificar_marca", {"marca": found[0].brand})
+        # Otherwise the words left must be a misspelled brand...
+        words = [word for word in normalized.split() if word in terms]
+        match = index.lookup(" ".join(words)) if 0 < len(words) <= 3 else None
+        if match is not None:
+            return Intent("verificar_marca", {"marca": match.brand})
+        # ...or a brand out of the catalog, only recognized when the question says it's a brand
+        named = re.search(r"\bmarca (\w+(?: \w+)?)$", normalized)
+        if named and set(named.group(1).split()) == terms:
+            return Intent("verificar_marca", {"marca": named.group(1)})
+        return None
+
+    def answer(self, intent: Intent, stats: Optional[CatalogStats] = None) -> Intent:
+        """Fill the answer of an intent from the catalog aggregates."""
+        stats = stats or getCatalogStats()
+        if intent.name == "contar_marcas":
+            intent.answer = ANSWERS[intent.name].format(count=stats.brand_count)
+        elif intent.name == "listar_marcas":
+            intent.answer = ANSWERS[intent.name].format(brands=", ".join(stats.brand_names))
+        elif intent.name == "contar_productos_con_stock":
+            intent.answer = ANSWERS[intent.name].format(count=stats.products_with_stock)
+        elif intent.name == "contar_productos_en_promocion":
+            intent.answer = ANSWERS[intent.name].format(count=stats.products_on_promo)
+        elif intent.name == "verificar_marca":
+            brand = intent.arguments["marca"]
+            match = stats.brand_index.lookup(brand)
+            if match is not None:
+                intent.answer = ANSWERS["verificar_marca"].format(brand=match.name, products=match.products)
+            else:
+                intent.answer = ANSWERS["verificar_marca_ausente"].format(brand=brand.title())
+        return intent
+
+    def route(self, text: str) -> Optional[Intent]:
+        """
+        Answer a question locally when it is a routed intent.
+
+        Args:
+            text (str): Question.
+
+        Returns:
+            Intent, optional: The intent with its answer, None to send the question to the
+                assistant (also when the catalog aggregates can't be computed).
+        """
+        with span("router.route", chars=len(text)) as routing:
+            try:
+                stats = getCatalogStats()
+            except Exception as e:
+                print(f"Error routing question: {str(e)}")
+                return None
+            intent = self.classify(text, stats)
+            routing.setAttribute("intent", intent.name if intent else None)
+            return self.answer(intent, stats) if intent else None
+
+_intent_router: Optional[IntentRouter] = None
+_intent_router_lock = threading.Lock()
+
+def getIntentRouter() -> IntentRouter:
+    """Get the process-wide intent router."""
+    global _intent_router
+    with _intent_router_lock:
+        if _intent_router is None:
+            _intent_router = IntentRouter()
+        return _intent_router
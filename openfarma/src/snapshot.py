@@ -0,0 +1,347 @@
+"""
+Columnar, memory-mapped snapshots of the CSV tables used by the application.
+
+The sync scripts (`openfarma/run/pull-*.py`) keep writing the CSV files as before and,
+right after, emit a compact binary snapshot of the same table into `SNAPSHOT_DB_PATH`.
+Application processes open the snapshot read-only through `mmap`, so the operating system
+shares the pages between every Streamlit worker and nothing has to be parsed at startup.
+
+File Layout (native byte order, recorded in the header; sections aligned to 8 bytes):
+    MAGIC (8 bytes) | header length (uint64) | header (JSON, utf-8) | sections...
+
+    - Every column is stored as an offsets array (rows + 1 uint64 values) followed by
+      the utf-8 encoded values, so a single cell is a slice of the mapped file.
+    - Every indexed column (e.g. `ean`) stores a permutation of the row numbers (uint32)
+      sorted by the column value. A lookup is a binary search over that permutation,
+      which keeps the EAN -> row index at 4 bytes per row.
+
+Key Components:
+- Snapshot: Read-only view over a snapshot file with row, column and key lookups.
+- writeSnapshot: Writes a snapshot from column names and an iterable of rows.
+- writeSnapshotFromCsv: Builds the snapshot of a CSV file exactly as it was written.
+- loadSnapshot: Returns the process-wide, up to date snapshot for a CSV path, if any.
+- tableVersion: Version of a table (snapshot content hash, or CSV modification time).
+
+Typical Usage:
+    >>> writeSnapshotFromCsv(STOCK_PATH, index_columns=["ean"])   # sync script
+    >>> snapshot = loadSnapshot(STOCK_PATH)                       # application
+    >>> rows = snapshot.lookup("ean", "7798182770042")
+    >>> snapshot.value(rows[0], "stock")
+    '4'
+"""
+
+import os, sys, csv
+import json, mmap, array
+import hashlib, threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from .params import SNAPSHOT_DB_PATH
+
+MAGIC = b"OFSNAP01"
+FORMAT_VERSION = 1
+
+_cache: Dict[str, "Snapshot"] = {}
+_cache_lock = threading.Lock()
+
+def _align(offset: int) -> int:
+    """Round an offset up to the next multiple of 8 bytes."""
+    return (offset + 7) & ~7
+
+def snapshotPath(csv_path: str) -> str:
+    """
+    Get the snapshot path associated with a CSV file.
+
+    Args:
+        csv_path (str): Path to the CSV file (e.g. STOCK_PATH).
+
+    Returns:
+        str: Path of the snapshot file inside SNAPSHOT_DB_PATH.
+    """
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(SNAPSHOT_DB_PATH, f"{name}.snap")
+
+class Snapshot:
+    """
+    Read-only, memory-mapped view over a snapshot file.
+
+    Values are decoded lazily, one cell at a time, straight from the mapped pages.
+    Instances are immutable and safe to share between sessions and threads.
+
+    Attributes:
+        path (str): Path of the snapshot file.
+        columns (List[str]): Column names, in the original CSV order.
+        rows (int): Number of rows.
+        version (str): Content hash of the table, changes whenever any value changes.
+        created_at (str): ISO timestamp of the snapshot creation.
+    """
+
+    def __init__(self, path: str):
+        """
+        Open and map a snapshot file.
+
+        Args:
+            path (str): Path of the snapshot file.
+
+        Raises:
+            ValueError: If the file is not a snapshot or was written with another layout.
+        """
+        self.path = path
+        self._key = None
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not a snapshot file: {path}")
+        header_length = int.from_bytes(self._mm[8:16], "little")
+        header = json.loads(self._mm[16:16 + header_length].decode("utf-8"))
+        if header.get("format") != FORMAT_VERSION or header.get("byteorder") != sys.byteorder:
+            raise ValueError(f"Unsupported snapshot layout: {path}")
+
+        self.columns: List[str] = header["columns"]
+        self.rows: int = header["rows"]
+        self.version: str = header["version"]
+        self.created_at: str = header["created_at"]
+        self._position = {name: i for i, name in enumerate(self.columns)}
+
+        view = memoryview(self._mm)
+        self._offsets = []
+        self._data = []
+        for name in self.columns:
+            offsets_at, data_at = header["sections"][name]
+            self._offsets.append(view[offsets_at:offsets_at + 8 * (self.rows + 1)].cast("Q"))
+            self._data.append(data_at)
+        self._indexes = {
+            name: view[at:at + 4 * self.rows].cast("I")
+            for name, at in header["indexes"].items()
+        }
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def _raw(self, row: int, column: int) -> bytes:
+        """Get the encoded bytes of a cell."""
+        offsets = self._offsets[column]
+        start = self._data[column] + offsets[row]
+        return self._mm[start:self._data[column] + offsets[row + 1]]
+
+    def value(self, row: int, column: str) -> str:
+        """
+        Get a single cell.
+
+        Args:
+            row (int): Row number.
+            column (str): Column name.
+
+        Returns:
+            str: The cell value, stripped, as it appeared in the CSV file.
+        """
+        return self._raw(row, self._position[column]).decode("utf-8")
+
+    def row(self, row: int) -> Dict[str, str]:
+        """Get a full row as a dictionary keyed by column name."""
+        return {name: self.value(row, name) for name in self.columns}
+
+    def column(self, column: str) -> List[str]:
+        """Materialize every value of a column."""
+        position = self._position[column]
+        return [self._raw(i, position).decode("utf-8") for i in range(self.rows)]
+
+    def hasIndex(self, column: str) -> bool:
+        """Check if a column was indexed when the snapshot was written."""
+        return column in self._indexes
+
+    def lookup(self, column: str, key: str) -> List[int]:
+        """
+        Find the rows whose value in an indexed column equals a key.
+
+        Args:
+            column (str): Indexed column name (e.g. "ean").
+            key (str): Value to look for. It is stripped before the search.
+
+        Returns:
+            List[int]: Matching row numbers in file order. Empty if there is no match.
+
+        Raises:
+            KeyError: If the column was not indexed.
+        """
+        index = self._indexes[column]
+        position = self._position[column]
+        target = str(key).strip().encode("utf-8")
+
+        lo, hi = 0, self.rows
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._raw(index[mid], position) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        matches = []
+        while lo < self.rows and self._raw(index[lo], position) == target:
+            matches.append(index[lo])
+            lo += 1
+        return sorted(matches)
+
+def writeSnapshot(path: str, columns: Sequence[str], rows: Iterable[Sequence],
+                  index_columns: Sequence[str] = ()) -> str:
+    """
+    Write a snapshot file atomically.
+
+    The file is written next to its final location and moved into place with
+    `os.replace`, so processes that already mapped the previous snapshot keep
+    reading a consistent file.
+
+    Args:
+        path (str): Destination of the snapshot file.
+        columns (Sequence[str]): Column names.
+        rows (Iterable[Sequence]): Table rows. Values are converted to stripped strings.
+        index_columns (Sequence[str]): Columns to index for key lookups.
+
+    Returns:
+        str: The destination path.
+
+    Raises:
+        Exception: If the snapshot can't be written.
+    """
+    try:
+        columns = [str(name) for name in columns]
+        values = [[] for _ in columns]
+        digest = hashlib.sha1("\x1f".join(columns).encode("utf-8"))
+        for row in rows:
+            for i, value in enumerate(row):
+                encoded = str(value).strip().encode("utf-8")
+                values[i].append(encoded)
+                digest.update(encoded + b"\x1f")
+            digest.update(b"\x1e")
+        n_rows = len(values[0]) if columns else 0
+
+        # Lay out the sections after a placeholder header
+        sections, indexes, blocks = {}, {}, []
+        cursor = 0
+        for name, cells in zip(columns, values):
+            offsets = array.array("Q", [0])
+            for cell in cells:
+                offsets.append(offsets[-1] + len(cell))
+            data = b"".join(cells)
+            sections[name] = [cursor, cursor + 8 * len(offsets)]
+            blocks.append((cursor, offsets.tobytes() + data))
+            cursor = _align(cursor + 8 * len(offsets) + len(data))
+        for name in index_columns:
+            cells = values[columns.index(name)]
+            permutation = array.array("I", sorted(range(n_rows), key=cells.__getitem__))
+            indexes[name] = cursor
+            blocks.append((cursor, permutation.tobytes()))
+            cursor = _align(cursor + 4 * n_rows)
+
+        header = {
+            "format": FORMAT_VERSION,
+            "byteorder": sys.byteorder,
+            "columns": columns,
+            "rows": n_rows,
+            "version": digest.hexdigest(),
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "sections": sections,
+            "indexes": indexes,
+        }
+        # Section offsets are relative to the end of the header, fix them once its size is known
+        base = _align(16 + len(json.dumps(header).encode("utf-8")))
+        while True:
+            header["sections"] = {k: [v[0] + base, v[1] + base] for k, v in sections.items()}
+            header["indexes"] = {k: v + base for k, v in indexes.items()}
+            encoded = json.dumps(header).encode("utf-8")
+            if 16 + len(encoded) <= base:
+                break
+            base = _align(16 + len(encoded))
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC)
+            f.write(len(encoded).to_bytes(8, "little"))
+            f.write(encoded)
+            for at, block in blocks:
+                f.seek(base + at)
+                f.write(block)
+        os.replace(tmp_path, path)
+        return path
+    except Exception as e:
+        raise Exception(f"Error writing snapshot {path}: {e}")
+
+def writeSnapshotFromCsv(csv_path: str, index_columns: Sequence[str] = (),
+                         snapshot_path: Optional[str] = None) -> str:
+    """
+    Build the snapshot of a CSV file.
+
+    The CSV is read back as text, so the snapshot holds exactly what the sync
+    script wrote (no float or NaN conversions).
+
+    Args:
+        csv_path (str): Path to the CSV file.
+        index_columns (Sequence[str]): Columns to index for key lookups.
+        snapshot_path (Optional[str]): Destination. Defaults to snapshotPath(csv_path).
+
+    Returns:
+        str: The snapshot path.
+    """
+    snapshot_path = snapshot_path or snapshotPath(csv_path)
+    with open(csv_path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        columns = next(reader)
+        rows = [row + [""] * (len(columns) - len(row)) for row in reader if row]
+    return writeSnapshot(snapshot_path, columns, (row[:len(columns)] for row in rows), index_columns)
+
+def loadSnapshot(csv_path: str) -> Optional[Snapshot]:
+    """
+    Get the process-wide snapshot of a CSV file.
+
+    The mapped snapshot is cached per process and re-opened when the sync scripts
+    replace it. A snapshot older than its CSV (e.g. the CSV was edited by hand) is
+    ignored, so callers can fall back to reading the CSV.
+
+    Args:
+        csv_path (str): Path to the CSV file.
+
+    Returns:
+        Optional[Snapshot]: The snapshot, or None if it doesn't exist, is stale or unreadable.
+    """
+    path = snapshotPath(csv_path)
+    try:
+        stat = os.stat(path)
+        if os.path.exists(csv_path) and os.stat(csv_path).st_mtime_ns > stat.st_mtime_ns:
+            return None
+    except OSError:
+        return None
+
+    key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    with _cache_lock:
+        snapshot = _cache.get(path)
+        if snapshot is None or snapshot._key != key:
+            try:
+                snapshot = Snapshot(path)
+            except Exception as e:
+                print(f"Error opening snapshot {path}: {e}")
+                return None
+            snapshot._key = key
+            _cache[path] = snapshot
+        return snapshot
+
+def tableVersion(csv_path: str) -> str:
+    """
+    Get the version of a table, which changes whenever its data changes.
+
+    Args:
+        csv_path (str): Path to the CSV file.
+
+    Returns:
+        str: Content hash of the up to date snapshot, or the modification time and size
+            of the CSV when there is none ("" if the file doesn't exist).
+    """
+    snapshot = loadSnapshot(csv_path)
+    if snapshot is not None:
+        return snapshot.version
+    try:
+        stat = os.stat(csv_path)
+    except OSError:
+        return ""
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
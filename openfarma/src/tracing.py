@@ -0,0 +1,451 @@
+"""
+Per-turn tracing: nested, timed spans of a chat turn exported in the background.
+
+A turn is a trace. Its spans follow the work of the turn: the input message, the
+active-run checks, the streamed run, every tool call with its sub-steps (embedding,
+vector query, stock and image joins, context composition), the tool-output submission
+and the final render. Every span carries the store_id and thread_id of its trace, so
+a complaint about a slow answer can be looked up by store and conversation.
+
+Spans are queued in memory and handed to the exporters by a background worker, so a
+turn never waits on a file or the network. Nothing is recorded when no exporter is
+configured (TRACING_EXPORTERS empty).
+
+Key Components:
+- Span: A timed operation with attributes, nested in its parent.
+- Tracer: Creates spans (the current one is kept in a context variable, per thread)
+  and exports the finished ones in batches.
+- JsonLinesExporter: One JSON object per span in a local, size-rotated file.
+- OtlpHttpExporter: OTLP/HTTP (JSON encoding) to an OpenTelemetry collector.
+- PrometheusExporter: Span duration histograms per span name and store, served as
+  Prometheus text on /metrics.
+- getTracer / span / currentSpan / newTraceId: Process-wide tracer and helpers.
+- registerMetrics: Extra metrics served by the prometheus exporter.
+
+Typical Usage:
+    >>> with span("chat.turn", store_id="12", thread_id=thread.thread_id):
+    ...     with span("tool.call", tool="buscar_productos"):
+    ...         output = handler(**arguments)
+
+    $ python openfarma/run/trace-report.py --store 12 --last 5
+"""
+
+import os
+import json
+import time
+import atexit
+import threading
+import contextvars
+import urllib.request
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+from .params import (
+    TRACING_EXPORTERS,
+    TRACING_PATH,
+    TRACING_MAX_BYTES,
+    TRACING_OTLP_ENDPOINT,
+    TRACING_PROMETHEUS_PORT,
+    TRACING_PROMETHEUS_HOST,
+    TRACING_FLUSH_INTERVAL,
+    TRACING_SERVICE_NAME
+)
+
+# Attributes copied from a span to its children
+INHERITED_ATTRIBUTES = ("store_id", "thread_id")
+
+# Upper bounds (seconds) of the Prometheus duration histogram
+HISTOGRAM_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Functions returning extra Prometheus lines (e.g. the rate limiter queues), see registerMetrics
+_metric_collectors: List[Callable[[], List[str]]] = []
+
+def registerMetrics(collector: Callable[[], List[str]]) -> None:
+    """Add the lines returned by `collector` to the /metrics endpoint of the prometheus exporter."""
+    _metric_collectors.append(collector)
+
+def newTraceId() -> str:
+    """Random trace id (32 hex characters, as in OpenTelemetry)."""
+    return os.urandom(16).hex()
+
+@dataclass
+class Span:
+    """
+    A timed operation of a trace.
+
+    Attributes:
+        name (str): Operation name (e.g. "tool.call").
+        trace_id (str): Trace (turn) the span belongs to.
+        span_id (str): Span id (16 hex characters).
+        parent_id (str, optional): Id of the enclosing span, None for the root.
+        start_ns (int): Start, in nanoseconds since the epoch.
+        end_ns (int): End, in nanoseconds since the epoch (0 while open).
+        attributes (Dict[str, Any]): store_id, thread_id and operation details.
+        error (str, optional): Error raised inside the span.
+    """
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    start_ns: int = 0
+    end_ns: int = 0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        """Duration in seconds (up to now while the span is open)."""
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def setAttribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def addToAttribute(self, key: str, value: float) -> None:
+        """Accumulate a numeric attribute (e.g. render time over many deltas)."""
+        self.attributes[key] = self.attributes.get(key, 0) + value
+
+    def toDict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+class JsonLinesExporter:
+    """Writes spans as JSON lines to a local file, rotated to `<path>.1` above max_bytes."""
+
+    def __init__(self, path: str = TRACING_PATH, max_bytes: int = TRACING_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+
+    def export(self, spans: List[Span]) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+            os.replace(self.path, self.path + ".1")
+        with open(self.path, "a", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps(span.toDict(), ensure_ascii=False, default=str) + "\n")
+
+    def close(self) -> None:
+        pass
+
+class OtlpHttpExporter:
+    """
+    Sends spans to an OpenTelemetry collector with OTLP/HTTP, JSON encoding. A batch the
+    collector doesn't accept is dropped (tracing never retries at the cost of the app).
+    """
+
+    def __init__(self, endpoint: str = TRACING_OTLP_ENDPOINT, service_name: str = TRACING_SERVICE_NAME,
+                 timeout: float = 5):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+
+    @staticmethod
+    def _value(value: Any) -> Dict[str, Any]:
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        return {"stringValue": str(value)}
+
+    def _attributes(self, attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [{"key": key, "value": self._value(value)} for key, value in attributes.items() if value is not None]
+
+    def payload(self, spans: List[Span]) -> Dict[str, Any]:
+        """ExportTraceServiceRequest of a batch of spans."""
+        return {"resourceSpans": [{
+            "resource": {"attributes": self._attributes({"service.name": self.service_name})},
+            "scopeSpans": [{
+                "scope": {"name": "openfarma.tracing"},
+                "spans": [{
+                    "traceId": span.trace_id,
+                    "spanId": span.span_id,
+                    "parentSpanId": span.parent_id or "",
+                    "name": span.name,
+                    "kind": 1,  # SPAN_KIND_INTERNAL
+                    "startTimeUnixNano": str(span.start_ns),
+                    "endTimeUnixNano": str(span.end_ns),
+                    "attributes": self._attributes(span.attributes),
+                    "status": {"code": 2, "message": span.error} if span.error else {"code": 1}
+                } for span in spans]
+            }]
+        }]}
+
+    def export(self, spans: List[Span]) -> None:
+        request = urllib.request.Request(
+            self.endpoint, data=json.dumps(self.payload(spans), default=str).encode(),
+            headers={"Content-Type": "application/json"}, method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+    def close(self) -> None:
+        pass
+
+class PrometheusExporter:
+    """
+    Aggregates span durations in histograms (labels: span, store_id) and counts the
+    spans with errors, served in the Prometheus text format on /metrics.
+    """
+
+    def __init__(self, port: Optional[int] = TRACING_PROMETHEUS_PORT, buckets: Sequence[float] = HISTOGRAM_BUCKETS,
+                 host: str = TRACING_PROMETHEUS_HOST):
+        self.buckets = tuple(buckets)
+        self._histograms: Dict[tuple, List[float]] = {}  # labels -> bucket counts, count, sum
+        self._errors: Dict[tuple, int] = {}
+        self._lock = threading.Lock()
+        self._server = None
+        if port is not None:
+            self._serve(port, host)
+
+    def export(self, spans: List[Span]) -> None:
+        with self._lock:
+            for span in spans:
+                labels = (span.name, str(span.attributes.get("store_id", "")))
+                values = self._histograms.setdefault(labels, [0.0] * (len(self.buckets) + 2))
+                duration = span.duration
+                for i, bound in enumerate(self.buckets):
+                    if duration <= bound:
+                        values[i] += 1
+                values[-2] += 1
+                values[-1] += duration
+                if span.error:
+                    self._errors[labels] = self._errors.get(labels, 0) + 1
+
+    def render(self) -> str:
+        """Metrics in the Prometheus text exposition format."""
+        lines = [
+            "# HELP openfarma_span_duration_seconds Duration of the spans of the chat turns.",
+            "# TYPE openfarma_span_duration_seconds histogram"
+        ]
+        with self._lock:
+            for (name, store), values in sorted(self._histograms.items()):
+                labels = f'span="{name}",store_id="{store}"'
+                for bound, count in zip(self.buckets, values):
+                    lines.append(f'openfarma_span_duration_seconds_bucket{{{labels},le="{bound}"}} {count:.0f}')
+                lines.append(f'openfarma_span_duration_seconds_bucket{{{labels},le="+Inf"}} {values[-2]:.0f}')
+                lines.append(f'openfarma_span_duration_seconds_count{{{labels}}} {values[-2]:.0f}')
+                lines.append(f'openfarma_span_duration_seconds_sum{{{labels}}} {values[-1]:.6f}')
+            lines += [
+                "# HELP openfarma_span_errors_total Spans that ended with an error.",
+                "# TYPE openfarma_span_errors_total counter"
+            ]
+            for (name, store), count in sorted(self._errors.items()):
+                lines.append(f'openfarma_span_errors_total{{span="{name}",store_id="{store}"}} {count}')
+        for collector in _metric_collectors:
+            try:
+                lines += collector()
+            except Exception as e:
+                print(f"Error collecting metrics: {str(e)}")
+        return "\n".join(lines) + "\n"
+
+    def _serve(self, port: int, host: str = TRACING_PROMETHEUS_HOST) -> None:
+        """Serve /metrics on a local interface in a daemon thread. A port already taken is reported, not raised."""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                data = exporter.render().encode()
+                self.send_response(200 if self.path.startswith("/metrics") else 404)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        try:
+            self._server = ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            print(f"Error starting the metrics endpoint on port {port}: {str(e)}")
+            return
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="tracing-metrics", daemon=True).start()
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+
+class _NoSpan:
+    """Span context used when tracing is disabled."""
+    def __enter__(self):
+        return _DISCARDED
+
+    def __exit__(self, *exc):
+        return False
+
+class _DiscardedSpan(Span):
+    """Span handed out when there is nothing to record: attributes set on it are dropped."""
+    def setAttribute(self, key: str, value: Any) -> None:
+        pass
+
+    def addToAttribute(self, key: str, value: float) -> None:
+        pass
+
+_DISCARDED = _DiscardedSpan(name="", trace_id="", span_id="")
+_NO_SPAN = _NoSpan()
+
+class Tracer:
+    """
+    Creates spans and exports them in the background.
+
+    Attributes:
+        exporters (list): Objects with `export(spans)` and `close()`.
+        enabled (bool): False when there are no exporters (spans are not recorded).
+    """
+
+    def __init__(self, exporters: Optional[list] = None, flush_interval: float = TRACING_FLUSH_INTERVAL):
+        """
+        Args:
+            exporters (list, optional): Exporters of the finished spans.
+            flush_interval (float): Seconds between exports.
+        """
+        self.exporters = list(exporters or [])
+        self.enabled = bool(self.exporters)
+        self.flush_interval = flush_interval
+        self._current: contextvars.ContextVar = contextvars.ContextVar("openfarma_span", default=None)
+        self._finished: List[Span] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        if self.enabled:
+            atexit.register(self.close)
+
+    def current(self) -> Optional[Span]:
+        """Span open in the current thread, if any."""
+        return self._current.get()
+
+    def span(self, name: str, trace_id: Optional[str] = None, **attributes):
+        """
+        Open a span, child of the current one.
+
+        Args:
+            name (str): Operation name.
+            trace_id (str, optional): Trace of a root span (e.g. to join the input and
+                the answer of a turn, which run in different reruns). New if omitted.
+            **attributes: Span attributes (store_id, thread_id, tool...).
+
+        Returns:
+            A context manager yielding the Span. An error raised inside is recorded in
+            the span and propagated.
+        """
+        if not self.enabled:
+            return _NO_SPAN
+        return self._span(name, trace_id, attributes)
+
+    @contextmanager
+    def _span(self, name: str, trace_id: Optional[str], attributes: Dict[str, Any]) -> Iterator[Span]:
+        parent = self._current.get()
+        if parent is not None:
+            inherited = {key: parent.attributes[key] for key in INHERITED_ATTRIBUTES if key in parent.attributes}
+            attributes = {**inherited, **attributes}
+        span = Span(
+            name=name,
+            trace_id=parent.trace_id if parent is not None else (trace_id or newTraceId()),
+            span_id=os.urandom(8).hex(),
+            parent_id=parent.span_id if parent is not None else None,
+            start_ns=time.time_ns(),
+            attributes={key: value for key, value in attributes.items() if value is not None}
+        )
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {str(e)}"
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            self._current.reset(token)
+            self._finish(span)
+
+    def _finish(self, span: Span) -> None:
+        with self._lock:
+            self._finished.append(span)
+        if span.parent_id is None:
+            self._ensureWorker()
+
+    def flush(self) -> int:
+        """
+        Export the finished spans now.
+
+        Returns:
+            int: Number of spans exported.
+        """
+        with self._lock:
+            spans, self._finished = self._finished, []
+        if not spans:
+            return 0
+        for exporter in self.exporters:
+            try:
+                exporter.export(spans)
+            except Exception as e:
+                print(f"Error exporting spans with {type(exporter).__name__}: {str(e)}")
+        return len(spans)
+
+    def close(self) -> None:
+        """Export what is left and close the exporters (called when the process exits)."""
+        self.flush()
+        for exporter in self.exporters:
+            exporter.close()
+
+    def _ensureWorker(self) -> None:
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="tracing-export", daemon=True)
+                self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(timeout=self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+def createExporter(name: str):
+    """Exporter for a TRACING_EXPORTERS entry: "file", "otlp" or "prometheus"."""
+    if name == "file":
+        return JsonLinesExporter()
+    if name == "otlp":
+        return OtlpHttpExporter()
+    if name == "prometheus":
+        return PrometheusExporter()
+    raise ValueError(f"Unknown tracing exporter: {name}")
+
+def getTracer() -> Tracer:
+    """Get the process-wide tracer, configured by TRACING_EXPORTERS."""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = Tracer([createExporter(name) for name in TRACING_EXPORTERS])
+    return _tracer
+
+def setTracer(tracer: Tracer) -> None:
+    """Replace the process-wide tracer (e.g. a benchmark exporting to its own file)."""
+    global _tracer
+    with _tracer_lock:
+        _tracer = tracer
+
+def span(name: str, trace_id: Optional[str] = None, **attributes):
+    """Open a span with the process-wide tracer. See Tracer.span."""
+    return getTracer().span(name, trace_id, **attributes)
+
+def currentSpan() -> Span:
+    """Span open in the current thread (a discarded one when there is none)."""
+    return getTracer().current() or _DISCARDED
@@ -1,94 +1,198 @@
+import os
 import json
-import gspread
+import time
+import atexit
+import threading
 import streamlit as st
-from datetime import datetime, timedelta
-from typing import Dict
-from google.oauth2.service_account import Credentials
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 from openfarma.src.params import (
     PROMPT_TRACKING_SHEET_ID,
     PROMPT_TRACKING_INTERVAL_MINUTES,
+    PROMPT_TRACKING_SPOOL_PATH,
     CREDENTIALS_PATH,
     SCOPES
 )
 
-class PromptTracker:
+class UsageAggregator:
     """
-    Tracks and reports prompt usage per session.
+    Process-wide prompt usage aggregator.
+
+    Counts are accumulated in memory per store and flushed to the Google Sheet by a
+    background worker every PROMPT_TRACKING_INTERVAL_MINUTES, with a single
+    `append_rows` call for every store (logouts don't trigger uploads). Rows are written to a local spool
+    file before being sent and are only removed once the sheet accepted them, so a
+    Sheets outage or a process restart doesn't lose counts.
     """
-    
-    def __init__(self) -> None:
-        """Initialize the prompt tracker."""
-        self._initializeSessionState()
-        
-    def _initializeSessionState(self) -> None:
-        """Initialize session state variables for tracking."""
-        if 'prompt_count' not in st.session_state:
-            st.session_state.prompt_count = 0
-        if 'last_prompt_report' not in st.session_state:
-            st.session_state.last_prompt_report = datetime.now()
-            
-    def incrementPromptCount(self) -> None:
-        """Increment the prompt counter and check if reporting is needed."""
-        st.session_state.prompt_count += 1
-        self._checkAndReport()
-        
-    def _checkAndReport(self) -> None:
-        """Check if it's time to report based on time interval."""
-        current_time = datetime.now()
-        time_elapsed = current_time - st.session_state.last_prompt_report
-        
-        if time_elapsed >= timedelta(minutes=PROMPT_TRACKING_INTERVAL_MINUTES):
-            self.reportPrompts()
-            
-    def reportPrompts(self) -> None:
-        """Report current prompt count to Google Sheet and reset counter."""
-        if st.session_state.prompt_count > 0:
-            try:
-                data = {
-                    'store_id': st.session_state.store_id,
-                    'store_name': st.session_state.store_name,
-                    'since_datetime': st.session_state.last_prompt_report.strftime('%Y-%m-%d %H:%M:%S'),
-                    'to_datetime': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                    'number_of_prompts': st.session_state.prompt_count
-                }
-                
-                self._saveToGoogleSheet(data)
-                
-                # Reset counter and update last report time
-                st.session_state.prompt_count = 0
-                st.session_state.last_prompt_report = datetime.now()
-                
-            except Exception as e:
-                st.error(f"Error al reportar prompts: {str(e)}")
-    
-    def _saveToGoogleSheet(self, data: Dict) -> None:
+
+    def __init__(self, interval_minutes: int = PROMPT_TRACKING_INTERVAL_MINUTES,
+                 spool_path: str = PROMPT_TRACKING_SPOOL_PATH) -> None:
         """
-        Save prompt tracking data to Google Sheet.
-        
+        Initialize the aggregator.
+
         Args:
-            data: Dictionary containing tracking data
+            interval_minutes: Minutes between automatic flushes
+            spool_path: Path of the spool file (JSON lines) for rows pending upload
+        """
+        self.interval = interval_minutes * 60
+        self.spool_path = spool_path
+        self._counts: Dict[Tuple[str, str], Dict] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._worksheet = None
+        atexit.register(self._shutdown)
+
+    def increment(self, store_id: str, store_name: str, count: int = 1) -> None:
         """
-        try:
+        Add prompts to a store counter. Never blocks on the network.
+
+        Args:
+            store_id: Store identifier
+            store_name: Store name
+            count: Number of prompts to add
+        """
+        with self._lock:
+            entry = self._counts.setdefault(
+                (str(store_id), str(store_name)),
+                {'since': datetime.now(), 'count': 0}
+            )
+            entry['count'] += count
+        self._ensureWorker()
+
+    def flush(self) -> int:
+        """
+        Upload the pending rows to the Google Sheet.
+
+        Returns:
+            Number of rows uploaded. 0 if there was nothing to send or the upload
+            failed (the rows stay in the spool file for the next attempt).
+        """
+        with self._flush_lock:
+            self._spoolPending()
+            rows = self._readSpool()
+            if not rows:
+                return 0
+            try:
+                self._getWorksheet().append_rows(rows, value_input_option='RAW')
+            except Exception as e:
+                self._worksheet = None  # Re-authorize on the next attempt
+                print(f"Error reporting prompts, {len(rows)} rows kept in spool: {str(e)}")
+                return 0
+            self._clearSpool(len(rows))
+            return len(rows)
+
+    def _shutdown(self) -> None:
+        """Keep the in-memory counts in the spool file when the process exits."""
+        if self._flush_lock.acquire(timeout=5):
+            try:
+                self._spoolPending()
+            finally:
+                self._flush_lock.release()
+
+    def _drain(self) -> List[List]:
+        """Take the in-memory counts as sheet rows and reset them."""
+        with self._lock:
+            counts, self._counts = self._counts, {}
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        return [
+            [store_id, store_name, entry['since'].strftime('%Y-%m-%d %H:%M:%S'), now, entry['count']]
+            for (store_id, store_name), entry in counts.items()
+            if entry['count'] > 0
+        ]
+
+    def _spoolPending(self) -> None:
+        """Move the in-memory counts to the spool file."""
+        rows = self._drain()
+        if not rows:
+            return
+        os.makedirs(os.path.dirname(self.spool_path), exist_ok=True)
+        with open(self.spool_path, 'a', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(row) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _readSpool(self) -> List[List]:
+        """Read the rows pending upload."""
+        if not os.path.exists(self.spool_path):
+            return []
+        with open(self.spool_path, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _clearSpool(self, uploaded: int) -> None:
+        """Remove the first `uploaded` rows from the spool file."""
+        remaining = self._readSpool()[uploaded:]
+        tmp_path = f"{self.spool_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for row in remaining:
+                f.write(json.dumps(row) + '\n')
+        os.replace(tmp_path, self.spool_path)
+
+    def _ensureWorker(self) -> None:
+        """Start the background worker if it's not running."""
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="prompt-usage", daemon=True)
+                self._worker.start()
+
+    def _run(self) -> None:
+        """Flush periodically."""
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def _getWorksheet(self):
+        """Get the tracking worksheet, authorizing the gspread client once."""
+        if self._worksheet is None:
+            # Imported here: only the background worker talks to Google Sheets
+            import gspread
+            from google.oauth2.service_account import Credentials
+
             # Authenticate with service account
             credentials = json.loads(st.secrets["credentials"]["json"])
             with open(CREDENTIALS_PATH, "w") as json_file:
                 json.dump(credentials, json_file, indent=4)
             credentials = Credentials.from_service_account_file(CREDENTIALS_PATH, scopes=SCOPES)
 
-            # Create gspread client with credentials
+            # Create gspread client with credentials and open the sheet
             gc = gspread.authorize(credentials)
-            
-            # Open the sheet
-            sheet = gc.open_by_key(PROMPT_TRACKING_SHEET_ID).sheet1
-            
-            # Append new row
-            sheet.append_row([
-                data['store_id'],
-                data['store_name'],
-                data['since_datetime'],
-                data['to_datetime'],
-                data['number_of_prompts']
-            ])
-            
-        except Exception as e:
-            raise Exception(f"Error saving to Google Sheet: {str(e)}")
\ No newline at end of file
+            self._worksheet = gc.open_by_key(PROMPT_TRACKING_SHEET_ID).sheet1
+        return self._worksheet
+
+_usage_aggregator: Optional[UsageAggregator] = None
+_usage_aggregator_lock = threading.Lock()
+
+def getUsageAggregator() -> UsageAggregator:
+    """Get the process-wide usage aggregator."""
+    global _usage_aggregator
+    with _usage_aggregator_lock:
+        if _usage_aggregator is None:
+            _usage_aggregator = UsageAggregator()
+        return _usage_aggregator
+
+class PromptTracker:
+    """
+    Tracks and reports prompt usage per session.
+
+    Counts are handed to the process-wide UsageAggregator, so tracking never
+    waits on Google Sheets during a chat turn or a logout.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the prompt tracker."""
+        self.aggregator = getUsageAggregator()
+
+    def incrementPromptCount(self) -> None:
+        """Increment the prompt counter of the session store."""
+        self.aggregator.increment(st.session_state.store_id, st.session_state.store_name)
+
+    def reportPrompts(self) -> None:
+        """
+        Report the prompts of the session (on logout).
+
+        The counts are already with the aggregator: they are uploaded with the next
+        periodic batch, or spooled if the process exits first, so nothing is sent here.
+        """
@@ -0,0 +1,311 @@
+"""
+This module provides a conversation engine on the Chat Completions API with the same
+interface as Thread, so Chat can use either one.
+
+The Assistants engine (Thread) keeps the conversation in an OpenAI thread: every turn
+posts the message, checks the runs of the thread, streams a run and streams its
+continuation after submitting the tool outputs. This engine keeps the history in
+memory and sends it with each request: a turn is one streamed completion, plus one
+more per round of tool calls, which are executed in-process.
+
+Key Components:
+- loadAssistantDefinition: Model, instructions, sampling and tools of the assistant,
+  from the same files the OpenAI assistant is built from (assistant.json, fc.json).
+- CompletionsThread: Local conversation with addMessage(), runWithStreaming(),
+  isRunActive(), compact(), retrieveLastMessage() and delete(), like Thread.
+
+Typical Usage:
+    >>> thread = CompletionsThread(api_key, truncation_messages=12)
+    >>> thread.addMessage("¿Tienen protector solar para niños?")
+    >>> result = thread.runWithStreaming(assistant_id, tool_handlers)
+    >>> print(result.text, result.usage)
+
+Runs, tool calls and continuation requests are traced with the same span names as
+Thread ("run", "tool.call", "tool.submit"), so both engines can be compared in the
+trace report.
+"""
+import time
+import json
+import uuid
+import openai
+from functools import lru_cache
+from typing import List, Optional
+
+from .thread import RunResult, ToolCallRecord, StreamedMessage
+from openfarma.src.params import ASSISTANT_CONFIG_PATH, FC_CONFIG_PATH, COMPLETIONS_MAX_TOOL_ROUNDS
+from openfarma.src.tracing import span
+from openfarma.src.ratelimit import getHttpClient
+
+@lru_cache(maxsize=None)
+def loadAssistantDefinition(assistant_path: str = ASSISTANT_CONFIG_PATH, tools_path: str = FC_CONFIG_PATH) -> dict:
+    """
+    Read the assistant definition used to build the OpenAI assistant.
+
+    Args:
+        assistant_path (str): Assistant configuration (name, instructions, model, temperature, top_p).
+        tools_path (str): Function definitions of the tools.
+
+    Returns:
+        dict: model, instructions, temperature, top_p and tools (in Chat Completions format).
+
+    Raises:
+        Exception: If the files can't be read.
+    """
+    try:
+        with open(assistant_path, 'r', encoding='utf-8') as f:
+            assistant = json.load(f)
+        with open(tools_path, 'r', encoding='utf-8') as f:
+            functions = json.load(f)
+    except Exception as e:
+        raise Exception(f"Error loading assistant definition: {str(e)}")
+
+    instructions = assistant['instructions']
+    return {
+        "model": assistant.get('model', 'gpt-4o'),
+        "instructions": "".join(instructions) if isinstance(instructions, list) else instructions,
+        "temperature": assistant.get('temperature'),
+        "top_p": assistant.get('top_p'),
+        "tools": [{"type": "function", "function": function} for function in functions]
+    }
+
+class CompletionsThread:
+    """
+    Conversation kept in memory and answered with streamed chat completions.
+
+    Drop-in alternative to Thread for Chat: same constructor arguments and the same
+    methods used by the chat (messages, streaming runs with tool handlers, run checks,
+    compaction, last message, deletion). Creating it makes no request.
+
+    Attributes:
+        api_key (str): OpenAI API key.
+        client (openai.OpenAI): Client of the completions (also used for summaries).
+        thread_id (str): Local id of the conversation (for tracing and usage records).
+        history (List[dict]): User and assistant messages ({"role", "content"}), oldest first.
+        truncation_messages (int, optional): Last messages sent with each request.
+        definition (dict): Model, instructions, sampling and tools of the assistant.
+    """
+
+    def __init__(self, api_key: str, truncation_messages: Optional[int] = None,
+                 initial_messages: Optional[List[dict]] = None, definition: Optional[dict] = None):
+        """
+        Args:
+            api_key (str): OpenAI API key.
+            truncation_messages (int, optional): Last messages sent with each request
+                (like the truncation strategy of the runs). All of them if None.
+            initial_messages (List[dict], optional): Messages the conversation starts with
+                ({"role", "content"}), e.g. the welcome message.
+            definition (dict, optional): Assistant definition; loadAssistantDefinition() if None.
+        """
+        self.api_key = api_key
+        self.client = openai.OpenAI(api_key=api_key, http_client=getHttpClient())  # Scheduled by the shared rate limiter
+        self.thread_id = f"local_{uuid.uuid4().hex[:24]}"
+        self.truncation_messages = truncation_messages
+        self.definition = definition or loadAssistantDefinition()
+        self.history: List[dict] = [
+            {"role": message["role"], "content": message["content"]} for message in initial_messages or []
+        ]
+        self._active = False
+
+    def addMessage(self, content: str, role: str = "user", metadata: dict = None) -> dict:
+        """
+        Add a message to the conversation (no request is made).
+
+        Args:
+            content (str): Message text.
+            role (str): "user" or "assistant".
+            metadata (dict, optional): Ignored, accepted for compatibility with Thread.
+
+        Returns:
+            dict: The message (id, role, content).
+        """
+        self.history.append({"role": role, "content": content})
+        return {"id": f"msg_{len(self.history)}", "role": role, "content": content}
+
+    def isRunActive(self) -> bool:
+        """True while a run of this conversation is streaming (no request is made)."""
+        return self._active
+
+    def compact(self, summary: str, recent_messages: List[tuple]) -> str:
+        """
+        Replace the conversation with a summary of it plus its most recent messages.
+
+        Args:
+            summary (str): Summary of the messages left out.
+            recent_messages (List[tuple]): (content, role) pairs kept verbatim, oldest first.
+
+        Returns:
+            str: ID of the conversation (unchanged, the history is local).
+        """
+        self.history = [{"role": "assistant", "content": f"Resumen de la conversación anterior:\n{summary}"}]
+        self.history += [{"role": role, "content": content} for content, role in recent_messages if content]
+        return self.thread_id
+
+    def retrieveLastMessage(self) -> dict:
+        """Last message of the conversation, in the format of Thread.retrieveLastMessage."""
+        if not self.history:
+            return {"content": [{"text": {"value": "No messages found"}}], "role": "assistant"}
+        message = self.history[-1]
+        return {"content": [{"text": {"value": message["content"]}}], "role": message["role"]}
+
+    def listMessages(self, limit: int = 20, order: str = "desc") -> list:
+        """Messages of the conversation (newest first with order="desc")."""
+        messages = self.history[::-1] if order == "desc" else self.history
+        return messages[:limit]
+
+    def delete(self) -> dict:
+        """Discard the conversation."""
+        self.history = []
+        return {"id": self.thread_id, "deleted": True}
+
+    def _requestMessages(self) -> List[dict]:
+        """Instructions followed by the messages the model reads (the last truncation_messages)."""
+        history = self.history[-self.truncation_messages:] if self.truncation_messages else self.history
+        return [{"role": "system", "content": self.definition["instructions"]}] + list(history)
+
+    def _streamCompletion(self, messages: List[dict], stream: StreamedMessage, result: RunResult,
+                          tools: bool = True) -> List[dict]:
+        """
+        Stream one completion: text deltas are rendered, usage is added to the result.
+
+        Args:
+            messages (List[dict]): Request messages.
+            stream (StreamedMessage): Message the text deltas are rendered in.
+            result (RunResult): Result of the run being filled.
+            tools (bool): Offer the tools (False forces a text answer).
+
+        Returns:
+            List[dict]: Tool calls requested by the model (id, name, arguments), in order.
+        """
+        options = {
+            key: self.definition[key] for key in ("temperature", "top_p") if self.definition.get(key) is not None
+        }
+        if self.definition["tools"]:
+            options["tools"] = self.definition["tools"]
+            if not tools:
+                options["tool_choice"] = "none"
+
+        response = self.client.chat.completions.create(
+            model=self.definition["model"],
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+            **options
+        )
+        text, calls, finish_reason = "", {}, None
+        for chunk in response:
+            result.run_id = result.run_id or chunk.id
+            result.model = chunk.model or result.model
+            if chunk.usage:
+                for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+                    result.usage[key] = result.usage.get(key, 0) + getattr(chunk.usage, key)
+                result.context_tokens = chunk.usage.prompt_tokens
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            if choice.delta.content:
+                text += choice.delta.content
+                stream.append(choice.delta.content)
+            for call in choice.delta.tool_calls or []:
+                entry = calls.setdefault(call.index, {"id": "", "name": "", "arguments": ""})
+                entry["id"] = call.id or entry["id"]
+                if call.function:
+                    entry["name"] += call.function.name or ""
+                    entry["arguments"] += call.function.arguments or ""
+            finish_reason = choice.finish_reason or finish_reason
+
+        if text:
+            result.messages.append(text)
+        result.status = "incomplete" if finish_reason in ("length", "content_filter") else "completed"
+        return [calls[index] for index in sorted(calls)]
+
+    def handleToolCalls(self, tool_calls: List[dict], tool_handlers: dict, result: RunResult) -> List[dict]:
+        """
+        Execute the requested tool calls in-process.
+
+        Args:
+            tool_calls (List[dict]): Tool calls (id, name, arguments as JSON).
+            tool_handlers (dict): Function name to handler.
+            result (RunResult): Result whose tool-call log is filled.
+
+        Returns:
+            List[dict]: Tool messages with the outputs, in the order of the calls. Calls
+                without a handler get an error output, so the model can answer anyway.
+        """
+        outputs = []
+        for tool in tool_calls:
+            output = f"Error: la función {tool['name']} no está disponible."
+            if tool["name"] in tool_handlers:
+                arguments = json.loads(tool["arguments"] or "{}")
+                handler = tool_handlers[tool["name"]]
+                start = time.perf_counter()
+                with span("tool.call", tool=tool["name"], call_id=tool["id"]) as call:
+                    output = str(handler(**arguments))
+                    call.setAttribute("output_chars", len(output))
+                result.tool_calls.append(ToolCallRecord(
+                    call_id=tool["id"],
+                    name=tool["name"],
+                    arguments=arguments,
+                    output_chars=len(output),
+                    elapsed=time.perf_counter() - start,
+                    output=output
+                ))
+            outputs.append({"role": "tool", "tool_call_id": tool["id"], "content": output})
+        return outputs
+
+    def submitToolOutputs(self, messages: List[dict], stream: StreamedMessage, result: RunResult,
+                          tools: bool = True) -> List[dict]:
+        """Continue the run with the tool outputs (last messages) in a new completion."""
+        with span("tool.submit", outputs=sum(1 for message in messages if message["role"] == "tool")):
+            return self._streamCompletion(messages, stream, result, tools)
+
+    def runWithStreaming(self, assistant_id: str, tool_handlers: dict) -> RunResult:
+        """
+        Answer the conversation with streamed completions, running the tool loop in-process.
+
+        Args:
+            assistant_id (str): Accepted for compatibility with Thread (recorded in the
+                trace); the assistant definition comes from the local configuration.
+            tool_handlers (dict): Dictionary mapping function names to their handler functions.
+
+        Returns:
+            RunResult: Final text, completion id, model, usage (summed over the requests)
+                and tool-call log. The answer is added to the history.
+
+        Raises:
+            Exception: If a request or a tool handler fails.
+
+        Note:
+            After COMPLETIONS_MAX_TOOL_ROUNDS rounds of tool calls the model is asked to
+            answer without tools.
+        """
+        result = RunResult()
+        stream = StreamedMessage()
+        messages = self._requestMessages()
+        self._active = True
+        try:
+            with span("run", thread_id=self.thread_id, assistant_id=assistant_id) as run:
+                tool_calls = self._streamCompletion(messages, stream, result)
+                rounds = 0
+                while tool_calls:
+                    rounds += 1
+                    messages.append({"role": "assistant", "content": None, "tool_calls": [
+                        {"id": tool["id"], "type": "function",
+                         "function": {"name": tool["name"], "arguments": tool["arguments"]}}
+                        for tool in tool_calls
+                    ]})
+                    messages += self.handleToolCalls(tool_calls, tool_handlers, result)
+                    tool_calls = self.submitToolOutputs(messages, stream, result,
+                                                        tools=rounds < COMPLETIONS_MAX_TOOL_ROUNDS)
+                run.setAttribute("run_id", result.run_id)
+                run.setAttribute("status", result.status)
+                run.setAttribute("tool_calls", len(result.tool_calls))
+                for key, value in result.usage.items():
+                    run.setAttribute(key, value)
+        except Exception as e:
+            raise Exception(f"Error in streaming run: {str(e)}")
+        finally:
+            self._active = False
+
+        if result.text:
+            self.history.append({"role": "assistant", "content": result.text})
+        return result
@@ -0,0 +1,166 @@
+"""
+This module keeps a warm pool of conversation threads, created ahead of time in the
+background, so a chat session starts without waiting for the OpenAI API.
+
+Key Components:
+- ThreadPool: Process-wide pool of ready-to-use Thread instances (welcome message
+  included). `acquire()` hands one out immediately and asks the background worker to
+  refill the pool; threads left unused for longer than the TTL are deleted.
+- getThreadPool: Returns the shared pool for an API key and thread configuration.
+
+Typical Usage:
+    >>> pool = getThreadPool(api_key, welcome_message="Hola, ¿en qué te puedo ayudar?")
+    >>> thread = pool.acquire()   # Instant when the pool is warm
+    >>> thread.addMessage("¿Tienen protector solar?")
+"""
+import time
+import atexit
+import threading
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+from .thread import Thread
+from openfarma.src.ratelimit import requestPriority
+from openfarma.src.params import THREAD_POOL_SIZE, THREAD_POOL_TTL, THREAD_POOL_CHECK_INTERVAL
+
+class ThreadPool:
+    """
+    Pool of pre-created conversation threads.
+
+    Threads are created by a daemon worker with the welcome message already posted, so
+    taking one costs no request. When the pool is empty (cold start or a burst of
+    logins), `acquire()` creates the thread itself, as a plain Thread would.
+
+    Attributes:
+        api_key (str): OpenAI API key of the threads.
+        welcome_message (str): Assistant message every thread starts with.
+        truncation_messages (int): Truncation strategy of the threads' runs.
+        size (int): Threads kept ready.
+        ttl (float): Seconds an idle thread is kept before being replaced.
+    """
+
+    def __init__(self, api_key: str, welcome_message: Optional[str] = None,
+                 truncation_messages: Optional[int] = None, size: int = THREAD_POOL_SIZE,
+                 ttl: float = THREAD_POOL_TTL, check_interval: float = THREAD_POOL_CHECK_INTERVAL):
+        """
+        Initialize the pool and start filling it in the background.
+
+        Args:
+            api_key (str): OpenAI API key.
+            welcome_message (str, optional): Assistant message posted on every thread.
+            truncation_messages (int, optional): Passed to every Thread.
+            size (int): Threads kept ready.
+            ttl (float): Seconds an idle thread is kept before being replaced.
+            check_interval (float): Seconds between expiry checks of the worker.
+        """
+        self.api_key = api_key
+        self.welcome_message = welcome_message
+        self.truncation_messages = truncation_messages
+        self.size = size
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._threads: deque = deque()  # (created_at, Thread), oldest first
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        atexit.register(self.close)
+        self._ensureWorker()
+
+    def _create(self) -> Thread:
+        """Create a thread holding the welcome message, in a single request."""
+        initial_messages = None
+        if self.welcome_message:
+            initial_messages = [{"role": "assistant", "content": self.welcome_message}]
+        return Thread(self.api_key, truncation_messages=self.truncation_messages,
+                      initial_messages=initial_messages)
+
+    def acquire(self) -> Thread:
+        """
+        Take a ready thread from the pool.
+
+        Returns:
+            Thread: A fresh thread with the welcome message. Created on the spot when
+                the pool has no unexpired thread.
+
+        Raises:
+            Exception: If the pool is empty and the thread can't be created.
+        """
+        thread = None
+        now = time.monotonic()
+        with self._lock:
+            # Newest first: if it has expired, so have the rest (left for the worker)
+            if self._threads and now - self._threads[-1][0] < self.ttl:
+                thread = self._threads.pop()[1]
+        self._ensureWorker()
+        self._wakeup.set()
+        return thread if thread is not None else self._create()
+
+    def ready(self) -> int:
+        """Number of threads ready to be taken."""
+        with self._lock:
+            return len(self._threads)
+
+    def close(self) -> None:
+        """Delete the idle threads (called when the process exits)."""
+        with self._lock:
+            threads, self._threads = list(self._threads), deque()
+        for _, thread in threads:
+            self._delete(thread)
+
+    def _delete(self, thread: Thread) -> None:
+        """Delete a thread that was never handed out, ignoring errors."""
+        try:
+            thread.delete()
+        except Exception:
+            pass
+
+    def _expire(self) -> None:
+        """Delete the threads older than the TTL."""
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            while self._threads and now - self._threads[0][0] >= self.ttl:
+                expired.append(self._threads.popleft()[1])
+        for thread in expired:
+            self._delete(thread)
+
+    def _refill(self) -> None:
+        """Create threads until the pool is full."""
+        while self.ready() < self.size:
+            try:
+                with requestPriority("background"):  # Behind the chat turns at the rate limiter
+                    thread = self._create()
+            except Exception as e:
+                print(f"Error refilling thread pool: {str(e)}")
+                return  # Retried on the next wakeup or check
+            with self._lock:
+                self._threads.append((time.monotonic(), thread))
+
+    def _ensureWorker(self) -> None:
+        """Start the background worker if it's not running."""
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="thread-pool", daemon=True)
+                self._worker.start()
+
+    def _run(self) -> None:
+        """Expire and refill on every acquire and every check interval."""
+        while True:
+            self._expire()
+            self._refill()
+            self._wakeup.wait(timeout=self.check_interval)
+            self._wakeup.clear()
+
+_pools: Dict[Tuple, ThreadPool] = {}
+_pools_lock = threading.Lock()
+
+def getThreadPool(api_key: str, welcome_message: Optional[str] = None,
+                  truncation_messages: Optional[int] = None) -> ThreadPool:
+    """Get the process-wide pool of an API key and thread configuration."""
+    key = (api_key, welcome_message, truncation_messages)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ThreadPool(api_key, welcome_message, truncation_messages)
+        return _pools[key]
@@ -4,6 +4,9 @@ threads with the OpenAI Assistant API, including message handling, thread
 lifecycle management, and integration with Streamlit for real-time chat interfaces.
 
 Key Components:
+- RunResult: Outcome of a streaming run (final text, annotations, run id, usage and
+tool-call log), collected from the stream events.
+- StreamedMessage: Assistant message rendered in the chat while its text streams in.
 - EventHandler: Handles OpenAI Assistant events, including streaming responses 
 and tool calls, and updates the Streamlit UI in real time.
 - Thread: Manages the lifecycle of a conversation thread, including sending/queuing 
@@ -19,16 +22,121 @@ tool handler functions as needed.
 This module is designed to be extensible and robust, supporting advanced use cases such 
 as tool calling, message queuing, and real-time UI updates for chatbot applications.
 
+Run checks, messages, runs, tool calls and tool-output submissions are recorded as
+tracing spans of the current turn (see openfarma/src/tracing.py).
+
 """
 import time
 import json
 import openai
 import streamlit as st
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
 from typing_extensions import override
 from openai import AssistantEventHandler
 from collections import deque
 
 from openfarma.src.params import BOT_CHAT_COLUMNS, AVATAR_BOT_PATH
+from openfarma.src.assets import dataUri
+from openfarma.src.tracing import span, currentSpan
+from openfarma.src.ratelimit import getHttpClient
+
+# Events that close a run, carrying its final status and usage
+RUN_END_EVENTS = (
+    'thread.run.completed',
+    'thread.run.incomplete',
+    'thread.run.failed',
+    'thread.run.cancelled',
+    'thread.run.expired'
+)
+
+@dataclass
+class ToolCallRecord:
+    """
+    Entry of the tool-call log of a run.
+
+    Attributes:
+        call_id (str): Tool call ID assigned by the assistant.
+        name (str): Function name.
+        arguments (dict): Arguments the function was called with.
+        output_chars (int): Length of the output submitted back to the assistant.
+        elapsed (float): Execution time of the handler, in seconds.
+        output (str): Output submitted back to the assistant (read by the model as
+            prompt tokens, counted by the usage accounting).
+    """
+    call_id: str
+    name: str
+    arguments: dict
+    output_chars: int
+    elapsed: float
+    output: str = ""
+
+@dataclass
+class RunResult:
+    """
+    Outcome of a streaming run, collected across the initial stream and every
+    tool-output continuation, so the answer doesn't have to be fetched again.
+
+    Attributes:
+        run_id (str): ID of the run.
+        status (str): Final status of the run ("completed", "failed", "incomplete", ...).
+        messages (List[str]): Text of each assistant message created by the run.
+        annotations (List[dict]): Annotations (file citations, paths) of those messages.
+        usage (Dict[str, int]): prompt_tokens, completion_tokens and total_tokens of the run
+            (summed over every model step, tool rounds included).
+        context_tokens (int): Prompt tokens of the last model step, i.e. the size of the
+            context the model read (0 when the API didn't report the steps).
+        tool_calls (List[ToolCallRecord]): Tool calls executed during the run.
+        last_error (str): Error reported by the API when the run didn't complete.
+        model (str): Model that executed the run.
+    """
+    run_id: Optional[str] = None
+    status: Optional[str] = None
+    messages: List[str] = field(default_factory=list)
+    annotations: List[dict] = field(default_factory=list)
+    usage: Dict[str, int] = field(default_factory=dict)
+    context_tokens: int = 0
+    tool_calls: List[ToolCallRecord] = field(default_factory=list)
+    last_error: Optional[str] = None
+    model: Optional[str] = None
+
+    @property
+    def text(self) -> str:
+        """Final answer: the text of the last assistant message of the run (as retrieveLastMessage)."""
+        return self.messages[-1] if self.messages else ""
+
+class StreamedMessage:
+    """
+    Assistant message rendered in the chat as its text streams in.
+
+    The chat bubble is created with the first delta; each delta re-renders the text so
+    far. Deltas and their render time are added to the current tracing span.
+
+    Attributes:
+        text (str): Text received so far.
+    """
+    def __init__(self):
+        self.text = ""
+        self.container = None
+
+    def append(self, delta: str) -> None:
+        """Add a text delta and render the message."""
+        if self.container is None:
+            left, _ = st.columns(BOT_CHAT_COLUMNS)
+            with left:
+                with st.chat_message("assistant", avatar=dataUri(AVATAR_BOT_PATH)):
+                    self.container = st.empty()
+
+        start = time.perf_counter()
+        self.text += delta or ""
+        self.container.markdown(
+            f'<div class="chat-message bot-message">{self.text}</div>',
+            unsafe_allow_html=True
+        )
+        time.sleep(0.03)  # Small delay for smooth streaming effect
+        current = currentSpan()
+        current.addToAttribute("deltas", 1)
+        current.addToAttribute("render_ms", (time.perf_counter() - start) * 1000)
 
 class EventHandler(AssistantEventHandler):
     """
@@ -67,8 +175,9 @@ class EventHandler(AssistantEventHandler):
         tool_handlers (dict): Mapping of function names to handler functions for tool calls.
         client (openai.OpenAI): The OpenAI client instance.
         thread_instance (Thread): The parent Thread object managing the conversation.
+        result (RunResult): Result shared with the continuation handlers of the run.
     """
-    def __init__(self, tool_handlers, client, thread_instance):
+    def __init__(self, tool_handlers, client, thread_instance, result=None):
         """
         Initialize the EventHandler with tool handlers, OpenAI client, and thread reference.
 
@@ -77,6 +186,8 @@ class EventHandler(AssistantEventHandler):
                 Example: {"get_weather": weather_function, "calculate": math_function}
             client (openai.OpenAI): The OpenAI client instance for API calls.
             thread_instance (Thread): Reference to the parent Thread instance for state management.
+            result (RunResult, optional): Result to fill. Continuation handlers receive
+                the one of the initial handler, so the whole run ends up in one result.
 
         Note:
             The tool_handlers dictionary should contain callable functions that match the names
@@ -87,9 +198,8 @@ class EventHandler(AssistantEventHandler):
         self.tool_handlers = tool_handlers
         self.client = client
         self.thread_instance = thread_instance
-        self.current_text = ""
-        self.container = None
-        self.is_first_message = True
+        self.stream = StreamedMessage()
+        self.result = result if result is not None else RunResult()
 
     @override
     def on_event(self, event):
@@ -100,6 +210,9 @@ class EventHandler(AssistantEventHandler):
         1. 'thread.run.requires_action': When the assistant needs to call a tool/function
         2. 'thread.message.delta': When the assistant is streaming a response message
 
+        It also records the run id, the completed messages with their annotations, the
+        final status and the token usage in the shared RunResult.
+
         Args:
             event: The OpenAI event object containing event type and data.
 
@@ -113,25 +226,34 @@ class EventHandler(AssistantEventHandler):
             3. Assistant needs tool -> 'thread.run.requires_action' event
             4. Tool executed -> Response continues streaming
         """
-        if event.event == 'thread.run.requires_action':
+        if event.event == 'thread.run.created':
+            self.result.run_id = event.data.id
+        elif event.event == 'thread.run.requires_action':
             run_id = event.data.id
             self.thread_instance.requires_action_occurred = True
             self.handleRequiresAction(event.data, run_id)
+        elif event.event in RUN_END_EVENTS:
+            self.result.run_id = event.data.id
+            self.result.status = event.data.status
+            self.result.model = event.data.model
+            if event.data.usage:
+                self.result.usage = {
+                    "prompt_tokens": event.data.usage.prompt_tokens,
+                    "completion_tokens": event.data.usage.completion_tokens,
+                    "total_tokens": event.data.usage.total_tokens
+                }
+            if event.data.last_error:
+                self.result.last_error = event.data.last_error.message
+        elif event.event == 'thread.run.step.completed':
+            if event.data.usage:
+                self.result.context_tokens = event.data.usage.prompt_tokens
+        elif event.event == 'thread.message.completed':
+            for block in event.data.content:
+                if block.type == "text":
+                    self.result.messages.append(block.text.value)
+                    self.result.annotations.extend(a.model_dump() for a in block.text.annotations)
         elif event.event == 'thread.message.delta':
-            if self.is_first_message:
-                left, _ = st.columns(BOT_CHAT_COLUMNS)
-                with left:
-                    with st.chat_message("assistant", avatar=AVATAR_BOT_PATH):
-                        self.container = st.empty()
-                        self.is_first_message = False
-            
-            if self.container:
-                self.current_text += event.data.delta.content[0].text.value
-                self.container.markdown(
-                    f'<div class="chat-message bot-message">{self.current_text}</div>',
-                    unsafe_allow_html=True
-                )
-                time.sleep(0.03)  # Small delay for smooth streaming effect
+            self.stream.append(event.data.delta.content[0].text.value)
     
     def handleRequiresAction(self, data, run_id):
         """
@@ -161,13 +283,26 @@ class EventHandler(AssistantEventHandler):
         Note:
             Only tools that have corresponding handlers in tool_handlers will be executed.
             Tools without handlers are ignored, which may cause the assistant to fail.
+            Every executed call is added to the tool-call log of the RunResult and
+            traced as a "tool.call" span.
         """
         tool_outputs = []
         for tool in data.required_action.submit_tool_outputs.tool_calls:
             if tool.function.name in self.tool_handlers:
                 arguments = json.loads(tool.function.arguments)
                 handler = self.tool_handlers[tool.function.name]
-                output = str(handler(**arguments))
+                start = time.perf_counter()
+                with span("tool.call", tool=tool.function.name, call_id=tool.id) as call:
+                    output = str(handler(**arguments))
+                    call.setAttribute("output_chars", len(output))
+                self.result.tool_calls.append(ToolCallRecord(
+                    call_id=tool.id,
+                    name=tool.function.name,
+                    arguments=arguments,
+                    output_chars=len(output),
+                    elapsed=time.perf_counter() - start,
+                    output=output
+                ))
                 tool_outputs.append({
                     "tool_call_id": tool.id,
                     "output": output
@@ -195,14 +330,16 @@ class EventHandler(AssistantEventHandler):
         Note:
             A new EventHandler is created for each tool output submission to ensure
             clean state management and proper event handling for the continued conversation.
+            It shares this handler's RunResult, so the continuation is recorded in it.
         """
-        with self.client.beta.threads.runs.submit_tool_outputs_stream(
-            thread_id=self.thread_instance.thread_id,
-            run_id=run_id,
-            tool_outputs=tool_outputs,
-            event_handler=EventHandler(self.tool_handlers, self.client, self.thread_instance)
-        ) as stream:
-            stream.until_done()
+        with span("tool.submit", run_id=run_id, outputs=len(tool_outputs)):
+            with self.client.beta.threads.runs.submit_tool_outputs_stream(
+                thread_id=self.thread_instance.thread_id,
+                run_id=run_id,
+                tool_outputs=tool_outputs,
+                event_handler=EventHandler(self.tool_handlers, self.client, self.thread_instance, self.result)
+            ) as stream:
+                stream.until_done()
 
 class Thread:
     """
@@ -247,7 +384,8 @@ class Thread:
     - Designed for extensibility and robust error handling in production chatbots.
     """
 
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, truncation_messages: Optional[int] = None,
+                 initial_messages: Optional[List[dict]] = None):
         """
         Initialize a new Thread instance with OpenAI API key and create a new conversation thread.
 
@@ -257,6 +395,10 @@ class Thread:
 
         Args:
             api_key (str): Your OpenAI API key for authentication.
+            truncation_messages (int, optional): Truncation strategy of the runs: the model
+                only reads the last N messages of the thread. None reads the whole thread.
+            initial_messages (List[dict], optional): Messages ({"role", "content"}) the
+                thread is created with, in the same request (no run checks needed).
 
         Raises:
             Exception: If thread creation fails due to API issues, authentication problems,
@@ -275,10 +417,11 @@ class Thread:
               messages sent during active runs.
         """
         self.api_key = api_key
-        self.client = openai.OpenAI(api_key=api_key)
+        self.client = openai.OpenAI(api_key=api_key, http_client=getHttpClient())  # Scheduled by the shared rate limiter
         self.message_queue = deque()  # Queue to store messages
+        self.truncation_messages = truncation_messages
         try:
-            self.thread = self.client.beta.threads.create()
+            self.thread = self.client.beta.threads.create(messages=initial_messages or openai.NOT_GIVEN)
             self.thread_id = self.thread.id
         except Exception as e:
             raise Exception(f"Error creating thread: {str(e)}")
@@ -315,12 +458,13 @@ class Thread:
             - Metadata is optional but useful for tracking message sources or context.
         """
         try:
-            return self.client.beta.threads.messages.create(
-                thread_id=self.thread_id,
-                role=role,
-                content=content,
-                metadata=metadata
-            )
+            with span("thread.message", role=role, thread_id=self.thread_id):
+                return self.client.beta.threads.messages.create(
+                    thread_id=self.thread_id,
+                    role=role,
+                    content=content,
+                    metadata=metadata
+                )
         except Exception as e:
             raise Exception(f"Error sending message: {str(e)}")
     
@@ -423,6 +567,48 @@ class Thread:
         except Exception as e:
             raise Exception(f"Error deleting thread: {str(e)}")
 
+    def _runOptions(self) -> dict:
+        """Context options shared by every run of the thread (truncation strategy)."""
+        if not self.truncation_messages:
+            return {}
+        return {"truncation_strategy": {"type": "last_messages", "last_messages": self.truncation_messages}}
+
+    def compact(self, summary: str, recent_messages: List[tuple]) -> str:
+        """
+        Replace the conversation with a summary of it plus its most recent messages.
+
+        A new OpenAI thread is created holding the summary (as an assistant message)
+        followed by the recent messages, and the previous thread is deleted. Later runs
+        read the summary instead of the whole history, so their input tokens stay bounded.
+
+        Args:
+            summary (str): Summary of the messages left out.
+            recent_messages (List[tuple]): (content, role) pairs kept verbatim, oldest first.
+
+        Returns:
+            str: ID of the new thread.
+
+        Raises:
+            Exception: If the new thread can't be created. The current thread is kept.
+
+        Note:
+            Must not be called while a run is active or messages are queued.
+        """
+        messages = [{"role": "assistant", "content": f"Resumen de la conversación anterior:\n{summary}"}]
+        messages += [{"role": role, "content": content} for content, role in recent_messages if content]
+        try:
+            thread = self.client.beta.threads.create(messages=messages)
+        except Exception as e:
+            raise Exception(f"Error compacting thread: {str(e)}")
+
+        previous_id = self.thread_id
+        self.thread, self.thread_id = thread, thread.id
+        try:
+            self.client.beta.threads.delete(thread_id=previous_id)
+        except Exception:
+            pass  # The old thread is no longer used, failing to delete it is harmless
+        return self.thread_id
+
     def isRunActive(self) -> bool:
         """
         Check if there is an active run on the current thread with robust error handling.
@@ -470,20 +656,23 @@ class Thread:
             }
             
             # Try up to 3 times with a small delay
-            for _ in range(3):
-                runs = self.client.beta.threads.runs.list(
-                    thread_id=self.thread_id,
-                    limit=10,  # Increase limit to catch more recent runs
-                    order='desc'  # Get most recent runs first
-                )
-                
-                # Check each run's status
-                for run in runs:
-                    if run.status in active_statuses:
-                        return True
-                
-                # If no active runs found, wait a tiny bit and check again
-                time.sleep(0.1)  # 100ms delay between checks
+            with span("run.check", thread_id=self.thread_id) as check:
+                for attempt in range(3):
+                    check.setAttribute("polls", attempt + 1)
+                    runs = self.client.beta.threads.runs.list(
+                        thread_id=self.thread_id,
+                        limit=10,  # Increase limit to catch more recent runs
+                        order='desc'  # Get most recent runs first
+                    )
+                    
+                    # Check each run's status
+                    for run in runs:
+                        if run.status in active_statuses:
+                            check.setAttribute("active", True)
+                            return True
+                    
+                    # If no active runs found, wait a tiny bit and check again
+                    time.sleep(0.1)  # 100ms delay between checks
             
             # If we get here, no active runs were found after all checks
             return False
@@ -899,7 +1088,7 @@ class Thread:
         except Exception as e:
             raise Exception(f"Error retrieving message: {str(e)}")
     
-    def runWithStreaming(self, assistant_id: str, tool_handlers: dict) -> None:
+    def runWithStreaming(self, assistant_id: str, tool_handlers: dict) -> RunResult:
         """
         Run the assistant with streaming enabled for real-time chat experience.
 
@@ -921,6 +1110,10 @@ class Thread:
             tool_handlers (dict): Dictionary mapping function names to their handler functions.
                 Example: {"get_weather": weather_function, "calculate": math_function}
 
+        Returns:
+            RunResult: Final text, annotations, run id, usage and tool-call log of the run,
+                collected from the stream (no extra request is needed to read the answer).
+
         Raises:
             Exception: If the run fails due to API errors, network issues,
                       invalid assistant ID, or problems with tool execution.
@@ -936,7 +1129,8 @@ class Thread:
         Examples:
             # Basic streaming run
             >>> thread.addMessage("What's the weather like?")
-            >>> thread.runWithStreaming("asst_123", {})
+            >>> result = thread.runWithStreaming("asst_123", {})
+            >>> print(result.text, result.usage["total_tokens"])
 
             # With tool handlers
             >>> def get_weather(city):
@@ -970,16 +1164,24 @@ class Thread:
         try:
             handler = EventHandler(tool_handlers, self.client, self)
             
-            with self.client.beta.threads.runs.stream(
-                thread_id=self.thread_id,
-                assistant_id=assistant_id,
-                event_handler=handler
-            ) as stream:
-                stream.until_done()
+            with span("run", thread_id=self.thread_id, assistant_id=assistant_id) as run:
+                with self.client.beta.threads.runs.stream(
+                    thread_id=self.thread_id,
+                    assistant_id=assistant_id,
+                    event_handler=handler,
+                    **self._runOptions()
+                ) as stream:
+                    stream.until_done()
+                run.setAttribute("run_id", handler.result.run_id)
+                run.setAttribute("status", handler.result.status)
+                run.setAttribute("tool_calls", len(handler.result.tool_calls))
+                for key, value in handler.result.usage.items():
+                    run.setAttribute(key, value)
             
             # Process any queued messages after run completion
             self.processQueueWithRuns(assistant_id, tool_handlers, stream=True)
-            
+
+            return handler.result
         except Exception as e:
             raise Exception(f"Error in streaming run: {str(e)}")
 
@@ -1006,7 +1208,8 @@ class Thread:
 
         Returns:
             dict: Dictionary containing run status and messages.
-                Format: {"status": "completed|failed|requires_action", "messages": [...]}
+                Format: {"status": "completed|failed|requires_action", "messages": [...],
+                "result": RunResult} (run id, model, usage and tool-call log, without text)
 
         Raises:
             Exception: If the run fails due to API errors, network issues,
@@ -1073,16 +1276,27 @@ class Thread:
         try:
             run = self.client.beta.threads.runs.create_and_poll(
                 thread_id=self.thread_id,
-                assistant_id=assistant_id
+                assistant_id=assistant_id,
+                **self._runOptions()
             )
 
+            result = RunResult()
             if run.status == 'requires_action':
                 tool_outputs = []
                 for tool in run.required_action.submit_tool_outputs.tool_calls:
                     if tool.function.name in tool_handlers:
                         arguments = json.loads(tool.function.arguments)
                         handler = tool_handlers[tool.function.name]
+                        start = time.perf_counter()
                         output = str(handler(**arguments))
+                        result.tool_calls.append(ToolCallRecord(
+                            call_id=tool.id,
+                            name=tool.function.name,
+                            arguments=arguments,
+                            output_chars=len(output),
+                            elapsed=time.perf_counter() - start,
+                            output=output
+                        ))
                         tool_outputs.append({
                             "tool_call_id": tool.id,
                             "output": output
@@ -1096,10 +1310,17 @@ class Thread:
                     )
 
             messages = self.listMessages() if run.status == 'completed' else None
+            result.run_id, result.status, result.model = run.id, run.status, run.model
+            if run.usage:
+                result.usage = {
+                    "prompt_tokens": run.usage.prompt_tokens,
+                    "completion_tokens": run.usage.completion_tokens,
+                    "total_tokens": run.usage.total_tokens
+                }
             
             # Process any queued messages after run completion
             self.processQueueWithRuns(assistant_id, tool_handlers, stream=False)
             
-            return {"status": run.status, "messages": messages}
+            return {"status": run.status, "messages": messages, "result": result}
         except Exception as e:
             raise Exception(f"Error in non-streaming run: {str(e)}")
\ No newline at end of file